@@ -3,6 +3,7 @@ from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
+from idempotency.decorators import idempotent
 from datetime import datetime, time
 from django.db.models import Q
 
@@ -28,6 +29,7 @@ class CoachCreateView(APIView):
     """
     permission_classes = [AllowAny]
     
+    @idempotent
     def post(self, request):
         serializer = CoachCreateSerializer(data=request.data)
         if serializer.is_valid():
@@ -110,6 +112,7 @@ class CoachScheduleCreateView(APIView):
     """
     permission_classes = [AllowAny]
     
+    @idempotent
     def post(self, request, coach_id):
         try:
             coach = Coach.objects.get(id=coach_id)
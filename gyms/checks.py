@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+
+# backendهایی که داده‌شان بین پروسس‌ها مشترک نیست
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def check_shared_versions_cache(app_configs, **kwargs):
+    """
+    نسخه‌های gyms.versions باید در cache مشترک همه پروسس‌ها باشند
+    """
+    backend = settings.CACHES.get('gyms', {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHE_BACKENDS:
+        return [Error(
+            f"cache 'gyms' با backend {backend} بین پروسس‌ها مشترک نیست",
+            hint='یک backend مشترک مثل FileBasedCache، DatabaseCache یا Redis تنظیم کنید.',
+            id='gyms.E001',
+        )]
+    return []
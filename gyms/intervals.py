@@ -0,0 +1,163 @@
+"""
+ایندکس بازه‌ای بازه‌های زمانی هر (باشگاه، تاریخ)
+
+پرسش «چند بازه یا کدام بازه‌ها با [a, b) تداخل دارند» برای شمارش رزروهای
+اسلات‌های testprocces پرسیده می‌شود. برای هر روز باشگاه یک IntervalIndex در
+حافظه پروسس ساخته می‌شود که تعداد را در O(log n) و لیست بازه‌ها را در
+O(log n + k) برمی‌گرداند. رد بازه زمانی تداخل‌دار هنگام ایجاد به این
+ایندکس وابسته نیست و مستقیماً از دیتابیس بررسی می‌شود.
+
+هر ایندکس همراه نسخه همان روز باشگاه (versions.py) نگه داشته می‌شود.
+تغییر TimeSlot پس از commit نسخه را عوض می‌کند و ایندکس در اولین استفاده
+بعدی در هر پروسس دوباره ساخته می‌شود. قاعده تداخل همان قاعده کوئری‌های
+قبلی است: start_time < b و end_time > a
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import TimeSlot
+from .versions import day_versions
+
+
+INDEX_CACHE_SIZE = getattr(settings, 'GYMS_INTERVAL_INDEX_SIZE', 4096)
+
+# (شناسه باشگاه، تاریخ) -> (نسخه، IntervalIndex) به ترتیب آخرین استفاده
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+class _Node:
+    """
+    گره درخت بازه‌ای مرکزی؛ بازه‌هایی که center را در بر دارند
+    """
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+    def __init__(self, intervals):
+        self.center = intervals[len(intervals) // 2][0]
+        left, right, here = [], [], []
+        for interval in intervals:
+            if interval[1] <= self.center:
+                left.append(interval)
+            elif interval[0] > self.center:
+                right.append(interval)
+            else:
+                here.append(interval)
+        self.by_start = here
+        self.by_end = sorted(here, key=lambda interval: interval[1], reverse=True)
+        self.left = _Node(left) if left else None
+        self.right = _Node(right) if right else None
+
+
+class IntervalIndex:
+    """
+    ایندکس ایستای بازه‌های (شروع، پایان، شناسه) یک روز باشگاه
+
+    برای بازه‌های سالم (شروع قبل از پایان) تعداد همپوشان‌ها برابر است با
+    تعداد شروع‌های کوچکتر از b منهای تعداد پایان‌های کوچکتر یا مساوی a.
+    برای لیست همپوشان‌ها، بازه‌هایی که بین a و b شروع شده‌اند یک تکه پیوسته
+    از آرایه مرتب هستند و بازه‌هایی که قبل از a شروع شده‌اند با یک جستجوی
+    نقطه‌ای در درخت بازه‌ای پیدا می‌شوند. بازه‌های نامعتبر جدا و مستقیم
+    بررسی می‌شوند.
+    """
+    def __init__(self, intervals):
+        self.intervals = sorted(interval for interval in intervals if interval[0] < interval[1])
+        self.malformed = [interval for interval in intervals if interval[0] >= interval[1]]
+        self.starts = [interval[0] for interval in self.intervals]
+        self.ends = sorted(interval[1] for interval in self.intervals)
+        self._root = _Node(self.intervals) if self.intervals else None
+
+    def __len__(self):
+        return len(self.intervals) + len(self.malformed)
+
+    def _malformed_overlapping(self, start, end):
+        return [
+            interval for interval in self.malformed if interval[0] < end and interval[1] > start
+        ]
+
+    def count(self, start, end):
+        """
+        تعداد بازه‌های همپوشان با [start, end)
+        """
+        if start < end:
+            total = bisect_left(self.starts, end) - bisect_right(self.ends, start)
+        else:
+            total = sum(
+                1 for interval in self.intervals if interval[0] < end and interval[1] > start
+            )
+        return total + len(self._malformed_overlapping(start, end))
+
+    def overlapping(self, start, end):
+        """
+        بازه‌های (شروع، پایان، شناسه) همپوشان با [start, end) به ترتیب شروع
+        """
+        if start < end:
+            found = sorted(self._stab(start))
+            found.extend(self.intervals[bisect_left(self.starts, start):bisect_left(self.starts, end)])
+        else:
+            found = [
+                interval for interval in self.intervals if interval[0] < end and interval[1] > start
+            ]
+        return found + self._malformed_overlapping(start, end)
+
+    def _stab(self, point):
+        """
+        بازه‌هایی که قبل از point شروع شده و بعد از آن تمام می‌شوند
+        """
+        found = []
+        node = self._root
+        while node is not None:
+            if point < node.center:
+                for interval in node.by_start:
+                    if interval[0] >= point:
+                        break
+                    found.append(interval)
+                node = node.left
+            else:
+                for interval in node.by_end:
+                    if interval[1] <= point:
+                        break
+                    if interval[0] < point:
+                        found.append(interval)
+                node = node.right
+        return found
+
+
+def day_indexes(gym_days):
+    """
+    ایندکس هر (شناسه باشگاه، تاریخ)؛ روزهای بدون ایندکس معتبر در این پروسس
+    با یک کوئری ساخته می‌شوند
+    """
+    versions = day_versions(gym_days)
+
+    indexes = {}
+    stale = []
+    with _indexes_lock:
+        for gym_day, version in versions.items():
+            entry = _indexes.get(gym_day)
+            if entry is not None and version is not None and entry[0] == version:
+                _indexes.move_to_end(gym_day)
+                indexes[gym_day] = entry[1]
+            else:
+                stale.append(gym_day)
+
+    if stale:
+        rows = {gym_day: [] for gym_day in stale}
+        days = [day for _, day in stale]
+        for gym_id, day, start_time, end_time, timeslot_id in TimeSlot.objects.filter(
+            gym_id__in={gym_id for gym_id, _ in stale}, date__range=(min(days), max(days))
+        ).order_by().values_list('gym_id', 'date', 'start_time', 'end_time', 'id'):
+            if (gym_id, day) in rows:
+                rows[(gym_id, day)].append((start_time, end_time, timeslot_id))
+
+        with _indexes_lock:
+            for gym_day in stale:
+                index = IntervalIndex(rows[gym_day])
+                indexes[gym_day] = index
+                _indexes[gym_day] = (versions[gym_day], index)
+                _indexes.move_to_end(gym_day)
+            while len(_indexes) > INDEX_CACHE_SIZE:
+                _indexes.popitem(last=False)
+    return indexes
@@ -1,3 +1,5 @@
+from datetime import date
+
 from rest_framework import serializers
 from .models import Gym, TimeSlot
 
@@ -65,24 +67,24 @@ class TimeSlotCreateSerializer(serializers.ModelSerializer):
     def validate(self, data):
         """
         اعتبارسنجی برای جلوگیری از تداخل بازه‌های زمانی
+
+        باشگاه از context (gym) خوانده می‌شود چون در بدنه درخواست نیست.
         """
-        gym = data.get('gym')
-        date = data.get('date')
+        gym = self.context.get('gym')
+        slot_date = data.get('date') or date.today()
         start_time = data.get('start_time')
         end_time = data.get('end_time')
         
         if start_time >= end_time:
             raise serializers.ValidationError("ساعت شروع باید قبل از ساعت پایان باشد")
         
-        # بررسی تداخل با بازه‌های زمانی موجود
-        existing_timeslots = TimeSlot.objects.filter(
+        # بررسی تداخل مستقیماً از دیتابیس تا به نسخه ایندکس‌های حافظه‌ای وابسته نباشد
+        if gym is not None and TimeSlot.objects.filter(
             gym=gym,
-            date=date,
+            date=slot_date,
             start_time__lt=end_time,
             end_time__gt=start_time
-        )
-        
-        if existing_timeslots.exists():
+        ).exists():
             raise serializers.ValidationError("این بازه زمانی با بازه‌های موجود تداخل دارد")
         
         return data
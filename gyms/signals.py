@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Gym, TimeSlot
+from .versions import bump_days, bump_gyms
+
+
+@receiver(pre_save, sender=TimeSlot)
+def remember_previous_day(sender, instance, raw=False, **kwargs):
+    """
+    نگه داشتن باشگاه و تاریخ قبلی بازه زمانی در حال ویرایش
+    """
+    instance._previous_day = None
+    if instance.pk and not raw:
+        instance._previous_day = TimeSlot.objects.filter(pk=instance.pk).values_list(
+            'gym_id', 'date'
+        ).first()
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def bump_timeslot_days(sender, instance, **kwargs):
+    """
+    عوض کردن نسخه روز باشگاه پس از تغییر بازه زمانی
+    """
+    gym_days = {(instance.gym_id, instance.date)}
+    previous = getattr(instance, '_previous_day', None)
+    if previous:
+        gym_days.add(previous)
+    bump_days(gym_days)
+
+
+@receiver(post_save, sender=Gym)
+@receiver(post_delete, sender=Gym)
+def bump_gyms_version(sender, instance, **kwargs):
+    """
+    عوض کردن نسخه کلی باشگاه‌ها پس از تغییر باشگاه (مثلاً تغییر نام)
+    """
+    bump_gyms()
@@ -1,3 +1,110 @@
-from django.test import TestCase
+import random
+import tempfile
+from datetime import date, time
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .intervals import IntervalIndex, day_indexes
+from .models import Gym, TimeSlot
+from .serializers import TimeSlotCreateSerializer
+
+
+def brute_force(intervals, start, end):
+    return [interval for interval in intervals if interval[0] < end and interval[1] > start]
+
+
+class IntervalIndexTests(SimpleTestCase):
+    def assertMatchesOracle(self, intervals, queries):
+        index = IntervalIndex(intervals)
+        self.assertEqual(len(index), len(intervals))
+        for start, end in queries:
+            expected = brute_force(intervals, start, end)
+            self.assertEqual(index.count(start, end), len(expected), (intervals, start, end))
+            self.assertEqual(
+                sorted(index.overlapping(start, end)), sorted(expected), (intervals, start, end)
+            )
+
+    def test_random_intervals_match_brute_force(self):
+        rng = random.Random(1403)
+        for _ in range(300):
+            intervals = []
+            for interval_id in range(rng.randint(0, 40)):
+                start = rng.randint(0, 48)
+                # بازه‌های خالی و معکوس هم در دیتابیس ممکن هستند
+                end = start + rng.randint(-3, 12)
+                intervals.append((start, end, interval_id))
+            queries = [(rng.randint(-2, 50), rng.randint(-2, 50)) for _ in range(40)]
+            self.assertMatchesOracle(intervals, queries)
+
+    def test_touching_boundaries_do_not_overlap(self):
+        intervals = [(0, 10, 1), (10, 20, 2), (5, 15, 3)]
+        self.assertMatchesOracle(intervals, [(10, 10), (0, 10), (10, 20), (20, 30), (-5, 0), (9, 11)])
+        self.assertEqual(IntervalIndex(intervals).count(10, 20), 2)
+
+    def test_identical_and_nested_intervals(self):
+        intervals = [(2, 8, 1), (2, 8, 2), (0, 20, 3), (4, 5, 4), (4, 5, 5)]
+        self.assertMatchesOracle(intervals, [(s, e) for s in range(-1, 22) for e in range(-1, 22)])
+
+    def test_overlapping_is_ordered_by_start(self):
+        index = IntervalIndex([(6, 9, 1), (0, 10, 2), (3, 7, 3), (8, 12, 4)])
+        self.assertEqual(
+            [interval[2] for interval in index.overlapping(5, 9)], [2, 3, 1, 4]
+        )
+
+    def test_empty_index(self):
+        index = IntervalIndex([])
+        self.assertEqual(index.count(0, 10), 0)
+        self.assertEqual(index.overlapping(0, 10), [])
+
+
+class DayIndexesTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'gyms': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': directory.name,
+            },
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.gym = Gym.objects.create(name='g', phone='1', address='a', owner='o')
+        self.day = date(2025, 1, 1)
+
+    def add_slot(self, start_hour, end_hour):
+        with self.captureOnCommitCallbacks(execute=True):
+            return TimeSlot.objects.create(
+                gym=self.gym, date=self.day, start_time=time(start_hour), end_time=time(end_hour)
+            )
+
+    def test_index_is_rebuilt_after_timeslot_change(self):
+        gym_day = (self.gym.id, self.day)
+        first = self.add_slot(9, 11)
+        index = day_indexes([gym_day])[gym_day]
+        self.assertEqual(index.count(time(10), time(12)), 1)
+        with self.assertNumQueries(0):
+            self.assertIs(day_indexes([gym_day])[gym_day], index)
+
+        self.add_slot(10, 12)
+        index = day_indexes([gym_day])[gym_day]
+        self.assertEqual(index.count(time(10), time(12)), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(day_indexes([gym_day])[gym_day].count(time(10), time(12)), 1)
+
+    def test_overlap_check_does_not_use_stale_index(self):
+        gym_day = (self.gym.id, self.day)
+        self.assertEqual(day_indexes([gym_day])[gym_day].count(time(9), time(11)), 0)
+        # bulk_create نسخه روز را عوض نمی‌کند و ایندکس حافظه‌ای قدیمی می‌ماند
+        TimeSlot.objects.bulk_create([
+            TimeSlot(gym=self.gym, date=self.day, start_time=time(9), end_time=time(11))
+        ])
+
+        data = {'date': self.day, 'start_time': time(10), 'end_time': time(12)}
+        serializer = TimeSlotCreateSerializer(data=data, context={'gym': self.gym})
+        self.assertFalse(serializer.is_valid())
+        data = {'date': self.day, 'start_time': time(11), 'end_time': time(12)}
+        self.assertTrue(TimeSlotCreateSerializer(data=data, context={'gym': self.gym}).is_valid())
@@ -0,0 +1,103 @@
+"""
+نسخه داده‌های باشگاه‌ها برای cacheهای مشتق شده
+
+هر (شناسه باشگاه، تاریخ) یک نسخه دارد که پس از commit هر تغییر بازه‌های
+زمانی آن روز عوض می‌شود و یک نسخه کلی که پس از هر تغییر باشگاه‌ها (مثلاً
+تغییر نام) عوض می‌شود (signals.py). داده‌های مشتق شده، یعنی ایندکس‌های
+بازه‌ای (intervals.py) و نتایج شمارش رزروهای testprocces، همراه نسخه‌هایی
+که از روی آن‌ها ساخته شده‌اند نگه داشته می‌شوند، پس نتیجه قدیمی هیچ‌وقت
+خوانده نمی‌شود.
+
+نسخه‌ها در cache مشترک gyms نگه داشته می‌شوند تا تغییر در یک پروسس در همه
+پروسس‌ها دیده شود (checks.py اجرا با cache جداگانه هر پروسس را رد می‌کند).
+نسخه‌ها مقدار تصادفی هستند نه شمارنده، تا اگر کلید نسخه از cache حذف شد
+نسخه جدید با نسخه‌های قبلی یکی نشود. تغییرات گروهی (QuerySet.update و
+bulk_create) signal ندارند و نسخه را عوض نمی‌کنند.
+"""
+import hashlib
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import Gym
+
+
+GYMS_VERSION_KEY = 'gyms:version'
+
+
+def _cache():
+    return caches['gyms']
+
+
+def day_version_key(gym_id, day):
+    return f'gyms:day:{gym_id}:{day}'
+
+
+def _gym_ids_key(version, gym_name):
+    # نام باشگاه ممکن است برای کلید cache مناسب نباشد
+    return f'gyms:ids:{version}:{hashlib.md5(gym_name.encode()).hexdigest()}'
+
+
+def _versions(keys):
+    """
+    نسخه فعلی کلیدها؛ کلیدهای ناموجود با نسخه تازه ساخته می‌شوند
+    """
+    versions = _cache().get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        _cache().add(key, uuid.uuid4().hex, timeout=None)
+    if missing:
+        versions.update(_cache().get_many(missing))
+    return versions
+
+
+def day_versions(gym_days):
+    """
+    نسخه فعلی هر (شناسه باشگاه، تاریخ)
+    """
+    keys = {gym_day: day_version_key(*gym_day) for gym_day in gym_days}
+    versions = _versions(list(keys.values()))
+    return {gym_day: versions.get(key) for gym_day, key in keys.items()}
+
+
+def gym_ids(gym_names):
+    """
+    شناسه باشگاه‌های هر نام (نام باشگاه یکتا نیست)
+
+    نتیجه با نسخه کلی باشگاه‌ها در cache نگه داشته می‌شود و نام‌هایی که در
+    cache نیستند با یک کوئری خوانده می‌شوند.
+    """
+    version = _versions([GYMS_VERSION_KEY]).get(GYMS_VERSION_KEY)
+    keys = {gym_name: _gym_ids_key(version, gym_name) for gym_name in gym_names}
+    cached = _cache().get_many(list(keys.values()))
+    result = {gym_name: cached[key] for gym_name, key in keys.items() if key in cached}
+
+    missing = [gym_name for gym_name in keys if gym_name not in result]
+    if missing:
+        for gym_name in missing:
+            result[gym_name] = []
+        for gym_id, gym_name in Gym.objects.filter(name__in=missing).order_by('id').values_list('id', 'name'):
+            result[gym_name].append(gym_id)
+        _cache().set_many({keys[gym_name]: result[gym_name] for gym_name in missing})
+    return result
+
+
+def bump_days(gym_days):
+    """
+    عوض کردن نسخه روزهای (شناسه باشگاه، تاریخ) پس از commit تراکنش جاری
+    """
+    keys = [day_version_key(gym_id, day) for gym_id, day in gym_days]
+    if keys:
+        transaction.on_commit(
+            lambda: _cache().set_many({key: uuid.uuid4().hex for key in keys}, timeout=None)
+        )
+
+
+def bump_gyms():
+    """
+    عوض کردن نسخه کلی باشگاه‌ها پس از commit تراکنش جاری
+    """
+    transaction.on_commit(
+        lambda: _cache().set(GYMS_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    )
@@ -3,6 +3,7 @@ from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
+from idempotency.decorators import idempotent
 
 from .models import Gym, TimeSlot
 from .serializers import (
@@ -26,6 +27,7 @@ class GymCreateView(APIView):
     """
     permission_classes = [AllowAny]
     
+    @idempotent
     def post(self, request):
         serializer = GymCreateSerializer(data=request.data)
         if serializer.is_valid():
@@ -107,10 +109,11 @@ class TimeSlotCreateView(APIView):
     """
     permission_classes = [AllowAny]
     
+    @idempotent
     def post(self, request, gym_id):
         try:
             gym = Gym.objects.get(id=gym_id)
-            serializer = TimeSlotCreateSerializer(data=request.data)
+            serializer = TimeSlotCreateSerializer(data=request.data, context={'gym': gym})
             if serializer.is_valid():
                 timeslot = serializer.save(gym=gym)
                 return Response({
@@ -0,0 +1,14 @@
+from django.contrib import admin
+from .models import IdempotencyKey
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    """
+    پنل ادمین برای کلیدهای idempotency
+    """
+    list_display = ('scope', 'path', 'key', 'response_status', 'created_at')
+    list_filter = ('response_status', 'created_at')
+    search_fields = ('scope', 'path', 'key')
+    ordering = ('-created_at',)
+    readonly_fields = ('scope', 'path', 'key', 'request_hash', 'response_status', 'response_data', 'created_at')
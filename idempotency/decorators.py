@@ -0,0 +1,159 @@
+"""
+پشتیبانی از هدر Idempotency-Key برای درخواست‌های ایجاد
+
+اگر کلاینت یک درخواست POST را با همان Idempotency-Key دوباره بفرستد، پاسخ
+ذخیره شده درخواست اول بدون اجرای دوباره view برگردانده می‌شود. کلیدها در
+جدول IdempotencyKey نگه داشته می‌شوند تا بین همه پروسس‌ها مشترک باشند و در
+محدوده کاربر درخواست (یا محدوده مشترک کاربران ناشناس) و مسیر یکتا هستند؛
+پس دو کاربر با یک کلید پاسخ یکدیگر را نمی‌بینند. کلیدهای قدیمی‌تر از
+IDEMPOTENCY_KEY_TTL منقضی هستند: هر IDEMPOTENCY_PURGE_EVERY کلید جدید یک دسته
+محدود از کلیدهای منقضی در همان درخواست حذف می‌شود تا جدول بدون اجرای دستی
+purge_idempotency_keys هم بزرگ نشود.
+"""
+import functools
+import hashlib
+import itertools
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+MAX_KEY_LENGTH = 255
+
+# شمارنده کلیدهای ایجاد شده در این پروسس برای حذف تدریجی کلیدهای منقضی
+_created_keys = itertools.count(1)
+
+
+def request_scope(request):
+    """
+    محدوده یکتایی کلید: کاربر وارد شده یا همه کاربران ناشناس
+    """
+    if request.user and request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return 'anonymous'
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+
+
+def in_flight_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_IN_FLIGHT_TIMEOUT', 60))
+
+
+def purge_expired(limit):
+    """
+    حذف حداکثر limit کلید منقضی، قدیمی‌ترین اول؛ خروجی تعداد حذف شده
+    """
+    cutoff = timezone.now() - key_ttl()
+    ids = list(IdempotencyKey.objects.filter(created_at__lt=cutoff).order_by(
+        'created_at'
+    ).values_list('id', flat=True)[:limit])
+    if not ids:
+        return 0
+    # کلیدی که در این فاصله دوباره گرفته شده (created_at جدید) حذف نمی‌شود
+    deleted, _ = IdempotencyKey.objects.filter(id__in=ids, created_at__lt=cutoff).delete()
+    return deleted
+
+
+def _claim(scope, path, key, request_hash):
+    """
+    گرفتن کلید؛ خروجی (رکورد، گرفته شد یا نه)
+
+    کلید منقضی یا درخواست در حال اجرایی که بیش از IDEMPOTENCY_IN_FLIGHT_TIMEOUT
+    طول کشیده (مثلاً پروسس آن متوقف شده) دوباره گرفته می‌شود.
+    """
+    lookup = {'scope': scope, 'path': path, 'key': key}
+    try:
+        with transaction.atomic():
+            record = IdempotencyKey.objects.create(request_hash=request_hash, **lookup)
+    except IntegrityError:
+        pass
+    else:
+        if next(_created_keys) % getattr(settings, 'IDEMPOTENCY_PURGE_EVERY', 100) == 0:
+            purge_expired(getattr(settings, 'IDEMPOTENCY_PURGE_BATCH_SIZE', 500))
+        return record, True
+
+    record = IdempotencyKey.objects.filter(**lookup).first()
+    if record is None:
+        return None, False
+    now = timezone.now()
+    abandoned = record.response_status is None and record.created_at < now - in_flight_timeout()
+    if not abandoned and record.created_at >= now - key_ttl():
+        return record, False
+
+    # فقط یکی از درخواست‌های همزمان رکورد قدیمی را تصاحب می‌کند
+    claimed = IdempotencyKey.objects.filter(id=record.id, created_at=record.created_at).update(
+        request_hash=request_hash, response_status=None, response_data=None, created_at=now
+    )
+    if not claimed:
+        return IdempotencyKey.objects.filter(**lookup).first(), False
+    record.request_hash = request_hash
+    record.response_status = None
+    record.response_data = None
+    record.created_at = now
+    return record, True
+
+
+def idempotent(view_method):
+    """
+    دکوراتور متد post یک APIView برای پذیرش هدر Idempotency-Key
+
+    - درخواست بدون هدر مثل قبل اجرا می‌شود.
+    - اولین درخواست با یک کلید اجرا و پاسخ آن (به جز خطاهای 5xx) ذخیره می‌شود.
+    - تکرار همان کلید با همان بدنه پاسخ ذخیره شده را برمی‌گرداند.
+    - تکرار در حین اجرای درخواست اول 409 و تکرار با بدنه متفاوت 422 می‌گیرد.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"error": f"طول Idempotency-Key نباید بیشتر از {MAX_KEY_LENGTH} کاراکتر باشد."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        request_hash = hashlib.sha256(
+            request.method.encode() + b'\n' + request.body
+        ).hexdigest()
+        record, claimed = _claim(request_scope(request), request.path, key, request_hash)
+
+        if claimed:
+            try:
+                response = view_method(self, request, *args, **kwargs)
+            except Exception:
+                record.delete()
+                raise
+            if response.status_code >= 500:
+                record.delete()
+            else:
+                record.response_status = response.status_code
+                record.response_data = response.data
+                record.save(update_fields=['response_status', 'response_data'])
+            return response
+
+        if record is not None and record.request_hash != request_hash:
+            return Response(
+                {"error": "این Idempotency-Key قبلاً با بدنه دیگری استفاده شده است."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        if record is None or record.response_status is None:
+            return Response(
+                {"error": "درخواست دیگری با همین Idempotency-Key در حال پردازش است."},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(
+            record.response_data, status=record.response_status,
+            headers={'Idempotent-Replayed': 'true'}
+        )
+
+    return wrapper
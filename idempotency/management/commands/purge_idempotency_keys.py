@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from idempotency.decorators import purge_expired
+
+
+class Command(BaseCommand):
+    """
+    حذف کلیدهای idempotency منقضی شده در دسته‌های محدود
+    """
+    help = 'حذف کلیدهای Idempotency-Key قدیمی‌تر از IDEMPOTENCY_KEY_TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='تعداد کلیدهایی که در هر مرحله حذف می‌شوند'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            deleted = purge_expired(options['batch_size'])
+            if not deleted:
+                break
+            total += deleted
+        self.stdout.write(self.style.SUCCESS(f'{total} کلید منقضی حذف شد'))
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:33
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=64, verbose_name='محدوده (کاربر)')),
+                ('path', models.CharField(max_length=255, verbose_name='مسیر درخواست')),
+                ('key', models.CharField(max_length=255, verbose_name='Idempotency-Key')),
+                ('request_hash', models.CharField(max_length=64, verbose_name='hash بدنه درخواست')),
+                ('response_status', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='کد وضعیت پاسخ')),
+                ('response_data', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='بدنه پاسخ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+            ],
+            options={
+                'verbose_name': 'کلید idempotency',
+                'verbose_name_plural': 'کلیدهای idempotency',
+                'indexes': [models.Index(fields=['created_at'], name='idempotency_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('scope', 'path', 'key'), name='idempotency_key_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class IdempotencyKey(models.Model):
+    """
+    پاسخ ذخیره شده یک درخواست دارای هدر Idempotency-Key
+
+    کلید در محدوده کاربر (scope) و مسیر درخواست یکتاست و قید یکتایی
+    دیتابیس تضمین می‌کند که فقط یک درخواست، در هر پروسسی که باشد، کلید را
+    بگیرد. response_status خالی یعنی درخواست اول هنوز در حال اجراست.
+    """
+    scope = models.CharField(max_length=64, verbose_name="محدوده (کاربر)")
+    path = models.CharField(max_length=255, verbose_name="مسیر درخواست")
+    key = models.CharField(max_length=255, verbose_name="Idempotency-Key")
+    request_hash = models.CharField(max_length=64, verbose_name="hash بدنه درخواست")
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="کد وضعیت پاسخ")
+    response_data = models.JSONField(
+        null=True, blank=True, encoder=DjangoJSONEncoder, verbose_name="بدنه پاسخ"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
+
+    class Meta:
+        verbose_name = "کلید idempotency"
+        verbose_name_plural = "کلیدهای idempotency"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'path', 'key'], name='idempotency_key_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} {self.path} {self.key}"
@@ -0,0 +1,115 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+
+from .decorators import idempotent
+from .models import IdempotencyKey
+
+
+class CreateView(APIView):
+    permission_classes = [AllowAny]
+    calls = 0
+
+    @idempotent
+    def post(self, request):
+        CreateView.calls += 1
+        return Response({'call': CreateView.calls, 'body': request.data}, status=201)
+
+
+class IdempotentDecoratorTests(TestCase):
+    def setUp(self):
+        CreateView.calls = 0
+        self.factory = APIRequestFactory()
+        self.alice = get_user_model().objects.create_user(username='alice', password='x')
+        self.bob = get_user_model().objects.create_user(username='bob', password='x')
+
+    def post(self, data, key='1', user=None):
+        request = self.factory.post('/create/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        if user is not None:
+            force_authenticate(request, user=user)
+        return CreateView.as_view()(request)
+
+    def test_retry_replays_stored_response(self):
+        first = self.post({'quantity': 5}, user=self.alice)
+        second = self.post({'quantity': 5}, user=self.alice)
+        self.assertEqual(CreateView.calls, 1)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+
+    def test_same_key_is_scoped_per_user(self):
+        self.post({'quantity': 5}, user=self.alice)
+        response = self.post({'quantity': 5}, user=self.bob)
+        self.assertEqual(CreateView.calls, 2)
+        self.assertEqual(response.data['call'], 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+
+    def test_different_body_is_rejected(self):
+        self.post({'quantity': 5}, user=self.alice)
+        response = self.post({'quantity': 6}, user=self.alice)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(CreateView.calls, 1)
+
+    def test_in_flight_key_conflicts(self):
+        self.post({'quantity': 5}, user=self.alice)
+        IdempotencyKey.objects.update(response_status=None)
+        response = self.post({'quantity': 5}, user=self.alice)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(CreateView.calls, 1)
+
+    def test_abandoned_in_flight_key_is_reclaimed(self):
+        self.post({'quantity': 5}, user=self.alice)
+        IdempotencyKey.objects.update(
+            response_status=None, created_at=timezone.now() - timedelta(minutes=5)
+        )
+        response = self.post({'quantity': 5}, user=self.alice)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(CreateView.calls, 2)
+
+    def test_requests_without_key_always_run(self):
+        for _ in range(2):
+            CreateView.as_view()(self.factory.post('/create/', {}, format='json'))
+        self.assertEqual(CreateView.calls, 2)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class ExpiredKeyPurgeTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        expired_at = timezone.now() - timedelta(days=2)
+        for index in range(5):
+            IdempotencyKey.objects.create(scope='anonymous', path='/create/', key=f'old{index}', request_hash='')
+        IdempotencyKey.objects.update(created_at=expired_at)
+        IdempotencyKey.objects.create(scope='anonymous', path='/create/', key='fresh', request_hash='')
+
+    def post(self, key):
+        request = self.factory.post('/create/', {}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        return CreateView.as_view()(request)
+
+    @override_settings(IDEMPOTENCY_PURGE_EVERY=1, IDEMPOTENCY_PURGE_BATCH_SIZE=2)
+    def test_new_keys_purge_a_bounded_batch_of_expired_keys(self):
+        self.post('new1')
+        self.assertEqual(IdempotencyKey.objects.filter(key__startswith='old').count(), 3)
+        self.post('new2')
+        self.post('new3')
+        self.assertFalse(IdempotencyKey.objects.filter(key__startswith='old').exists())
+        self.assertEqual(
+            set(IdempotencyKey.objects.values_list('key', flat=True)), {'fresh', 'new1', 'new2', 'new3'}
+        )
+
+    @override_settings(IDEMPOTENCY_PURGE_EVERY=10 ** 9)
+    def test_purge_waits_for_every_nth_key(self):
+        self.post('new1')
+        self.assertEqual(IdempotencyKey.objects.filter(key__startswith='old').count(), 5)
+
+    def test_purge_command_deletes_all_expired_keys_in_batches(self):
+        call_command('purge_idempotency_keys', batch_size=2, stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['fresh'])
@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'coachs',
     'testprocces',
     'twallet',
+    'idempotency',
 ]
 
 MIDDLEWARE = [
@@ -83,6 +84,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # چند پروسس تطبیق به جای خطای "database is locked" منتظر قفل می‌مانند؛
+            # تراکنش‌های تطبیق خودشان با BEGIN IMMEDIATE شروع می‌شوند
+            'timeout': 20,
+        },
     }
 }
 
@@ -144,6 +150,62 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Cache
+# در اجرای چند پروسسی بهتر است از یک cache مشترک (مثلاً Redis) استفاده شود
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # نسخه روزهای باشگاه‌ها (gyms.versions)؛ باید بین همه پروسس‌ها مشترک باشد
+    'gyms': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache' / 'gyms',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # نتیجه شمارش رزروهای اسلات‌ها و آمار hit/miss
+    'testprocces': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'cache' / 'testprocces',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# مدت نگهداری پاسخ‌های ذخیره شده Idempotency-Key (ثانیه)
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+
+# هر چند کلید جدید یک دسته از کلیدهای منقضی حذف شود و اندازه هر دسته
+IDEMPOTENCY_PURGE_EVERY = 100
+IDEMPOTENCY_PURGE_BATCH_SIZE = 500
+
+# مدت معتبر بودن علامت "در حال پردازش" یک Idempotency-Key (ثانیه)
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = 60
+
+# مدت نگهداری موجودی‌ها در cache (ثانیه)
+TWALLET_BALANCE_CACHE_TIMEOUT = 5
+
+# تعداد ایندکس‌های بازه‌ای روزهای باشگاه که در حافظه هر پروسس نگه داشته می‌شوند
+GYMS_INTERVAL_INDEX_SIZE = 4096
+
+# مدت نگهداری نتیجه شمارش رزروهای اسلات‌ها در cache testprocces (ثانیه)
+TESTPROCCES_CACHE_TIMEOUT = 300
+
+# ژورنال رویدادها و snapshot دفتر سفارشات برای بازیابی سریع (None یعنی غیرفعال)
+TWALLET_JOURNAL_DIR = BASE_DIR / 'var' / 'twallet'
+TWALLET_JOURNAL_FSYNC_EVERY = 64
+TWALLET_JOURNAL_FSYNC_INTERVAL = 0.05
+TWALLET_SNAPSHOT_EVERY = 1000
+
+# سفارشات تکمیل یا لغو شده قدیمی‌تر از این تعداد روز بایگانی می‌شوند (archive_orders)
+TWALLET_ARCHIVE_AFTER_DAYS = 30
+
+# ثبت همه سفارشات خرید و فروش در صف ناهمگام (پردازش با manage.py twallet_worker)؛
+# بدون آن هم هدر Prefer: respond-async یک درخواست را ناهمگام می‌کند
+TWALLET_ASYNC_INTAKE = False
+
 # Email settings (for password reset and notifications)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For development
 DEFAULT_FROM_EMAIL = 'noreply@example.com'
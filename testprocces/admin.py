@@ -7,15 +7,15 @@ class TestProcessAdmin(admin.ModelAdmin):
     """
     پنل ادمین برای فرآیندهای تست
     """
-    list_display = ('user', 'test_name', 'start_time', 'end_time', 'test_duration', 'total_slots', 'total_reservations', 'created_at')
+    list_display = ('user', 'test_name', 'gym_name', 'test_date', 'start_time', 'end_time', 'test_duration', 'total_slots', 'total_reservations', 'created_at')
     list_filter = ('test_name', 'created_at', 'test_duration')
-    search_fields = ('user__username', 'test_name')
+    search_fields = ('user__username', 'test_name', 'gym_name')
     ordering = ('-created_at',)
     
     fieldsets = (
         ('اطلاعات کاربر', {'fields': ('user',)}),
-        ('اطلاعات تست', {'fields': ('test_name', 'test_duration')}),
-        ('بازه زمانی', {'fields': ('start_time', 'end_time')}),
+        ('اطلاعات تست', {'fields': ('test_name', 'test_duration', 'gym_name')}),
+        ('بازه زمانی', {'fields': ('test_date', 'start_time', 'end_time')}),
         ('آمار', {'fields': ('total_slots', 'total_reservations')}),
         ('تاریخ', {'fields': ('created_at',)}),
     )
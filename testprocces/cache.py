@@ -0,0 +1,95 @@
+"""
+cache نتیجه شمارش رزروهای اسلات‌ها
+
+تعداد رزروهای هر اسلات فقط به باشگاه، تاریخ، بازه زمانی و مدت تست بستگی
+دارد و برای درخواست‌های تکراری کاربران مختلف دوباره محاسبه نمی‌شود. کلید
+cache شامل شناسه باشگاه‌های همنام و نسخه روز هر کدام از gyms.versions است،
+پس هر تغییر TimeSlot یا باشگاه‌ها پس از commit کلید را عوض می‌کند و نتیجه
+قدیمی هیچ‌وقت خوانده نمی‌شود. نتایج و آمار hit/miss در cache مشترک
+testprocces نگه داشته می‌شوند.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from gyms.versions import day_versions, gym_ids
+
+
+RESULT_CACHE_TIMEOUT = getattr(settings, 'TESTPROCCES_CACHE_TIMEOUT', 300)
+
+HITS_KEY = 'testprocces:hits'
+MISSES_KEY = 'testprocces:misses'
+
+
+def _cache():
+    return caches['testprocces']
+
+
+def _count(key, amount):
+    if not amount:
+        return
+    try:
+        _cache().incr(key, amount)
+    except ValueError:
+        if not _cache().add(key, amount, timeout=None):
+            _cache().incr(key, amount)
+
+
+def cached_reservations(gym_days, start_time, end_time, duration_minutes, compute):
+    """
+    تعداد رزروهای اسلات‌ها برای هر (نام باشگاه، تاریخ)
+
+    خروجی دیکشنری (نام باشگاه، تاریخ) -> لیست تعداد رزرو به ترتیب اسلات‌ها.
+    compute با لیست روزهایی که در cache نیستند فراخوانی می‌شود و باید همین
+    دیکشنری را برای آن‌ها برگرداند.
+    """
+    gym_days = list(dict.fromkeys(gym_days))
+    ids = gym_ids({gym_name for gym_name, _ in gym_days})
+    versions = day_versions([
+        (gym_id, test_date) for gym_name, test_date in gym_days for gym_id in ids[gym_name]
+    ])
+    result_keys = {}
+    for gym_name, test_date in gym_days:
+        fingerprint = '\n'.join(map(str, (
+            gym_name, test_date, start_time, end_time, duration_minutes,
+            *(
+                f'{gym_id}:{versions[(gym_id, test_date)]}'
+                for gym_id in ids[gym_name]
+            ),
+        )))
+        result_keys[(gym_name, test_date)] = (
+            'testprocces:result:' + hashlib.md5(fingerprint.encode()).hexdigest()
+        )
+
+    cached = _cache().get_many(list(result_keys.values()))
+    results = {
+        gym_day: cached[key] for gym_day, key in result_keys.items() if key in cached
+    }
+    missing = [gym_day for gym_day in result_keys if gym_day not in results]
+    if missing:
+        computed = compute(missing)
+        _cache().set_many(
+            {result_keys[gym_day]: computed[gym_day] for gym_day in missing},
+            RESULT_CACHE_TIMEOUT
+        )
+        results.update(computed)
+
+    _count(HITS_KEY, len(result_keys) - len(missing))
+    _count(MISSES_KEY, len(missing))
+    return results
+
+
+def cache_stats():
+    """
+    تعداد hit و miss نتایج cache شده
+    """
+    counters = _cache().get_many([HITS_KEY, MISSES_KEY])
+    hits = counters.get(HITS_KEY, 0)
+    misses = counters.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0.0,
+    }
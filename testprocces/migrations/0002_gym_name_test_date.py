@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('testprocces', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testprocess',
+            name='gym_name',
+            field=models.CharField(blank=True, default='', max_length=100, verbose_name='نام باشگاه'),
+        ),
+        migrations.AddField(
+            model_name='testprocess',
+            name='test_date',
+            field=models.DateField(blank=True, null=True, verbose_name='تاریخ تست'),
+        ),
+    ]
@@ -8,6 +8,9 @@ class TestProcess(models.Model):
     """
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name='کاربر')
     test_name = models.CharField(max_length=100, verbose_name='نام تست')
+    # نام باشگاه یکتا نیست؛ همان نامی که شمارش رزروها برایش انجام شده
+    gym_name = models.CharField(max_length=100, blank=True, default='', verbose_name='نام باشگاه')
+    test_date = models.DateField(null=True, blank=True, verbose_name='تاریخ تست')
     start_time = models.TimeField(verbose_name='ساعت شروع')
     end_time = models.TimeField(verbose_name='ساعت پایان')
     test_duration = models.IntegerField(verbose_name='مدت زمان تست (دقیقه)')
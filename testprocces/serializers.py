@@ -50,7 +50,7 @@ class TestProcessResponseSerializer(serializers.ModelSerializer):
     سریالایزر برای پاسخ پردازش تست
     """
     username = serializers.CharField(source='user.username', read_only=True)
-    time_slots = TestSlotResultSerializer(source='slot_results', many=True, read_only=True)
+    time_slots = serializers.SerializerMethodField()
     
     class Meta:
         model = TestProcess
@@ -58,6 +58,15 @@ class TestProcessResponseSerializer(serializers.ModelSerializer):
             'username', 'test_name', 'test_duration', 
             'time_slots', 'total_slots', 'total_reservations'
         ]
+
+    def get_time_slots(self, obj):
+        """
+        نتایج اسلات‌ها؛ اگر در context داده شده باشند دوباره از دیتابیس خوانده نمی‌شوند
+        """
+        slot_results = self.context.get('slot_results')
+        if slot_results is None:
+            slot_results = obj.slot_results.all()
+        return TestSlotResultSerializer(slot_results, many=True).data
 class TestProcessWithGymRequestSerializer(serializers.Serializer):
     """
     سریالایزر برای درخواست پردازش تست با مشخص کردن باشگاه
@@ -97,3 +106,55 @@ class TestProcessWithGymRequestSerializer(serializers.Serializer):
         if not Gym.objects.filter(name=value).exists():
             raise serializers.ValidationError("باشگاه با این نام یافت نشد")
         return value
+
+
+class TestProcessBatchRequestSerializer(serializers.Serializer):
+    """
+    سریالایزر برای پردازش دسته‌ای یک تست در چند باشگاه و چند روز
+    """
+    MAX_GYMS = 50
+    MAX_DAYS = 62
+
+    username = serializers.CharField(max_length=150, help_text='نام کاربری')
+    test_name = serializers.CharField(max_length=100, help_text='نام تست')
+    gym_names = serializers.ListField(
+        child=serializers.CharField(max_length=100), allow_empty=False, max_length=MAX_GYMS,
+        help_text='نام باشگاه‌ها'
+    )
+    start_time = serializers.TimeField(help_text='ساعت شروع (HH:MM)')
+    end_time = serializers.TimeField(help_text='ساعت پایان (HH:MM)')
+    date_from = serializers.DateField(help_text='تاریخ شروع (YYYY-MM-DD)')
+    date_to = serializers.DateField(help_text='تاریخ پایان (YYYY-MM-DD)')
+    persist = serializers.BooleanField(default=False, help_text='ذخیره فرآیندها در دیتابیس')
+
+    def validate(self, data):
+        """
+        اعتبارسنجی بازه زمانی و بازه تاریخ
+        """
+        if data['start_time'] >= data['end_time']:
+            raise serializers.ValidationError("ساعت شروع باید قبل از ساعت پایان باشد")
+        if data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("تاریخ شروع باید قبل از تاریخ پایان باشد")
+        if (data['date_to'] - data['date_from']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f"بازه تاریخ نباید بیشتر از {self.MAX_DAYS} روز باشد")
+        return data
+
+    def validate_test_name(self, value):
+        """
+        اعتبارسنجی وجود تست
+        """
+        if not SportTest.objects.filter(name=value).exists():
+            raise serializers.ValidationError("تست با این نام یافت نشد")
+        return value
+
+    def validate_gym_names(self, value):
+        """
+        حذف نام‌های تکراری و اعتبارسنجی وجود همه باشگاه‌ها با یک کوئری
+        """
+        from gyms.models import Gym
+        gym_names = list(dict.fromkeys(value))
+        existing = set(Gym.objects.filter(name__in=gym_names).values_list('name', flat=True))
+        missing = [name for name in gym_names if name not in existing]
+        if missing:
+            raise serializers.ValidationError(f"باشگاه با این نام یافت نشد: {', '.join(missing)}")
+        return gym_names
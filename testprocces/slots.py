@@ -0,0 +1,94 @@
+"""
+محاسبه اسلات‌های زمانی تست و شمارش رزروهای هر اسلات
+
+تعداد رزروهای همپوشان هر اسلات از ایندکس بازه‌ای روز باشگاه
+(gyms.intervals) به دست می‌آید و برای هر روز باشگاه حداکثر یک‌بار از
+دیتابیس خوانده می‌شود. قاعده همپوشانی همان قاعده قبلی است:
+start_time < slot_end و end_time > slot_start
+"""
+from datetime import datetime, timedelta
+
+from gyms.intervals import day_indexes
+from gyms.versions import gym_ids
+
+from .cache import cached_reservations
+
+
+def add_minutes(time_obj, minutes):
+    """
+    اضافه کردن دقیقه به زمان
+    """
+    datetime_obj = datetime.combine(datetime.today(), time_obj)
+    new_datetime = datetime_obj + timedelta(minutes=minutes)
+    return new_datetime.time()
+
+
+def calculate_time_slots(start_time, end_time, duration_minutes):
+    """
+    تقسیم بازه زمانی به اسلات‌های کوچکتر
+    """
+    slots = []
+    current_time = start_time
+
+    while current_time < end_time:
+        slot_end = add_minutes(current_time, duration_minutes)
+
+        # اگر اسلات از بازه خارج شود، آن را محدود کن
+        if slot_end > end_time:
+            slot_end = end_time
+
+        slots.append({
+            'slot_start': current_time,
+            'slot_end': slot_end
+        })
+
+        current_time = slot_end
+
+    return slots
+
+
+def gym_day_indexes(gym_names, dates):
+    """
+    ایندکس‌های بازه‌ای هر (نام باشگاه، تاریخ)؛ نام باشگاه یکتا نیست پس
+    برای هر نام لیست ایندکس باشگاه‌های همنام برگردانده می‌شود
+    """
+    ids = gym_ids(gym_names)
+    indexes = day_indexes([
+        (gym_id, day) for gym_name in gym_names for gym_id in ids[gym_name] for day in dates
+    ])
+    return {
+        (gym_name, day): [indexes[(gym_id, day)] for gym_id in ids[gym_name]]
+        for gym_name in gym_names for day in dates
+    }
+
+
+def slot_counts(slots, indexes):
+    """
+    تعداد رزروهای همپوشان هر اسلات به ترتیب اسلات‌ها
+    """
+    return [
+        sum(index.count(slot['slot_start'], slot['slot_end']) for index in indexes)
+        for slot in slots
+    ]
+
+
+def gym_day_reservations(gym_name, test_date, start_time, end_time, duration_minutes):
+    """
+    اسلات‌های بازه و تعداد رزروهای هر اسلات در یک روز باشگاه (با cache)
+    """
+    slots = calculate_time_slots(start_time, end_time, duration_minutes)
+    gym_day = (gym_name, test_date)
+    counts = cached_reservations(
+        [gym_day], start_time, end_time, duration_minutes,
+        lambda missing: {
+            gym_day: slot_counts(slots, gym_day_indexes([gym_name], [test_date])[gym_day])
+        }
+    )[gym_day]
+    return [
+        {
+            'slot_start': slot['slot_start'],
+            'slot_end': slot['slot_end'],
+            'reservations_count': count
+        }
+        for slot, count in zip(slots, counts)
+    ]
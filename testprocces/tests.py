@@ -1,3 +1,304 @@
-from django.test import TestCase
+import random
+import tempfile
+from datetime import date, time, timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from gyms.models import Gym, TimeSlot
+from tests.models import SportTest
+
+from .models import TestProcess, TestSlotResult
+from .cache import cache_stats
+from .slots import calculate_time_slots, gym_day_reservations
+
+
+def old_slot_count(gym_name, test_date, slot):
+    """
+    شمارش قبلی رزروهای هر اسلات با یک کوئری جداگانه
+    """
+    return TimeSlot.objects.filter(
+        gym__name=gym_name, date=test_date,
+        start_time__lt=slot['slot_end'], end_time__gt=slot['slot_start']
+    ).count()
+
+
+class CacheTestCase(TestCase):
+    """
+    cacheهای gyms و testprocces هر تست در یک پوشه موقت جداگانه
+    """
+    def setUp(self):
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        for alias in ('gyms', 'testprocces'):
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            caches[alias] = {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': directory.name,
+            }
+        settings_override = override_settings(CACHES=caches)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_gym(self, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Gym.objects.create(name=name, phone='1', address='a', owner='o')
+
+    def add_slot(self, gym, day, start_time, end_time):
+        with self.captureOnCommitCallbacks(execute=True):
+            return TimeSlot.objects.create(gym=gym, date=day, start_time=start_time, end_time=end_time)
+
+
+class SlotCountTests(CacheTestCase):
+    def test_counts_match_per_slot_query(self):
+        rng = random.Random(1403)
+        day = date(2025, 3, 1)
+        # دو باشگاه همنام و یک باشگاه دیگر که نباید شمرده شود
+        gyms = [self.create_gym('g'), self.create_gym('g'), self.create_gym('other')]
+        rows = []
+        for gym in gyms:
+            for _ in range(40):
+                start = rng.randint(6 * 4, 22 * 4)
+                # بازه‌های خالی و معکوس هم در دیتابیس ممکن هستند
+                end = min(start + rng.randint(-4, 12), 24 * 4 - 1)
+                rows.append(TimeSlot(
+                    gym=gym, date=day, start_time=time(start // 4, start % 4 * 15),
+                    end_time=time(end // 4, end % 4 * 15)
+                ))
+        TimeSlot.objects.bulk_create(rows, ignore_conflicts=True)
+
+        for start_time, end_time, duration in (
+            (time(6), time(23), 45), (time(8, 10), time(12, 50), 20), (time(0), time(22, 30), 90),
+        ):
+            slots = gym_day_reservations('g', day, start_time, end_time, duration)
+            self.assertEqual(
+                [slot['reservations_count'] for slot in slots],
+                [old_slot_count('g', day, slot) for slot in calculate_time_slots(start_time, end_time, duration)]
+            )
+
+    def test_zero_length_and_inverted_rows(self):
+        day = date(2025, 3, 2)
+        gym = self.create_gym('g')
+        self.add_slot(gym, day, time(10), time(10))
+        self.add_slot(gym, day, time(10, 30), time(10, 30))
+        self.add_slot(gym, day, time(10, 45), time(10, 15))
+        self.add_slot(gym, day, time(12), time(9))
+        self.add_slot(gym, day, time(9), time(11))
+
+        slots = gym_day_reservations('g', day, time(8), time(13), 60)
+        self.assertEqual(
+            [slot['reservations_count'] for slot in slots],
+            [old_slot_count('g', day, slot) for slot in slots]
+        )
+        self.assertEqual([slot['reservations_count'] for slot in slots], [0, 1, 3, 0, 0])
+
+    def test_unknown_gym_has_no_reservations(self):
+        slots = gym_day_reservations('missing', date(2025, 3, 3), time(8), time(10), 60)
+        self.assertEqual([slot['reservations_count'] for slot in slots], [0, 0])
+
+
+class ProcessEndpointTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        get_user_model().objects.create_user(username='u', password='x')
+        SportTest.objects.create(
+            name='run', author='g', average_duration=timedelta(minutes=30), sport_type='سایر'
+        )
+        self.day = date(2025, 4, 1)
+        self.gym = self.create_gym('g')
+        for start_hour, end_hour in ((9, 11), (10, 12), (10, 10)):
+            self.add_slot(self.gym, self.day, time(start_hour), time(end_hour))
+
+    def post(self, path, **data):
+        data = {'username': 'u', 'test_name': 'run', 'test_date': self.day, **data}
+        return self.client.post(f'/testprocces/{path}/', data, content_type='application/json')
+
+    def expected_payload(self, gym_name, test_date, start_time, end_time):
+        slots = [
+            {
+                'slot_start': slot['slot_start'].strftime('%H:%M:%S'),
+                'slot_end': slot['slot_end'].strftime('%H:%M:%S'),
+                'reservations_count': old_slot_count(gym_name, test_date, slot),
+            }
+            for slot in calculate_time_slots(start_time, end_time, 30)
+        ]
+        return {
+            'username': 'u', 'test_name': 'run', 'test_duration': 30, 'time_slots': slots,
+            'total_slots': len(slots),
+            'total_reservations': sum(slot['reservations_count'] for slot in slots),
+        }
+
+    def test_process_payload(self):
+        response = self.post('process', start_time='08:00', end_time='12:00')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), self.expected_payload('g', self.day, time(8), time(12)))
+
+        test_process = TestProcess.objects.get()
+        self.assertEqual((test_process.gym_name, test_process.test_date), ('g', self.day))
+        self.assertEqual(
+            list(test_process.slot_results.values_list('slot_start', 'reservations_count')),
+            [(time(8), 0), (time(8, 30), 0), (time(9), 1), (time(9, 30), 1),
+             (time(10), 2), (time(10, 30), 2), (time(11), 1), (time(11, 30), 1)]
+        )
+
+    def test_process_gym_payload(self):
+        response = self.post('process-gym', gym_name='g', start_time='09:15', end_time='11:45')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), self.expected_payload('g', self.day, time(9, 15), time(11, 45)))
+
+    def test_query_count_does_not_grow_with_slots(self):
+        self.create_gym('h')
+        for gym_name in ('g', 'h'):
+            self.post('process-gym', gym_name=gym_name, start_time='09:00', end_time='09:30')
+
+        # هر درخواست روز تازه‌ای دارد تا از cache نتیجه‌ها خوانده نشود
+        with CaptureQueriesContext(connection) as short:
+            self.post('process-gym', gym_name='g', start_time='09:00', end_time='10:00',
+                      test_date='2025-04-02')
+        with CaptureQueriesContext(connection) as long:
+            self.post('process-gym', gym_name='h', start_time='06:00', end_time='22:00',
+                      test_date='2025-04-03')
+        self.assertEqual(len(long), len(short))
+        self.assertEqual(TestSlotResult.objects.count(), 1 + 1 + 2 + 32)
+
+
+class BatchProcessTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        get_user_model().objects.create_user(username='u', password='x')
+        SportTest.objects.create(
+            name='run', author='g', average_duration=timedelta(minutes=60), sport_type='سایر'
+        )
+        self.days = [date(2025, 5, 1), date(2025, 5, 2)]
+        g, h = self.create_gym('g'), self.create_gym('h')
+        self.add_slot(g, self.days[0], time(9), time(11))
+        self.add_slot(g, self.days[1], time(10), time(12))
+        self.add_slot(h, self.days[1], time(8), time(10))
+        self.add_slot(h, self.days[1], time(9), time(9, 30))
+
+    def post(self, **data):
+        data = {
+            'username': 'u', 'test_name': 'run', 'gym_names': ['g', 'h'],
+            'start_time': '08:00', 'end_time': '12:00',
+            'date_from': '2025-05-01', 'date_to': '2025-05-02', **data
+        }
+        return self.client.post('/testprocces/process-batch/', data, content_type='application/json')
+
+    def test_matrix_matches_per_slot_query(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 200)
+        slots = calculate_time_slots(time(8), time(12), 60)
+        self.assertEqual(response.data['total_slots'], 4)
+        self.assertEqual(
+            [(gym['gym_name'], [cell['reservations'] for cell in gym['dates']]) for gym in response.data['gyms']],
+            [
+                (gym_name, [[old_slot_count(gym_name, day, slot) for slot in slots] for day in self.days])
+                for gym_name in ('g', 'h')
+            ]
+        )
+        self.assertEqual(
+            [[cell['reservations'] for cell in gym['dates']] for gym in response.data['gyms']],
+            [[[0, 1, 1, 0], [0, 0, 1, 1]], [[0, 0, 0, 0], [1, 2, 0, 0]]]
+        )
+        self.assertFalse(TestProcess.objects.exists())
+
+    def test_persist_stores_one_process_per_gym_and_day(self):
+        response = self.post(persist=True)
+        self.assertEqual(response.status_code, 200)
+
+        processes = TestProcess.objects.order_by('id')
+        self.assertEqual(
+            [(p.gym_name, p.test_date, p.total_reservations) for p in processes],
+            [('g', self.days[0], 2), ('g', self.days[1], 2), ('h', self.days[0], 0), ('h', self.days[1], 3)]
+        )
+        cells = [cell for gym in response.data['gyms'] for cell in gym['dates']]
+        self.assertEqual([cell['test_process_id'] for cell in cells], [p.id for p in processes])
+        for test_process, cell in zip(processes, cells):
+            self.assertEqual(
+                list(test_process.slot_results.values_list('reservations_count', flat=True)),
+                cell['reservations']
+            )
+
+    def test_limits(self):
+        self.assertEqual(self.post(gym_names=[f'g{i}' for i in range(51)]).status_code, 400)
+        self.assertEqual(self.post(date_from='2025-01-01', date_to='2025-03-04').status_code, 400)
+        self.assertEqual(self.post(date_from='2025-01-01', date_to='2025-03-03').status_code, 200)
+        self.assertEqual(self.post(date_from='2025-05-02', date_to='2025-05-01').status_code, 400)
+        self.assertEqual(self.post(gym_names=['g', 'missing']).status_code, 400)
+
+    def test_duplicate_gym_names_are_merged(self):
+        response = self.post(gym_names=['h', 'g', 'h'])
+        self.assertEqual([gym['gym_name'] for gym in response.data['gyms']], ['h', 'g'])
+
+
+class ResultCacheTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.day = date(2025, 6, 1)
+        self.gym = self.create_gym('g')
+        self.slot = self.add_slot(self.gym, self.day, time(9), time(11))
+
+    def counts(self, gym_name='g', day=None):
+        return [
+            slot['reservations_count']
+            for slot in gym_day_reservations(gym_name, day or self.day, time(8), time(12), 60)
+        ]
+
+    def assertStats(self, hits, misses):
+        stats = cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (hits, misses))
+
+    def test_repeated_request_is_a_hit(self):
+        self.assertEqual(self.counts(), [0, 1, 1, 0])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.counts(), [0, 1, 1, 0])
+        self.assertStats(1, 1)
+        response = self.client.get('/testprocces/cache-stats/')
+        self.assertEqual(response.data, {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_timeslot_save_invalidates(self):
+        self.counts()
+        self.add_slot(self.gym, self.day, time(10), time(12))
+        self.assertEqual(self.counts(), [0, 1, 2, 1])
+        self.assertStats(0, 2)
+
+    def test_timeslot_move_invalidates_both_days(self):
+        other_day = date(2025, 6, 2)
+        self.counts()
+        self.counts(day=other_day)
+        self.slot.date = other_day
+        with self.captureOnCommitCallbacks(execute=True):
+            self.slot.save()
+        self.assertEqual(self.counts(), [0, 0, 0, 0])
+        self.assertEqual(self.counts(day=other_day), [0, 1, 1, 0])
+        self.assertStats(0, 4)
+
+    def test_timeslot_delete_invalidates(self):
+        self.counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.slot.delete()
+        self.assertEqual(self.counts(), [0, 0, 0, 0])
+        self.assertStats(0, 2)
+
+    def test_gym_rename_invalidates(self):
+        other = self.create_gym('h')
+        self.add_slot(other, self.day, time(8), time(9))
+        self.assertEqual(self.counts(), [0, 1, 1, 0])
+        self.assertEqual(self.counts('h'), [1, 0, 0, 0])
+
+        other.name = 'g'
+        with self.captureOnCommitCallbacks(execute=True):
+            other.save()
+        self.assertEqual(self.counts(), [1, 1, 1, 0])
+        self.assertEqual(self.counts('h'), [0, 0, 0, 0])
+        self.assertStats(0, 4)
+
+    def test_change_is_invisible_until_commit(self):
+        self.counts()
+        with self.captureOnCommitCallbacks(execute=False):
+            TimeSlot.objects.create(gym=self.gym, date=self.day, start_time=time(8), end_time=time(9))
+            # نسخه روز فقط پس از commit عوض می‌شود
+            self.assertEqual(self.counts(), [0, 1, 1, 0])
+        self.assertStats(1, 1)
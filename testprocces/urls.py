@@ -9,5 +9,9 @@ urlpatterns = [
     # پردازش تست و تقسیم بازه زمانی
     path('process/', views.TestProcessView.as_view(), name='test_process'),
     path('process-gym/', views.TestProcessWithGymView.as_view(), name='test_process_with_gym'),
+    # پردازش دسته‌ای یک تست در چند باشگاه و چند روز
+    path('process-batch/', views.TestProcessBatchView.as_view(), name='test_process_batch'),
+    # آمار cache نتایج شمارش رزروها
+    path('cache-stats/', views.ProcessCacheStatsView.as_view(), name='process_cache_stats'),
 
 ]
@@ -3,14 +3,19 @@ from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
+from idempotency.decorators import idempotent
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.utils import timezone
-from datetime import datetime, timedelta, date
-import math
+from datetime import date, timedelta
 
 from .models import TestProcess, TestSlotResult
-from .serializers import TestProcessRequestSerializer, TestProcessResponseSerializer
-from gyms.models import TimeSlot, Gym
+from .serializers import (
+    TestProcessRequestSerializer, TestProcessResponseSerializer,
+    TestProcessWithGymRequestSerializer, TestProcessBatchRequestSerializer
+)
+from .cache import cache_stats, cached_reservations
+from .slots import calculate_time_slots, gym_day_indexes, gym_day_reservations, slot_counts
 from tests.models import SportTest
 from tests.serializers import SportTestSerializer
 
@@ -35,6 +40,7 @@ class TestProcessView(APIView):
 
 
     
+    @idempotent
     def post(self, request):
         """
         پردازش درخواست تست و تقسیم بازه زمانی
@@ -69,95 +75,46 @@ class TestProcessView(APIView):
                 'error': 'تست یافت نشد'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # محاسبه اسلات‌های زمانی
-        slots = self._calculate_time_slots(start_time, end_time, test_duration)
-        
-        # شمارش رزروها در هر اسلات از باشگاه نویسنده تست
-        slots_with_reservations = self._count_reservations_in_slots(slots, gym_author, test_date)
+        # محاسبه اسلات‌ها و شمارش رزروهای هر اسلات (از cache در صورت وجود)
+        slots_with_reservations = gym_day_reservations(
+            gym_author, test_date, start_time, end_time, test_duration
+        )
         
         # محاسبه آمار کلی
         total_slots = len(slots_with_reservations)
         total_reservations = sum(slot['reservations_count'] for slot in slots_with_reservations)
         
         # ذخیره در دیتابیس
-        test_process = TestProcess.objects.create(
-            user=user,
-            test_name=test_name,
-            start_time=start_time,
-            end_time=end_time,
-            test_duration=test_duration,
-            total_slots=total_slots,
-            total_reservations=total_reservations
-        )
-        
-        # ذخیره نتایج اسلات‌ها
-        for slot in slots_with_reservations:
-            TestSlotResult.objects.create(
-                test_process=test_process,
-                slot_start=slot['slot_start'],
-                slot_end=slot['slot_end'],
-                reservations_count=slot['reservations_count']
+        with transaction.atomic():
+            test_process = TestProcess.objects.create(
+                user=user,
+                test_name=test_name,
+                gym_name=gym_author,
+                test_date=test_date,
+                start_time=start_time,
+                end_time=end_time,
+                test_duration=test_duration,
+                total_slots=total_slots,
+                total_reservations=total_reservations
             )
-        
-        # بازگرداندن نتیجه
-        response_serializer = TestProcessResponseSerializer(test_process)
-        return Response(response_serializer.data, status=status.HTTP_200_OK)
-    
-    def _calculate_time_slots(self, start_time, end_time, duration_minutes):
-        """
-        تقسیم بازه زمانی به اسلات‌های کوچکتر
-        """
-        slots = []
-        current_time = start_time
-        
-        while current_time < end_time:
-            slot_end = self._add_minutes(current_time, duration_minutes)
-            
-            # اگر اسلات از بازه خارج شود، آن را محدود کن
-            if slot_end > end_time:
-                slot_end = end_time
-            
-            slots.append({
-                'slot_start': current_time,
-                'slot_end': slot_end
-            })
-            
-            current_time = slot_end
-        
-        return slots
-    
-    def _add_minutes(self, time_obj, minutes):
-        """
-        اضافه کردن دقیقه به زمان
-        """
-        datetime_obj = datetime.combine(datetime.today(), time_obj)
-        new_datetime = datetime_obj + timedelta(minutes=minutes)
-        return new_datetime.time()
-    
-    def _count_reservations_in_slots(self, slots, gym_author, test_date):
-        """
-        شمارش رزروهای موجود در باشگاه نویسنده تست برای تاریخ مشخص
-        """
-        slots_with_reservations = []
-        
-        for slot in slots:
-            # پیدا کردن رزروهای موجود در باشگاه نویسنده تست برای تاریخ مشخص
-            # بررسی تداخل زمانی بین اسلات و رزروهای موجود در باشگاه
-            reservations = TimeSlot.objects.filter(
-                gym__name=gym_author,  # فقط باشگاه نویسنده تست
-                date=test_date,  # تاریخ مشخص
-                start_time__lt=slot['slot_end'],
-                end_time__gt=slot['slot_start']
-            ).count()
             
-            slots_with_reservations.append({
-                'slot_start': slot['slot_start'],
-                'slot_end': slot['slot_end'],
-                'reservations_count': reservations  # تعداد رزروهای موجود در باشگاه
-            })
+            # ذخیره نتایج اسلات‌ها با یک کوئری
+            slot_results = TestSlotResult.objects.bulk_create([
+                TestSlotResult(
+                    test_process=test_process,
+                    slot_start=slot['slot_start'],
+                    slot_end=slot['slot_end'],
+                    reservations_count=slot['reservations_count']
+                )
+                for slot in slots_with_reservations
+            ])
         
-        return slots_with_reservations
-from .serializers import TestProcessRequestSerializer, TestProcessResponseSerializer, TestProcessWithGymRequestSerializer  # اضافه کردن سریالایزر جدید
+        # بازگرداندن نتیجه از نتایج همین درخواست بدون خواندن دوباره
+        response_serializer = TestProcessResponseSerializer(
+            test_process, context={'slot_results': slot_results}
+        )
+        return Response(response_serializer.data, status=status.HTTP_200_OK)
+
 
 class TestProcessWithGymView(APIView):
     """
@@ -165,6 +122,7 @@ class TestProcessWithGymView(APIView):
     """
     permission_classes = [AllowAny]
     
+    @idempotent
     def post(self, request):
         """
         پردازش درخواست تست برای باشگاه مشخص
@@ -198,89 +156,172 @@ class TestProcessWithGymView(APIView):
                 'error': 'تست یافت نشد'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # محاسبه اسلات‌های زمانی
-        slots = self._calculate_time_slots(start_time, end_time, test_duration)
-        
-        # شمارش رزروها در هر اسلات از باشگاه مشخص شده
-        slots_with_reservations = self._count_reservations_in_specific_gym(slots, gym_name, test_date)
+        # محاسبه اسلات‌ها و شمارش رزروهای هر اسلات (از cache در صورت وجود)
+        slots_with_reservations = gym_day_reservations(
+            gym_name, test_date, start_time, end_time, test_duration
+        )
         
         # محاسبه آمار کلی
         total_slots = len(slots_with_reservations)
         total_reservations = sum(slot['reservations_count'] for slot in slots_with_reservations)
         
         # ذخیره در دیتابیس
-        test_process = TestProcess.objects.create(
-            user=user,
-            test_name=test_name,
-            start_time=start_time,
-            end_time=end_time,
-            test_duration=test_duration,
-            total_slots=total_slots,
-            total_reservations=total_reservations
-        )
-        
-        # ذخیره نتایج اسلات‌ها
-        for slot in slots_with_reservations:
-            TestSlotResult.objects.create(
-                test_process=test_process,
-                slot_start=slot['slot_start'],
-                slot_end=slot['slot_end'],
-                reservations_count=slot['reservations_count']
+        with transaction.atomic():
+            test_process = TestProcess.objects.create(
+                user=user,
+                test_name=test_name,
+                gym_name=gym_name,
+                test_date=test_date,
+                start_time=start_time,
+                end_time=end_time,
+                test_duration=test_duration,
+                total_slots=total_slots,
+                total_reservations=total_reservations
             )
-        
-        # بازگرداندن نتیجه
-        response_serializer = TestProcessResponseSerializer(test_process)
-        return Response(response_serializer.data, status=status.HTTP_200_OK)
-    
-    def _count_reservations_in_specific_gym(self, slots, gym_name, test_date):
-        """
-        شمارش رزروهای موجود در باشگاه مشخص شده برای تاریخ مشخص
-        """
-        slots_with_reservations = []
-        
-        for slot in slots:
-            reservations = TimeSlot.objects.filter(
-                gym__name=gym_name,  # باشگاه مشخص شده توسط کاربر
-                date=test_date,
-                start_time__lt=slot['slot_end'],
-                end_time__gt=slot['slot_start']
-            ).count()
             
-            slots_with_reservations.append({
-                'slot_start': slot['slot_start'],
-                'slot_end': slot['slot_end'],
-                'reservations_count': reservations
-            })
+            # ذخیره نتایج اسلات‌ها با یک کوئری
+            slot_results = TestSlotResult.objects.bulk_create([
+                TestSlotResult(
+                    test_process=test_process,
+                    slot_start=slot['slot_start'],
+                    slot_end=slot['slot_end'],
+                    reservations_count=slot['reservations_count']
+                )
+                for slot in slots_with_reservations
+            ])
         
-        return slots_with_reservations
-    
-    # متدهای کمکی مشترک (کپی از کلاس قبلی)
-    def _calculate_time_slots(self, start_time, end_time, duration_minutes):
+        # بازگرداندن نتیجه از نتایج همین درخواست بدون خواندن دوباره
+        response_serializer = TestProcessResponseSerializer(
+            test_process, context={'slot_results': slot_results}
+        )
+        return Response(response_serializer.data, status=status.HTTP_200_OK)
+
+
+class TestProcessBatchView(APIView):
+    """
+    ویو برای پردازش یک تست در چند باشگاه و چند روز با یک درخواست
+    """
+    permission_classes = [AllowAny]
+
+    @idempotent
+    def post(self, request):
         """
-        تقسیم بازه زمانی به اسلات‌های کوچکتر
+        ساخت ماتریس تعداد رزرو اسلات × باشگاه × تاریخ
         """
-        slots = []
-        current_time = start_time
-        
-        while current_time < end_time:
-            slot_end = self._add_minutes(current_time, duration_minutes)
-            
-            if slot_end > end_time:
-                slot_end = end_time
-            
-            slots.append({
-                'slot_start': current_time,
-                'slot_end': slot_end
-            })
-            
-            current_time = slot_end
-        
-        return slots
-    
-    def _add_minutes(self, time_obj, minutes):
+        serializer = TestProcessBatchRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        username = serializer.validated_data['username']
+        test_name = serializer.validated_data['test_name']
+        gym_names = serializer.validated_data['gym_names']
+        start_time = serializer.validated_data['start_time']
+        end_time = serializer.validated_data['end_time']
+        date_from = serializer.validated_data['date_from']
+        date_to = serializer.validated_data['date_to']
+
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            return Response({
+                'error': 'کاربر یافت نشد'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        test = SportTest.objects.filter(name=test_name).first()
+        if test is None:
+            return Response({
+                'error': 'تست یافت نشد'
+            }, status=status.HTTP_404_NOT_FOUND)
+        test_duration = int(test.average_duration.total_seconds() / 60)
+
+        slots = calculate_time_slots(start_time, end_time, test_duration)
+        dates = [
+            date_from + timedelta(days=offset)
+            for offset in range((date_to - date_from).days + 1)
+        ]
+
+        def compute(missing):
+            # ایندکس همه روزهای خارج از cache با حداکثر یک کوئری
+            indexes = gym_day_indexes(
+                {gym_name for gym_name, _ in missing}, {test_date for _, test_date in missing}
+            )
+            return {gym_day: slot_counts(slots, indexes[gym_day]) for gym_day in missing}
+
+        counts = cached_reservations(
+            [(gym_name, test_date) for gym_name in gym_names for test_date in dates],
+            start_time, end_time, test_duration, compute
+        )
+
+        gyms = []
+        cells = []
+        for gym_name in gym_names:
+            gym_dates = []
+            for test_date in dates:
+                reservations = counts[(gym_name, test_date)]
+                cell = {
+                    'date': test_date,
+                    'reservations': reservations,
+                    'total_reservations': sum(reservations),
+                }
+                gym_dates.append(cell)
+                cells.append((gym_name, cell))
+            gyms.append({'gym_name': gym_name, 'dates': gym_dates})
+
+        if serializer.validated_data['persist']:
+            self._persist(user, test_name, start_time, end_time, test_duration, slots, cells)
+
+        return Response({
+            'username': user.username,
+            'test_name': test_name,
+            'test_duration': test_duration,
+            'total_slots': len(slots),
+            'time_slots': [
+                {'slot_start': slot['slot_start'], 'slot_end': slot['slot_end']} for slot in slots
+            ],
+            'gyms': gyms,
+        }, status=status.HTTP_200_OK)
+
+    def _persist(self, user, test_name, start_time, end_time, test_duration, slots, cells):
         """
-        اضافه کردن دقیقه به زمان
+        ذخیره یک فرآیند تست برای هر باشگاه و روز و نتایج اسلات‌ها با دو کوئری
+
+        cells لیست (نام باشگاه، خانه ماتریس) است؛ نام باشگاه و تاریخ روی
+        هر فرآیند ذخیره می‌شوند.
         """
-        datetime_obj = datetime.combine(datetime.today(), time_obj)
-        new_datetime = datetime_obj + timedelta(minutes=minutes)
-        return new_datetime.time()
\ No newline at end of file
+        with transaction.atomic():
+            processes = TestProcess.objects.bulk_create([
+                TestProcess(
+                    user=user,
+                    test_name=test_name,
+                    gym_name=gym_name,
+                    test_date=cell['date'],
+                    start_time=start_time,
+                    end_time=end_time,
+                    test_duration=test_duration,
+                    total_slots=len(slots),
+                    total_reservations=cell['total_reservations']
+                )
+                for gym_name, cell in cells
+            ])
+            TestSlotResult.objects.bulk_create([
+                TestSlotResult(
+                    test_process=test_process,
+                    slot_start=slot['slot_start'],
+                    slot_end=slot['slot_end'],
+                    reservations_count=count
+                )
+                for test_process, (_, cell) in zip(processes, cells)
+                for slot, count in zip(slots, cell['reservations'])
+            ])
+        for test_process, (_, cell) in zip(processes, cells):
+            cell['test_process_id'] = test_process.id
+
+
+class ProcessCacheStatsView(APIView):
+    """
+    نمایش تعداد hit و miss نتایج cache شده شمارش رزروها
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response(cache_stats(), status=status.HTTP_200_OK)
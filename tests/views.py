@@ -3,6 +3,7 @@ from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
+from idempotency.decorators import idempotent
 
 from .models import SportTest
 from .serializers import (
@@ -26,6 +27,7 @@ class SportTestCreateView(APIView):
     """
     permission_classes = [AllowAny]
     
+    @idempotent
     def post(self, request):
         serializer = SportTestCreateSerializer(data=request.data)
         if serializer.is_valid():
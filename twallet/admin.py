@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import TokenBalance, UserBalance, BuyOrder, SellOrder, Transaction
+from .models import (
+    TokenBalance, UserBalance, BuyOrder, SellOrder, Transaction, Candle,
+    ArchivedBuyOrder, ArchivedSellOrder, OrderRequest, WalletReconciliation
+)
 
 
 @admin.register(TokenBalance)
@@ -61,3 +64,48 @@ class TransactionAdmin(admin.ModelAdmin):
     search_fields = ('id', 'buyer_username', 'seller_username')
     readonly_fields = ('total_amount', 'buyer_balance_after', 'seller_balance_after', 'created_at')
     ordering = ('-created_at',)
+
+
+@admin.register(Candle)
+class CandleAdmin(admin.ModelAdmin):
+    """
+    پنل ادمین برای کندل‌های قیمت
+    """
+    list_display = ('interval', 'bucket_start', 'open', 'high', 'low', 'close', 'volume', 'trade_count')
+    list_filter = ('interval',)
+    readonly_fields = ('updated_at',)
+    ordering = ('-bucket_start',)
+
+
+@admin.register(ArchivedBuyOrder, ArchivedSellOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """
+    پنل ادمین برای سفارشات بایگانی شده
+    """
+    list_display = ('id', 'username', 'quantity', 'price_per_token', 'total_amount', 'status', 'created_at', 'archived_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('id', 'username')
+    ordering = ('-created_at',)
+
+
+@admin.register(OrderRequest)
+class OrderRequestAdmin(admin.ModelAdmin):
+    """
+    پنل ادمین برای صف سفارشات ناهمگام
+    """
+    list_display = ('id', 'side', 'username', 'quantity', 'price_per_token', 'status', 'order_id', 'created_at', 'processed_at')
+    list_filter = ('side', 'status')
+    search_fields = ('id', 'username')
+    readonly_fields = ('created_at', 'processed_at')
+    ordering = ('-id',)
+
+
+@admin.register(WalletReconciliation)
+class WalletReconciliationAdmin(admin.ModelAdmin):
+    """
+    پنل ادمین برای نتایج تطبیق موجودی‌ها
+    """
+    list_display = ('id', 'mode', 'last_transaction_id', 'checked_users', 'discrepancy_count', 'started_at', 'finished_at')
+    list_filter = ('mode',)
+    readonly_fields = ('discrepancies',)
+    ordering = ('-started_at',)
@@ -0,0 +1,64 @@
+"""
+انتقال سفارشات تکمیل یا لغو شده قدیمی به جداول بایگانی
+
+جداول BuyOrder و SellOrder فقط سفارشات فعال و اخیر را نگه می‌دارند تا
+پیمایش سفارشات pending با بزرگ شدن تاریخچه کند نشود. انتقال در تکه‌های
+کوچک و هر تکه در یک تراکنش جداگانه انجام می‌شود.
+"""
+from django.db import transaction
+
+from .models import BuyOrder, SellOrder, ArchivedBuyOrder, ArchivedSellOrder
+
+
+TERMINAL_STATUSES = ('completed', 'cancelled')
+
+ARCHIVE_MODELS = {
+    BuyOrder: ArchivedBuyOrder,
+    SellOrder: ArchivedSellOrder,
+}
+
+ORDER_FIELDS = (
+    'id', 'username', 'quantity', 'price_per_token', 'total_amount',
+    'status', 'created_at', 'completed_at',
+)
+
+
+def archive_orders(model, cutoff, chunk_size=1000):
+    """
+    انتقال سفارشات پایان یافته ایجاد شده قبل از cutoff؛ خروجی تعداد منتقل شده
+
+    سفارشی که شناسه‌اش از قبل در جدول بایگانی هست (مثلاً شناسه دوباره
+    استفاده شده) منتقل نمی‌شود و در جدول اصلی باقی می‌ماند؛ از جدول اصلی فقط
+    ردیف‌هایی حذف می‌شوند که در همان تراکنش در بایگانی درج شده‌اند.
+    """
+    archive_model = ARCHIVE_MODELS[model]
+    candidates = model.objects.filter(
+        status__in=TERMINAL_STATUSES, created_at__lt=cutoff
+    ).order_by('id').values_list(*ORDER_FIELDS)
+
+    archived = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            rows = list(candidates.filter(id__gt=last_id)[:chunk_size])
+            if not rows:
+                return archived
+            last_id = rows[-1][0]
+            existing = set(archive_model.objects.filter(
+                id__in=[row[0] for row in rows]
+            ).values_list('id', flat=True))
+            rows = [row for row in rows if row[0] not in existing]
+            archive_model.objects.bulk_create(
+                [archive_model(**dict(zip(ORDER_FIELDS, row))) for row in rows]
+            )
+            model.objects.filter(id__in=[row[0] for row in rows]).delete()
+        archived += len(rows)
+
+
+def order_history(model):
+    """
+    سفارشات جدول اصلی و بایگانی با هم، به ترتیب زمان ایجاد
+    """
+    return model.objects.order_by().values(*ORDER_FIELDS).union(
+        ARCHIVE_MODELS[model].objects.order_by().values(*ORDER_FIELDS), all=True
+    ).order_by('created_at', 'id')
@@ -0,0 +1,70 @@
+"""
+خواندن سریع موجودی‌ها بدون نوشتن در دیتابیس
+
+درخواست‌های GET موجودی هیچ ردیفی ایجاد نمی‌کنند (کاربر ناشناخته موجودی صفر
+دارد) و نتیجه برای مدت کوتاهی در cache نگه داشته می‌شود تا خواندن‌های پرتکرار
+با تراکنش‌های تطبیق رقابت نکنند. پس از commit هر تراکنش تطبیق، موجودی کاربران
+درگیر از cache حذف می‌شود.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import TokenBalance, UserBalance
+
+
+BALANCE_CACHE_TIMEOUT = getattr(settings, 'TWALLET_BALANCE_CACHE_TIMEOUT', 5)
+
+TOKEN_BALANCE_KEY = 'twallet:token_balance'
+
+
+def user_balance_key(username):
+    # نام کاربری از URL می‌آید و ممکن است برای کلید cache مناسب نباشد
+    return 'twallet:user_balance:' + hashlib.md5(username.encode()).hexdigest()
+
+
+def get_user_balance(username):
+    """
+    موجودی کاربر به صورت dict؛ برای کاربر بدون ردیف موجودی صفر
+    """
+    key = user_balance_key(username)
+    balance = cache.get(key)
+    if balance is None:
+        balance = UserBalance.objects.filter(username=username).values(
+            'username', 'tokens', 'created_at', 'updated_at'
+        ).first() or {
+            'username': username,
+            'tokens': 0,
+            'created_at': None,
+            'updated_at': None,
+        }
+        cache.set(key, balance, BALANCE_CACHE_TIMEOUT)
+    return balance
+
+
+def get_token_balance():
+    """
+    موجودی کلی سیستم به صورت dict بدون ایجاد ردیف
+    """
+    balance = cache.get(TOKEN_BALANCE_KEY)
+    if balance is None:
+        balance = TokenBalance.objects.filter(id=1).values(
+            'total_tokens', 'created_at', 'updated_at'
+        ).first() or {
+            'total_tokens': 0,
+            'created_at': None,
+            'updated_at': None,
+        }
+        cache.set(TOKEN_BALANCE_KEY, balance, BALANCE_CACHE_TIMEOUT)
+    return balance
+
+
+def invalidate_user_balances(usernames):
+    """
+    حذف موجودی کاربران از cache پس از commit تراکنش جاری
+    """
+    keys = [user_balance_key(username) for username in usernames]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
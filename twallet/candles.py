@@ -0,0 +1,103 @@
+"""
+نگهداری افزایشی کندل‌های قیمت (OHLCV)
+
+معاملات هر دسته ابتدا در حافظه بر اساس بازه جمع می‌شوند و سپس هر کندل
+فقط یک‌بار upsert می‌شود؛ کندل‌ها هیچ‌وقت از روی کل تراکنش‌ها دوباره
+محاسبه نمی‌شوند.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Candle
+
+
+INTERVALS = {
+    '1m': timedelta(minutes=1),
+    '1h': timedelta(hours=1),
+    '1d': timedelta(days=1),
+}
+
+
+def bucket_start(moment, interval):
+    """
+    شروع بازه‌ای که لحظه داده شده در آن قرار دارد (به وقت UTC)
+    """
+    seconds = int(INTERVALS[interval].total_seconds())
+    timestamp = int(moment.timestamp())
+    return datetime.fromtimestamp(timestamp - timestamp % seconds, tz=dt_timezone.utc)
+
+
+class CandleAccumulator:
+    """
+    جمع‌آوری معاملات به ترتیب زمانی و upsert کندل‌های مربوط
+    """
+    def __init__(self, intervals=None):
+        self.intervals = list(intervals or INTERVALS)
+        self.buckets = {}
+
+    def __bool__(self):
+        return bool(self.buckets)
+
+    def add(self, created_at, price_per_token, quantity):
+        """
+        اضافه کردن یک معامله؛ معاملات باید به ترتیب زمانی اضافه شوند
+        """
+        for interval in self.intervals:
+            key = (interval, bucket_start(created_at, interval))
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                self.buckets[key] = [price_per_token, price_per_token, price_per_token, price_per_token, quantity, 1]
+                continue
+            if price_per_token > bucket[1]:
+                bucket[1] = price_per_token
+            if price_per_token < bucket[2]:
+                bucket[2] = price_per_token
+            bucket[3] = price_per_token
+            bucket[4] += quantity
+            bucket[5] += 1
+
+    def flush(self):
+        """
+        ادغام کندل‌های جمع شده با کندل‌های موجود و ذخیره آن‌ها
+
+        یک کوئری برای خواندن کندل‌های موجود، یک bulk_create و یک bulk_update.
+        """
+        if not self.buckets:
+            return
+
+        lookup = Q()
+        for interval, start in self.buckets:
+            lookup |= Q(interval=interval, bucket_start=start)
+        existing = {
+            (candle.interval, candle.bucket_start): candle
+            for candle in Candle.objects.filter(lookup)
+        }
+
+        now = timezone.now()
+        created, updated = [], []
+        for (interval, start), (open_, high, low, close, volume, trade_count) in self.buckets.items():
+            candle = existing.get((interval, start))
+            if candle is None:
+                created.append(Candle(
+                    interval=interval, bucket_start=start,
+                    open=open_, high=high, low=low, close=close,
+                    volume=volume, trade_count=trade_count
+                ))
+                continue
+            candle.high = max(candle.high, high)
+            candle.low = min(candle.low, low)
+            candle.close = close
+            candle.volume += volume
+            candle.trade_count += trade_count
+            candle.updated_at = now
+            updated.append(candle)
+
+        if created:
+            Candle.objects.bulk_create(created)
+        if updated:
+            Candle.objects.bulk_update(
+                updated, ['high', 'low', 'close', 'volume', 'trade_count', 'updated_at']
+            )
+        self.buckets = {}
@@ -0,0 +1,1010 @@
+"""
+موتور تطبیق سفارشات توکن
+
+دفتر سفارشات فعال (pending) در حافظه نگه داشته می‌شود تا تطبیق هر سفارش
+جدید نیازی به پیمایش کل جدول سفارشات نداشته باشد. دفتر یک‌بار از روی
+ردیف‌های pending ساخته می‌شود و پس از آن فقط معاملات و تغییر وضعیت
+سفارشات در دیتابیس ذخیره می‌شوند. اگر ژورنال فعال باشد دفتر به جای
+دیتابیس از آخرین snapshot و ادامه ژورنال بازیابی می‌شود.
+"""
+import bisect
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .journal import CANCEL_EVENT, FILL_EVENT, ORDER_EVENT, Journal
+from .models import BuyOrder, SellOrder, OrderBookState
+from .settlement import BalanceWorkingSet, Settlement, SettlementConflict
+
+
+logger = logging.getLogger(__name__)
+
+BUY = 'buy'
+SELL = 'sell'
+
+# تعداد تلاش دوباره در صورت ناهمخوانی دفتر با دیتابیس
+MATCH_ATTEMPTS = 3
+
+# فاصله بررسی نسخه دیتابیس در long-poll تغییرات (ثانیه)؛ تطبیق پروسس‌های
+# دیگر فقط با این بررسی دیده می‌شود
+CHANGES_POLL_INTERVAL = 0.5
+
+ORDER_MODELS = {
+    BUY: BuyOrder,
+    SELL: SellOrder,
+}
+
+
+@contextmanager
+def matching_transaction():
+    """
+    تراکنش تطبیق
+
+    در SQLite تراکنش بیرونی با BEGIN IMMEDIATE شروع می‌شود تا قفل نوشتن از
+    ابتدا گرفته شود و پروسس‌های تطبیق به جای خطای "database is locked" در
+    ارتقای قفل، تا timeout اتصال منتظر یکدیگر بمانند. بقیه تراکنش‌های پروژه
+    همان حالت پیش‌فرض (DEFERRED) را دارند.
+    """
+    connection = transaction.get_connection()
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic():
+            yield
+        return
+
+    connection.ensure_connection()
+    transaction_mode = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        with transaction.atomic():
+            connection.transaction_mode = transaction_mode
+            yield
+    finally:
+        connection.transaction_mode = transaction_mode
+
+
+def database_id(connection):
+    """
+    شناسه ۱۶ بایتی دیتابیس یک اتصال برای جدا کردن ژورنال دیتابیس‌های مختلف
+    """
+    settings_dict = connection.settings_dict
+    return hashlib.md5(
+        f"{connection.vendor}:{settings_dict['HOST']}:{settings_dict['PORT']}:{settings_dict['NAME']}".encode()
+    ).digest()
+
+
+def opposite_side(side):
+    """
+    طرف مقابل یک سفارش
+    """
+    return SELL if side == BUY else BUY
+
+
+class InsufficientBalance(Exception):
+    """
+    موجودی کاربر برای ثبت سفارش فروش کافی نیست
+    """
+    def __init__(self, current_balance, requested_quantity):
+        super().__init__('موجودی کافی نیست')
+        self.current_balance = current_balance
+        self.requested_quantity = requested_quantity
+
+
+class BookOrder:
+    """
+    سفارش فعال در دفتر سفارشات (نسخه حافظه‌ای یک ردیف pending)
+    """
+    __slots__ = ('order_id', 'side', 'username', 'quantity', 'price_per_token')
+
+    def __init__(self, order_id, side, username, quantity, price_per_token):
+        self.order_id = order_id
+        self.side = side
+        self.username = username
+        self.quantity = quantity
+        self.price_per_token = price_per_token
+
+    def __repr__(self):
+        return f"<BookOrder {self.side}#{self.order_id} {self.username} x{self.quantity}>"
+
+
+class PriceLevel:
+    """
+    یک سطح قیمت در دفتر سفارشات: صف FIFO سفارشات با یک قیمت
+
+    صف یک OrderedDict است تا دسترسی به ابتدای صف و حذف با شناسه
+    هر دو O(1) باشند.
+    """
+    __slots__ = ('price', 'orders', 'total_quantity')
+
+    def __init__(self, price):
+        self.price = price
+        self.orders = OrderedDict()
+        self.total_quantity = 0
+
+    def __len__(self):
+        return len(self.orders)
+
+    def append(self, order):
+        self.orders[order.order_id] = order
+        self.total_quantity += order.quantity
+
+    def remove(self, order_id):
+        order = self.orders.pop(order_id)
+        self.total_quantity -= order.quantity
+        return order
+
+
+class OrderBook:
+    """
+    دفتر سفارشات در حافظه با اولویت قیمت و سپس زمان
+
+    برای هر طرف یک نردبان مرتب از قیمت‌ها (با bisect) نگه داشته می‌شود و
+    هر قیمت به یک PriceLevel اشاره می‌کند. بهترین سطح خرید بالاترین قیمت و
+    بهترین سطح فروش پایین‌ترین قیمت نردبان است. شاخص شناسه به سفارش حذف
+    O(1) هر سفارش را ممکن می‌کند.
+    """
+    def __init__(self):
+        self.prices = {BUY: [], SELL: []}
+        self.levels = {BUY: {}, SELL: {}}
+        self.index = {BUY: {}, SELL: {}}
+        # در دفتر fork شده: سطوحی که کپی خود این دفتر هستند (بقیه مشترک‌اند)
+        self._owned = None
+
+    def __len__(self):
+        return sum(len(index) for index in self.index.values())
+
+    def fork(self):
+        """
+        کپی قابل تغییر دفتر برای تراکنشی که هنوز commit نشده
+
+        نردبان قیمت‌ها و شاخص‌ها کپی می‌شوند ولی هر سطح قیمت (و سفارشات آن)
+        فقط در اولین تغییر همان سطح کپی می‌شود، پس دفتر اصلی تا جایگزینی
+        با این دفتر دست نخورده می‌ماند.
+        """
+        book = OrderBook()
+        for side in (BUY, SELL):
+            book.prices[side] = list(self.prices[side])
+            book.levels[side] = dict(self.levels[side])
+            book.index[side] = dict(self.index[side])
+        book._owned = set()
+        return book
+
+    def adopt(self):
+        """
+        تبدیل دفتر fork شده به دفتر اصلی؛ از این به بعد سطوح در جا تغییر می‌کنند
+        """
+        self._owned = None
+
+    def _writable_level(self, side, price):
+        """
+        سطح قیمتی که تغییر آن دفتر دیگری را تغییر نمی‌دهد
+        """
+        level = self.levels[side].get(price)
+        if level is None or self._owned is None or (side, price) in self._owned:
+            return level
+        copy = PriceLevel(price)
+        index = self.index[side]
+        for order in level.orders.values():
+            order = BookOrder(order.order_id, side, order.username, order.quantity, price)
+            copy.append(order)
+            index[order.order_id] = order
+        self.levels[side][price] = copy
+        self._owned.add((side, price))
+        return copy
+
+    def add(self, order):
+        """
+        اضافه کردن سفارش به انتهای صف سطح قیمت خودش
+        """
+        level = self._writable_level(order.side, order.price_per_token)
+        if level is None:
+            level = self.levels[order.side][order.price_per_token] = PriceLevel(order.price_per_token)
+            bisect.insort(self.prices[order.side], order.price_per_token)
+            if self._owned is not None:
+                self._owned.add((order.side, order.price_per_token))
+        level.append(order)
+        self.index[order.side][order.order_id] = order
+
+    def get(self, side, order_id):
+        return self.index[side].get(order_id)
+
+    def remove(self, side, order_id):
+        """
+        حذف سفارش با شناسه
+        """
+        order = self.index[side].get(order_id)
+        if order is None:
+            return None
+        level = self._writable_level(side, order.price_per_token)
+        order = self.index[side].pop(order_id)
+        level.remove(order_id)
+        if not level:
+            self._drop_level(side, order.price_per_token)
+        return order
+
+    def reduce(self, order, quantity):
+        """
+        کم کردن تعداد یک سفارش پس از معامله بخشی از آن
+        """
+        level = self._writable_level(order.side, order.price_per_token)
+        level.orders[order.order_id].quantity -= quantity
+        level.total_quantity -= quantity
+
+    def _drop_level(self, side, price):
+        del self.levels[side][price]
+        prices = self.prices[side]
+        del prices[bisect.bisect_left(prices, price)]
+
+    def best_level(self, side):
+        """
+        بهترین سطح قیمت یک طرف
+        """
+        prices = self.prices[side]
+        if not prices:
+            return None
+        price = prices[-1] if side == BUY else prices[0]
+        return self.levels[side][price]
+
+    def iter_levels(self, side):
+        """
+        سطوح قیمت یک طرف از بهترین به بدترین
+        """
+        prices = reversed(self.prices[side]) if side == BUY else self.prices[side]
+        levels = self.levels[side]
+        for price in prices:
+            yield levels[price]
+
+    def orders(self, side):
+        """
+        سفارشات یک طرف به ترتیب اولویت قیمت و زمان
+        """
+        for level in self.iter_levels(side):
+            yield from level.orders.values()
+
+
+def changed_levels(previous, book):
+    """
+    سطوح قیمتی که مجموع تعداد یا تعداد سفارش آن‌ها بین دو دفتر متفاوت است
+    """
+    touched_levels = {}
+    for side in ORDER_MODELS:
+        old_levels = previous.levels[side]
+        new_levels = book.levels[side]
+        for price in sorted(old_levels.keys() | new_levels.keys()):
+            old_level = old_levels.get(price)
+            new_level = new_levels.get(price)
+            if (
+                (old_level.total_quantity if old_level else 0, len(old_level) if old_level else 0)
+                != (new_level.total_quantity if new_level else 0, len(new_level) if new_level else 0)
+            ):
+                touched_levels[(side, price)] = None
+    return touched_levels
+
+
+def crosses(side, limit_price, level_price):
+    """
+    آیا سفارش ورودی با قیمت limit_price با سطح level_price طرف مقابل معامله می‌شود
+    """
+    if side == BUY:
+        return limit_price >= level_price
+    return limit_price <= level_price
+
+
+class Fill:
+    """
+    یک معامله بین سفارش ورودی و سفارش موجود در دفتر
+    """
+    __slots__ = ('maker', 'quantity')
+
+    def __init__(self, maker, quantity):
+        self.maker = maker
+        self.quantity = quantity
+
+
+class MatchResult:
+    """
+    نتیجه ثبت و تطبیق یک سفارش
+    """
+    def __init__(self, order, fills, remaining_quantity, cancelled=()):
+        self.order = order
+        self.side = BUY if isinstance(order, BuyOrder) else SELL
+        self.fills = fills
+        self.remaining_quantity = remaining_quantity
+        # سفارشات فروش موجودی که فروشنده‌شان دیگر توکن کافی نداشت و لغو شدند
+        self.cancelled = list(cancelled)
+
+    @property
+    def matched_orders(self):
+        return [fill.maker.order_id for fill in self.fills]
+
+
+class MatchingEngine:
+    """
+    موتور تطبیق سفارشات خرید و فروش
+
+    دفتر سفارشات در اولین استفاده از ردیف‌های pending ساخته می‌شود.
+    تطبیق ابتدا روی دفتر برنامه‌ریزی می‌شود، سپس نتیجه در یک تراکنش
+    دیتابیس ذخیره و فقط پس از commit به دفتر اعمال و منتشر می‌شود؛ اگر
+    تراکنش شکست بخورد دفتر دست نخورده می‌ماند (و اگر ناهمخوانی با دیتابیس
+    دیده شده باشد دور انداخته و بازسازی می‌شود)، بنابراین خواندن‌ها همیشه
+    وضعیت commit شده دیتابیس را می‌بینند.
+
+    sequence دفتر همان نسخه OrderBookState است، پس در همه پروسس‌ها یک
+    معنی دارد. تغییر سطوح قیمت هر نسخه در یک بافر محدود نگه داشته می‌شود تا
+    کلاینت‌ها بتوانند نسخه محلی خود را فقط با تغییرات پس از یک sequence
+    به‌روز کنند.
+
+    چند پروسس می‌توانند همزمان روی یک دیتابیس تطبیق انجام دهند: هر تراکنش
+    ابتدا نسخه OrderBookState را افزایش می‌دهد (قفل سراسری تطبیق) و اگر
+    نسخه با نسخه‌ای که دفتر این پروسس از آن ساخته شده یکی نباشد، دفتر قبل از
+    تطبیق دوباره ساخته می‌شود. UPDATEهای شرطی Settlement هم هر ناهمخوانی
+    باقی‌مانده را تشخیص می‌دهند و تطبیق با دفتر تازه تکرار می‌شود. هر خواندن
+    دفتر (سطوح، snapshot، quote و delta) هم ابتدا نسخه commit شده را با یک
+    SELECT سبک بررسی می‌کند و دفتر را در صورت تفاوت به‌روز می‌کند؛ تفاوت
+    سطوح دفتر قدیم و جدید به عنوان تغییرات همان نسخه منتشر می‌شود.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        # قفل کوتاه برای اعمال تغییرات به دفتر و خواندن سطوح آن
+        self._book_lock = threading.Lock()
+        self._changed = threading.Condition(self._book_lock)
+        self._book = None
+        # نسخه OrderBookState که دفتر حافظه‌ای با آن همخوان است
+        self._db_version = None
+        self._sequence = 0
+        # تغییرات با sequence بزرگ‌تر از floor به طور کامل در بافر موجودند
+        self._floor = 0
+        self._changes = deque(
+            maxlen=getattr(settings, 'TWALLET_BOOK_CHANGES_BUFFER', 10000)
+        )
+        journal_dir = getattr(settings, 'TWALLET_JOURNAL_DIR', None)
+        self._journal = Journal(
+            journal_dir,
+            database_id(connection),
+            fsync_every=getattr(settings, 'TWALLET_JOURNAL_FSYNC_EVERY', 64),
+            fsync_interval=getattr(settings, 'TWALLET_JOURNAL_FSYNC_INTERVAL', 0.05)
+        ) if journal_dir else None
+        self._snapshot_every = getattr(settings, 'TWALLET_SNAPSHOT_EVERY', 1000)
+        self._snapshot_thread = None
+
+    @property
+    def book(self):
+        return self.refresh()
+
+    def refresh(self):
+        """
+        همخوان کردن دفتر با آخرین نسخه commit شده دیتابیس؛ خروجی دفتر
+
+        یک SELECT سبک روی نسخه OrderBookState است و دفتر فقط وقتی پروسس
+        دیگری پس از ساخت آن commit کرده باشد به‌روز می‌شود.
+        """
+        version = self._committed_version()
+        if self._book is None or self._db_version != version:
+            with self._lock:
+                version = self._committed_version()
+                if self._book is None or self._db_version != version:
+                    self._sync_book(version)
+        return self._book
+
+    def reset(self):
+        """
+        دور انداختن دفتر فعلی؛ در استفاده بعدی دوباره از دیتابیس ساخته می‌شود
+        """
+        with self._lock:
+            with self._changed:
+                self._book = None
+                self._db_version = None
+                # دفتر با دیتابیس ناهمخوان بوده و snapshotهای گرفته شده از آن هم
+                # معتبر نیستند؛ حتی sequence فعلی هم تا commit بعدی delta ندارد
+                self._floor = self._sequence + 1
+                self._changes.clear()
+                self._changed.notify_all()
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def _committed_version(self):
+        """
+        نسخه فعلی OrderBookState در دیتابیس
+        """
+        return OrderBookState.objects.filter(id=1).values_list(
+            'version', flat=True
+        ).first() or 0
+
+    def _sync_book(self, version):
+        """
+        جایگزینی دفتر با دفتر نسخه version دیتابیس
+
+        نسخه قبل از خواندن سفارشات خوانده شده است تا در بدترین حالت فقط یک
+        بازسازی اضافه رخ دهد و هیچ تغییری از دست نرود. اگر دفتر قبلی موجود
+        باشد تفاوت سطوح آن با دفتر جدید با sequence همین نسخه منتشر می‌شود.
+        """
+        previous = self._book
+        book = self._load_book(version)
+        with self._changed:
+            self._book = book
+            self._db_version = version
+            if previous is None:
+                self._sequence = version
+                self._floor = max(self._floor, version)
+                self._changes.clear()
+                self._changed.notify_all()
+            else:
+                self._publish(book, changed_levels(previous, book), version)
+        return book
+
+    def _load_book(self, version):
+        """
+        ساخت دفتر سفارشات نسخه داده شده
+
+        ابتدا بازیابی از ژورنال امتحان می‌شود و در غیر این صورت دفتر از روی
+        سفارشات pending ساخته می‌شود.
+        """
+        if self._journal is not None:
+            book = self._recover_book(version)
+            if book is not None:
+                return book
+
+        book = OrderBook()
+        for side, model in ORDER_MODELS.items():
+            rows = model.objects.filter(
+                status='pending'
+            ).order_by('created_at', 'id').values_list(
+                'id', 'username', 'quantity', 'price_per_token'
+            )
+            for order_id, username, quantity, price_per_token in rows.iterator():
+                book.add(BookOrder(order_id, side, username, quantity, price_per_token))
+        return book
+
+    def _recover_book(self, version):
+        """
+        بازیابی دفتر از snapshot و ژورنال؛ اگر ممکن نباشد None
+        """
+        try:
+            state = self._journal.recover(version)
+        except OSError:
+            logger.exception('خواندن ژورنال دفتر سفارشات ناموفق بود')
+            return None
+        if state is None:
+            return None
+
+        # ژورنال باید متعلق به همین دیتابیس باشد؛ یک کوئری تجمعی برای هر طرف
+        for side, model in ORDER_MODELS.items():
+            orders = state.orders[side]
+            summary = model.objects.filter(status='pending').aggregate(
+                count=Count('id'), quantity=Sum('quantity')
+            )
+            if (
+                summary['count'] != len(orders)
+                or (summary['quantity'] or 0) != sum(order[1] for order in orders.values())
+            ):
+                return None
+
+        book = OrderBook()
+        for side in ORDER_MODELS:
+            for order_id, (username, quantity, price_per_token) in state.orders[side].items():
+                book.add(BookOrder(order_id, side, username, quantity, price_per_token))
+        return book
+
+    def write_snapshot(self):
+        """
+        نوشتن snapshot دفتر در نسخه فعلی و خالی کردن ژورنال
+        """
+        if self._journal is None:
+            return None
+        with self._lock, matching_transaction():
+            # قفل رکورد وضعیت مانع commit تطبیق دیگری در طول snapshot می‌شود
+            version = OrderBookState.objects.select_for_update().filter(id=1).values_list(
+                'version', flat=True
+            ).first() or 0
+            if self._book is None or self._db_version != version:
+                self._sync_book(version)
+
+            book = self._book
+            orders = [
+                (side, order.order_id, order.username, order.quantity, order.price_per_token)
+                for side in ORDER_MODELS
+                for order in book.orders(side)
+            ]
+            self._journal.write_snapshot(
+                version, orders, BuyOrder._meta.get_field('price_per_token').decimal_places
+            )
+        return version
+
+    def _record(self, version, events):
+        """
+        ثبت رکورد ژورنال این تراکنش پس از commit
+
+        خطای نوشتن ژورنال فقط ثبت (log) می‌شود تا سفارش commit شده با خطای
+        500 پاسخ داده نشود؛ رکورد گم شده پیوستگی ژورنال را می‌شکند و بازیابی
+        بعدی از دیتابیس انجام می‌شود.
+        """
+        if self._journal is None:
+            return
+
+        def append():
+            self._journal.append(version, events)
+            if version % self._snapshot_every == 0:
+                self._snapshot_in_background()
+
+        transaction.on_commit(append, robust=True)
+
+    def _snapshot_in_background(self):
+        """
+        نوشتن snapshot دوره‌ای در یک thread جدا تا درخواست منتظر آن نماند
+        """
+        if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+            return
+        self._snapshot_thread = threading.Thread(
+            target=self._write_background_snapshot, name='twallet-snapshot', daemon=True
+        )
+        self._snapshot_thread.start()
+
+    def _write_background_snapshot(self):
+        try:
+            self.write_snapshot()
+        except Exception:
+            logger.exception('نوشتن snapshot دفتر سفارشات ناموفق بود')
+        finally:
+            # اتصال دیتابیس مخصوص همین thread است
+            connection.close()
+
+    def _match_events(self, results):
+        """
+        رویدادهای ژورنال نتیجه تطبیق سفارشات
+        """
+        events = []
+        for result in results:
+            if isinstance(result, InsufficientBalance):
+                continue
+            counter_side = opposite_side(result.side)
+            for fill in result.fills:
+                events.append([FILL_EVENT, counter_side, fill.maker.order_id, fill.quantity])
+            for maker in result.cancelled:
+                events.append([CANCEL_EVENT, counter_side, maker.order_id])
+            order = result.order
+            events.append([
+                ORDER_EVENT, result.side, order.id, order.username,
+                str(order.price_per_token), result.remaining_quantity
+            ])
+        return events
+
+    def levels(self, side, depth=None):
+        """
+        سطوح قیمت یک طرف به صورت (قیمت، مجموع تعداد، تعداد سفارش) از بهترین سطح
+        """
+        book = self.book
+        with self._book_lock:
+            return self._levels(book, side, depth)
+
+    def _levels(self, book, side, depth):
+        result = []
+        for level in book.iter_levels(side):
+            if depth is not None and len(result) >= depth:
+                break
+            result.append((level.price, level.total_quantity, len(level)))
+        return result
+
+    def snapshot(self, depth=None):
+        """
+        تصویر سازگار هر دو طرف دفتر به همراه sequence آن
+        """
+        book = self.refresh()
+        with self._book_lock:
+            # اگر دفتر در این فاصله به‌روز شده باشد همان دفتر با sequence فعلی همخوان است
+            book = self._book or book
+            return {
+                'sequence': self._sequence,
+                BUY: self._levels(book, BUY, depth),
+                SELL: self._levels(book, SELL, depth),
+            }
+
+    def quote(self, side, quantity, price_per_token=None):
+        """
+        شبیه‌سازی تطبیق یک سفارش بدون ثبت آن
+
+        سطوح طرف مقابل مثل _plan از بهترین قیمت پیمایش می‌شوند ولی فقط مجموع
+        هر سطح خوانده می‌شود؛ هیچ قفل دیتابیس یا نوشتنی در کار نیست و قفل
+        دفتر فقط در طول پیمایش گرفته می‌شود. خروجی (sequence، لیست
+        (قیمت، تعداد)، تعداد باقی‌مانده) است.
+        """
+        if price_per_token is None:
+            price_per_token = ORDER_MODELS[side]._meta.get_field('price_per_token').get_default()
+        book = self.refresh()
+        fills = []
+        remaining_quantity = quantity
+        with self._book_lock:
+            book = self._book or book
+            for level in book.iter_levels(opposite_side(side)):
+                if remaining_quantity <= 0 or not crosses(side, price_per_token, level.price):
+                    break
+                trade_quantity = min(remaining_quantity, level.total_quantity)
+                fills.append((level.price, trade_quantity))
+                remaining_quantity -= trade_quantity
+            return self._sequence, fills, remaining_quantity
+
+    def changes_since(self, since, timeout=None):
+        """
+        تغییرات سطوح قیمت پس از sequence داده شده
+
+        خروجی (sequence فعلی، لیست تغییرات) است؛ هر تغییر به صورت
+        (طرف، قیمت، مجموع تعداد، تعداد سفارش) و فقط آخرین وضعیت هر سطح است.
+        مجموع تعداد صفر یعنی سطح حذف شده. اگر تغییرات لازم دیگر در بافر نباشد
+        یا دفتر پس از since دور انداخته شده باشد (reset) لیست None است و
+        کلاینت باید دوباره snapshot بگیرد. با timeout تا رسیدن
+        تغییر جدید منتظر می‌ماند (long-poll)؛ تغییرات این پروسس بلافاصله و
+        تغییرات پروسس‌های دیگر هر CHANGES_POLL_INTERVAL ثانیه دیده می‌شوند.
+        """
+        self.refresh()
+        if timeout:
+            deadline = time.monotonic() + timeout
+            while self._sequence == since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                with self._changed:
+                    self._changed.wait_for(
+                        lambda: self._sequence != since,
+                        min(remaining, CHANGES_POLL_INTERVAL)
+                    )
+                self.refresh()
+
+        with self._changed:
+            if since < self._floor or since > self._sequence:
+                return self._sequence, None
+
+            latest = {}
+            for sequence, side, price, total_quantity, order_count in reversed(self._changes):
+                if sequence <= since:
+                    break
+                latest.setdefault((side, price), (total_quantity, order_count))
+            changes = [
+                (side, price, total_quantity, order_count)
+                for (side, price), (total_quantity, order_count) in latest.items()
+            ]
+            changes.reverse()
+            return self._sequence, changes
+
+    def _publish(self, book, touched_levels, sequence):
+        """
+        ثبت وضعیت جدید سطوح تغییر کرده با sequence (نسخه دیتابیس) داده شده
+        """
+        self._sequence = sequence
+        for side, price in touched_levels:
+            level = book.levels[side].get(price)
+            if len(self._changes) == self._changes.maxlen:
+                self._floor = self._changes[0][0]
+            self._changes.append((
+                self._sequence, side, price,
+                level.total_quantity if level else 0,
+                len(level) if level else 0
+            ))
+        self._changed.notify_all()
+
+    def _claim_book(self):
+        """
+        گرفتن قفل سراسری تطبیق و اطمینان از همخوانی دفتر با دیتابیس
+
+        باید اولین دستور تراکنش تطبیق باشد.
+        """
+        updated = OrderBookState.objects.filter(id=1).update(
+            version=F('version') + 1,
+            updated_at=timezone.now()
+        )
+        if not updated:
+            OrderBookState.objects.create(id=1, version=1)
+        version = OrderBookState.objects.values_list('version', flat=True).get(id=1)
+
+        if self._book is None or self._db_version != version - 1:
+            # پروسس دیگری دفتر را تغییر داده است
+            self._sync_book(version - 1)
+        return self._book, version
+
+    def submit(self, side, username, quantity, price_per_token=None):
+        """
+        ثبت سفارش جدید، تطبیق با طرف مقابل و ذخیره نتیجه
+
+        اگر price_per_token داده نشود قیمت پیش‌فرض مدل استفاده می‌شود.
+        """
+        with self._lock:
+            for attempt in range(MATCH_ATTEMPTS):
+                try:
+                    with matching_transaction():
+                        book, version = self._claim_book()
+                        balances = BalanceWorkingSet()
+                        settlement = Settlement(balances)
+                        result = self._match(
+                            book, settlement, balances, side, username, quantity, price_per_token
+                        )
+                        settlement.flush()
+                        self._record(version, self._match_events([result]))
+                        balances.flush()
+                except SettlementConflict:
+                    self.reset()
+                    if attempt == MATCH_ATTEMPTS - 1:
+                        raise
+                    continue
+
+                # دفتر فقط پس از commit تغییر می‌کند
+                with self._changed:
+                    self._publish(book, self._apply(book, result), version)
+                    self._db_version = version
+                return result
+
+    def submit_many(self, orders, on_results=None):
+        """
+        ثبت و تطبیق پشت سر هم چند سفارش در یک تراکنش
+
+        orders لیستی از (side, username, quantity, price_per_token) است. برای هر
+        سفارش یک MatchResult یا استثنای InsufficientBalance برگردانده می‌شود.
+        هر سفارش باید نتیجه سفارشات قبلی همین دسته را ببیند، پس سفارشات روی
+        یک fork از دفتر تطبیق داده می‌شوند و دفتر اصلی فقط پس از commit با آن
+        جایگزین می‌شود؛ خواندن‌ها در طول تراکنش همان دفتر commit شده را
+        می‌بینند و اگر تراکنش شکست بخورد fork دور انداخته می‌شود. اگر
+        on_results داده شود با لیست نتایج در همان تراکنش فراخوانی می‌شود و
+        خطای آن کل تراکنش را برمی‌گرداند.
+        """
+        with self._lock:
+            for attempt in range(MATCH_ATTEMPTS):
+                results = []
+                touched_levels = {}
+                try:
+                    with matching_transaction():
+                        book, version = self._claim_book()
+                        book = book.fork()
+                        balances = BalanceWorkingSet()
+                        balances.load(username for _, username, _, _ in orders)
+                        settlement = Settlement(balances)
+
+                        for side, username, quantity, price_per_token in orders:
+                            try:
+                                result = self._match(
+                                    book, settlement, balances,
+                                    side, username, quantity, price_per_token
+                                )
+                            except InsufficientBalance as e:
+                                results.append(e)
+                                continue
+                            self._apply(book, result, touched_levels)
+                            results.append(result)
+
+                        settlement.flush()
+                        self._record(version, self._match_events(results))
+                        balances.flush()
+                        if on_results is not None:
+                            on_results(results)
+                except SettlementConflict:
+                    self.reset()
+                    if attempt == MATCH_ATTEMPTS - 1:
+                        raise
+                    continue
+
+                book.adopt()
+                with self._changed:
+                    self._book = book
+                    self._db_version = version
+                    self._publish(book, touched_levels, version)
+                return results
+
+    def cancel(self, orders, username=None):
+        """
+        لغو سفارشات فعال؛ orders دنباله‌ای از (side, order_id) است
+
+        اگر username داده شود فقط سفارشات همان کاربر لغو می‌شوند. سفارشی که
+        در دفتر نباشد (تکمیل یا لغو شده) نادیده گرفته می‌شود. حذف از دفتر با
+        شاخص شناسه O(1) است و وضعیت همه سفارشات هر طرف با یک UPDATE ذخیره
+        می‌شود. خروجی لیست BookOrderهای لغو شده است.
+        """
+        orders = list(dict.fromkeys(orders))
+
+        def select(book):
+            return [
+                order for order in (book.get(side, order_id) for side, order_id in orders)
+                if order is not None and (username is None or order.username == username)
+            ]
+        return self._cancel(select)
+
+    def cancel_all(self, username, side=None):
+        """
+        لغو همه سفارشات فعال یک کاربر (یا فقط یک طرف)
+        """
+        def select(book):
+            return [
+                order
+                for order_side in ((side,) if side else ORDER_MODELS)
+                for order in book.index[order_side].values()
+                if order.username == username
+            ]
+        return self._cancel(select)
+
+    def _cancel(self, select):
+        """
+        لغو سفارشاتی که select از دفتر به‌روز انتخاب می‌کند
+        """
+        with self._lock:
+            for attempt in range(MATCH_ATTEMPTS):
+                try:
+                    with matching_transaction():
+                        book, version = self._claim_book()
+                        cancelled = select(book)
+                        settlement = Settlement(BalanceWorkingSet())
+                        for order in cancelled:
+                            settlement.cancel_order(ORDER_MODELS[order.side], order.order_id)
+                        settlement.flush()
+                        self._record(version, [
+                            [CANCEL_EVENT, order.side, order.order_id] for order in cancelled
+                        ])
+                except SettlementConflict:
+                    self.reset()
+                    if attempt == MATCH_ATTEMPTS - 1:
+                        raise
+                    continue
+
+                with self._changed:
+                    touched_levels = {}
+                    for order in cancelled:
+                        touched_levels[(order.side, order.price_per_token)] = None
+                        book.remove(order.side, order.order_id)
+                    self._db_version = version
+                    self._publish(book, touched_levels, version)
+                return cancelled
+
+    def _match(self, book, settlement, balances, side, username, quantity, price_per_token):
+        """
+        تطبیق یک سفارش ورودی و ثبت نتیجه آن در settlement
+        """
+        model = ORDER_MODELS[side]
+        counter_model = ORDER_MODELS[opposite_side(side)]
+        if price_per_token is None:
+            price_per_token = model._meta.get_field('price_per_token').get_default()
+
+        cancelled = []
+        excluded = set()
+        while True:
+            fills, remaining_quantity = self._plan(
+                book, side, price_per_token, quantity, excluded
+            )
+
+            # موجودی سفارش‌دهنده و همه طرف‌های معامله با یک کوئری خوانده می‌شوند
+            balances.load([username] + [fill.maker.username for fill in fills])
+
+            # سفارش فروشی که فروشنده‌اش دیگر توکن کافی ندارد لغو می‌شود
+            # و تطبیق بدون آن دوباره محاسبه می‌شود
+            unfunded = self._unfunded_makers(fills, balances) if side == BUY else []
+            if not unfunded:
+                break
+            for maker in unfunded:
+                excluded.add(maker.order_id)
+                cancelled.append(maker)
+                settlement.cancel_order(counter_model, maker.order_id)
+
+        if side == SELL:
+            # بررسی موجودی کافی کاربر
+            current_balance = balances.get(username)
+            if current_balance < quantity:
+                raise InsufficientBalance(current_balance, quantity)
+
+        # سفارش مستقیماً با وضعیت نهایی ذخیره می‌شود؛
+        # اگر هنوز توکن باقی مانده، سفارش در pending می‌ماند
+        order = model.objects.create(
+            username=username,
+            quantity=remaining_quantity or quantity,
+            price_per_token=price_per_token,
+            total_amount=quantity * price_per_token,
+            status='pending' if remaining_quantity > 0 else 'completed',
+            completed_at=None if remaining_quantity > 0 else timezone.now()
+        )
+
+        for fill in fills:
+            maker = fill.maker
+            if side == BUY:
+                buyer_username, seller_username = username, maker.username
+            else:
+                buyer_username, seller_username = maker.username, username
+
+            # معامله با قیمت سفارش موجود در دفتر انجام می‌شود
+            settlement.add_trade(
+                buyer_username, seller_username, side, fill.quantity, maker.price_per_token
+            )
+
+            if fill.quantity == maker.quantity:
+                settlement.complete_order(counter_model, maker.order_id)
+            else:
+                settlement.reduce_order(
+                    counter_model, maker.order_id, maker.quantity - fill.quantity
+                )
+
+        return MatchResult(order, fills, remaining_quantity, cancelled)
+
+    def _plan(self, book, side, limit_price, quantity, excluded=()):
+        """
+        محاسبه معاملات سفارش ورودی بدون تغییر دفتر
+
+        سطوح طرف مقابل از بهترین قیمت پیمایش می‌شوند تا جایی که قیمت سطح
+        از قیمت سفارش ورودی بدتر شود؛ داخل هر سطح ترتیب زمانی رعایت می‌شود.
+        سفارشات موجود در excluded نادیده گرفته می‌شوند.
+        """
+        fills = []
+        remaining_quantity = quantity
+        for level in book.iter_levels(opposite_side(side)):
+            if remaining_quantity <= 0 or not crosses(side, limit_price, level.price):
+                break
+            for maker in level.orders.values():
+                if remaining_quantity <= 0:
+                    break
+                if maker.order_id in excluded:
+                    continue
+                trade_quantity = min(remaining_quantity, maker.quantity)
+                fills.append(Fill(maker, trade_quantity))
+                remaining_quantity -= trade_quantity
+        return fills, remaining_quantity
+
+    def _unfunded_makers(self, fills, balances):
+        """
+        سفارشات فروش موجود در دفتر که فروشنده آن‌ها توکن کافی برای معامله ندارد
+        """
+        used = defaultdict(int)
+        unfunded = []
+        for fill in fills:
+            seller_username = fill.maker.username
+            if balances.get(seller_username) - used[seller_username] < fill.quantity:
+                unfunded.append(fill.maker)
+            else:
+                used[seller_username] += fill.quantity
+        return unfunded
+
+    def _apply(self, book, result, touched_levels=None):
+        """
+        اعمال نتیجه تطبیق یک سفارش به دفتر حافظه‌ای؛ خروجی سطوح تغییر کرده
+
+        روی دفتر اصلی فقط پس از commit و با نگه داشتن قفل دفتر فراخوانی
+        می‌شود؛ روی fork تراکنش جاری قفلی لازم نیست.
+        """
+        if touched_levels is None:
+            touched_levels = {}
+        order = result.order
+        side = result.side
+        counter_side = opposite_side(side)
+        for fill in result.fills:
+            maker = fill.maker
+            touched_levels[(counter_side, maker.price_per_token)] = None
+            if fill.quantity == maker.quantity:
+                book.remove(counter_side, maker.order_id)
+            else:
+                book.reduce(maker, fill.quantity)
+
+        for maker in result.cancelled:
+            touched_levels[(counter_side, maker.price_per_token)] = None
+            book.remove(counter_side, maker.order_id)
+
+        if result.remaining_quantity > 0:
+            touched_levels[(side, order.price_per_token)] = None
+            book.add(BookOrder(
+                order.id, side, order.username, result.remaining_quantity,
+                order.price_per_token
+            ))
+        return touched_levels
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    موتور تطبیق مشترک این پروسس
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = MatchingEngine()
+    return _engine
@@ -0,0 +1,85 @@
+"""
+خروجی جریانی دفتر تراکنشات به صورت NDJSON یا CSV
+
+ردیف‌ها با values_list و iterator(chunk_size) خوانده و خط به خط تولید
+می‌شوند، پس حافظه مصرفی به اندازه دفتر تراکنشات بستگی ندارد.
+"""
+import csv
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.db.models import Q
+
+from .models import Transaction
+
+
+EXPORT_FIELDS = (
+    'id', 'buyer_username', 'seller_username', 'transaction_type', 'quantity',
+    'price_per_token', 'total_amount', 'buyer_balance_after', 'seller_balance_after',
+    'created_at',
+)
+
+EXPORT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def ledger_rows(start=None, end=None, username=None, chunk_size=2000):
+    """
+    ردیف‌های تراکنشات (به ترتیب شناسه) با فیلتر اختیاری بازه زمانی و کاربر
+    """
+    transactions = Transaction.objects.order_by('id')
+    if start is not None:
+        transactions = transactions.filter(created_at__gte=start)
+    if end is not None:
+        transactions = transactions.filter(created_at__lt=end)
+    if username:
+        transactions = transactions.filter(Q(buyer_username=username) | Q(seller_username=username))
+    return transactions.values_list(*EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def _values(row):
+    # Decimal و datetime به رشته تبدیل می‌شوند تا دقت و منطقه زمانی حفظ شود
+    values = []
+    for value in row:
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        values.append(value)
+    return values
+
+
+def ndjson_lines(rows):
+    """
+    هر ردیف یک شیء JSON در یک خط
+    """
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDS, _values(row))), ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    """
+    بافر فقط-نوشتنی که مقدار نوشته شده را برمی‌گرداند (برای csv.writer)
+    """
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    """
+    سطر عنوان و سپس هر ردیف یک خط CSV
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(_values(row))
+
+
+def export_lines(export_type, rows):
+    """
+    خطوط خروجی با قالب داده شده
+    """
+    return ndjson_lines(rows) if export_type == 'ndjson' else csv_lines(rows)
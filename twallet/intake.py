@@ -0,0 +1,134 @@
+"""
+دریافت ناهمگام سفارشات با صف مبتنی بر دیتابیس
+
+در حالت ناهمگام view فقط یک OrderRequest ثبت می‌کند و بلافاصله 202
+برمی‌گرداند؛ worker تطبیق (manage.py twallet_worker) درخواست‌ها را به ترتیب
+شناسه و دسته‌ای با submit_many پردازش می‌کند، پس HTTP worker منتظر تطبیق
+نمی‌ماند و نیازی به broker خارجی هم نیست.
+"""
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.utils import timezone
+
+from .engine import InsufficientBalance, get_engine
+from .models import OrderRequest
+from .serializers import BatchOrderItemSerializer
+from .settlement import SettlementConflict
+
+
+class QueueConflict(Exception):
+    """
+    درخواست‌های برداشته شده از صف در این فاصله توسط worker دیگری پردازش شده‌اند
+    """
+
+
+# خطاهایی که درخواست‌ها را در صف نگه می‌دارند تا دوباره پردازش شوند
+TRANSIENT_ERRORS = (OperationalError, SettlementConflict, QueueConflict)
+
+
+def async_intake_requested(request):
+    """
+    آیا این درخواست باید در صف ثبت شود
+
+    با تنظیم TWALLET_ASYNC_INTAKE برای همه درخواست‌ها و با هدر
+    Prefer: respond-async برای یک درخواست فعال می‌شود.
+    """
+    if getattr(settings, 'TWALLET_ASYNC_INTAKE', False):
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
+
+
+def enqueue_order(side, username, quantity, price_per_token=None):
+    """
+    ثبت سفارش در صف
+    """
+    return OrderRequest.objects.create(
+        side=side,
+        username=username,
+        quantity=quantity,
+        price_per_token=price_per_token
+    )
+
+
+def validation_error(request):
+    """
+    خطای اعتبارسنجی یک درخواست صف با قواعد ثبت دسته‌ای؛ None یعنی معتبر
+    """
+    data = {'side': request.side, 'username': request.username, 'quantity': request.quantity}
+    if request.price_per_token is not None:
+        data['price_per_token'] = request.price_per_token
+    serializer = BatchOrderItemSerializer(data=data)
+    if serializer.is_valid():
+        return None
+    return '; '.join(
+        f'{field}: {" ".join(str(error) for error in errors)}'
+        for field, errors in serializer.errors.items()
+    )[:255]
+
+
+def process_queued(batch_size=500):
+    """
+    پردازش یک دسته از قدیمی‌ترین درخواست‌های صف؛ خروجی تعداد پردازش شده
+
+    درخواست‌های نامعتبر ناموفق علامت می‌خورند و بقیه با submit_many تطبیق
+    داده می‌شوند. نتیجه در همان تراکنش تطبیق ذخیره می‌شود، پس اگر worker وسط
+    کار متوقف شود یا یکی از TRANSIENT_ERRORS رخ دهد همه درخواست‌ها در صف
+    باقی می‌مانند و سفارش تکراری ساخته نمی‌شود.
+    """
+    requests = list(OrderRequest.objects.filter(status='queued').order_by('id')[:batch_size])
+    if not requests:
+        return 0
+
+    now = timezone.now()
+    accepted = []
+    for request in requests:
+        request.processed_at = now
+        request.error = validation_error(request) or ''
+        if request.error:
+            request.status = 'failed'
+        else:
+            accepted.append(request)
+
+    def save_results(results):
+        # درخواستی که worker دیگری برداشته باشد کل تراکنش را برمی‌گرداند
+        claimed = OrderRequest.objects.filter(
+            id__in=[request.id for request in requests], status='queued'
+        ).update(processed_at=now)
+        if claimed != len(requests):
+            raise QueueConflict()
+
+        for request, result in zip(accepted, results):
+            if isinstance(result, InsufficientBalance):
+                request.status = 'rejected'
+                request.error = (
+                    f'موجودی کافی نیست (موجودی: {result.current_balance}، '
+                    f'درخواستی: {result.requested_quantity})'
+                )
+                continue
+            request.status = 'done'
+            request.order_id = result.order.id
+            request.remaining_quantity = result.remaining_quantity
+            request.fills = [
+                {
+                    'order_id': fill.maker.order_id,
+                    'quantity': fill.quantity,
+                    'price_per_token': str(fill.maker.price_per_token),
+                }
+                for fill in result.fills
+            ]
+        OrderRequest.objects.bulk_update(
+            requests, ['status', 'order_id', 'remaining_quantity', 'fills', 'error', 'processed_at']
+        )
+
+    if accepted:
+        get_engine().submit_many(
+            [
+                (request.side, request.username, request.quantity, request.price_per_token)
+                for request in accepted
+            ],
+            on_results=save_results
+        )
+    else:
+        with transaction.atomic():
+            save_results([])
+    return len(requests)
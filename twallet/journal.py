@@ -0,0 +1,293 @@
+"""
+ژورنال رویدادها و snapshot دودویی دفتر سفارشات
+
+هر تراکنش تطبیق پس از commit یک رکورد در انتهای فایل ژورنال می‌نویسد که
+با نسخه OrderBookState همان تراکنش شناخته می‌شود و شامل سفارشات پذیرفته
+شده، معاملات و لغوها است. fsync به صورت دسته‌ای انجام می‌شود و رکوردهای
+باقی‌مانده حداکثر fsync_interval ثانیه بعد یا هنگام خروج پروسس fsync
+می‌شوند. هر چند نسخه یک‌بار snapshot فشرده دفتر نوشته و ژورنال خالی
+می‌شود، پس بازیابی پس از راه‌اندازی فقط خواندن snapshot (با mmap) و اجرای
+دوباره رکوردهای پس از آن است و به طول تاریخچه بستگی ندارد.
+
+ژورنال و snapshot هر دیتابیس در زیرپوشه شناسه همان دیتابیس نوشته می‌شوند و
+شناسه در سرآیند هر دو فایل هم ثبت است. دیتابیس همچنان مرجع اصلی است: اگر
+شناسه‌ها یکی نباشند، رکوردهای ژورنال تا نسخه مورد نظر پیوسته نباشند (مثلاً
+پروسس قبل از نوشتن ژورنال متوقف شده) یا رویدادی با snapshot همخوان نباشد،
+بازیابی شکست می‌خورد و دفتر از دیتابیس ساخته می‌شود.
+
+موجودی کاربران در ژورنال و snapshot نیست: موتور تطبیق موجودی‌ها را در هر
+تراکنش با یک کوئری از UserBalance می‌خواند و هیچ وضعیت حافظه‌ای از آن‌ها
+ندارد که لازم باشد بازیابی شود.
+"""
+import atexit
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from decimal import Decimal
+
+
+ORDER_EVENT = 'o'
+FILL_EVENT = 'f'
+CANCEL_EVENT = 'x'
+
+SNAPSHOT_MAGIC = b'TWBK'
+SNAPSHOT_FORMAT = 2
+# magic، نسخه قالب، تعداد رقم اعشار قیمت، شناسه دیتابیس، نسخه دفتر، تعداد سفارش
+SNAPSHOT_HEADER = struct.Struct('<4sHB16sQI')
+# طرف (0 خرید، 1 فروش)، شناسه، تعداد، قیمت به صورت عدد صحیح، طول نام کاربری
+SNAPSHOT_ORDER = struct.Struct('<BQQqH')
+SNAPSHOT_CRC = struct.Struct('<I')
+
+SIDES = ('buy', 'sell')
+
+
+class MarketState:
+    """
+    وضعیت دفتر سفارشات در یک نسخه مشخص
+
+    سفارشات هر طرف به ترتیب ورود در یک OrderedDict به صورت
+    شناسه -> [نام کاربری، تعداد، قیمت] نگه داشته می‌شوند.
+    """
+    def __init__(self, version=0):
+        self.version = version
+        self.orders = {side: OrderedDict() for side in SIDES}
+
+    def apply(self, version, events):
+        """
+        اعمال رویدادهای یک رکورد ژورنال
+
+        رویداد سفارشی که در وضعیت نیست KeyError می‌دهد.
+        """
+        for event in events:
+            kind = event[0]
+            if kind == ORDER_EVENT:
+                _, side, order_id, username, price, remaining = event
+                if remaining > 0:
+                    self.orders[side][order_id] = [username, remaining, Decimal(price)]
+            elif kind == FILL_EVENT:
+                _, side, order_id, quantity = event
+                order = self.orders[side][order_id]
+                order[1] -= quantity
+                if order[1] <= 0:
+                    del self.orders[side][order_id]
+            elif kind == CANCEL_EVENT:
+                _, side, order_id = event
+                del self.orders[side][order_id]
+        self.version = version
+
+
+class Journal:
+    """
+    ژورنال فقط-افزودنی رویدادها و snapshot یک پایگاه داده
+
+    database شناسه ۱۶ بایتی دیتابیس است. هر رکورد با یک os.write روی فایل
+    باز شده با O_APPEND نوشته می‌شود تا رکوردهای چند پروسس در هم نروند؛ خط
+    اول فایل سرآیند شامل شناسه دیتابیس است.
+    """
+    def __init__(self, directory, database, fsync_every=64, fsync_interval=0.05):
+        self.database = database
+        self.directory = os.path.join(str(directory), database.hex())
+        self.journal_path = os.path.join(self.directory, 'journal.log')
+        self.snapshot_path = os.path.join(self.directory, 'book.snapshot')
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+        self._sync_timer = None
+        atexit.register(self.sync)
+
+    def _header(self):
+        return (json.dumps({'db': self.database.hex()}, separators=(',', ':')) + '\n').encode()
+
+    def _file(self):
+        # پس از fork هر پروسس توصیفگر فایل خودش را باز می‌کند
+        if self._fd is None or self._pid != os.getpid():
+            os.makedirs(self.directory, exist_ok=True)
+            self._fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+            self._unsynced = 0
+            self._sync_timer = None
+            if os.fstat(self._fd).st_size == 0:
+                os.write(self._fd, self._header())
+        return self._fd
+
+    def append(self, version, events):
+        """
+        نوشتن رکورد یک نسخه؛ fsync هر fsync_every رکورد یا fsync_interval ثانیه
+        """
+        line = json.dumps({'v': version, 'e': events}, separators=(',', ':')) + '\n'
+        with self._lock:
+            fd = self._file()
+            os.write(fd, line.encode())
+            self._unsynced += 1
+            if (
+                self._unsynced >= self.fsync_every
+                or time.monotonic() - self._synced_at >= self.fsync_interval
+            ):
+                self._sync(fd)
+            elif self._sync_timer is None:
+                # اگر رکورد دیگری نیاید انتهای ژورنال پس از fsync_interval fsync می‌شود
+                self._sync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+
+    def sync(self):
+        """
+        fsync رکوردهای نوشته شده
+        """
+        with self._lock:
+            self._sync_timer = None
+            if self._fd is not None and self._pid == os.getpid() and self._unsynced:
+                self._sync(self._fd)
+
+    def _sync(self, fd):
+        os.fsync(fd)
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def records(self, after_version):
+        """
+        رکوردهای ژورنال با نسخه بزرگ‌تر از after_version به ترتیب نسخه
+
+        اگر سرآیند فایل متعلق به دیتابیس دیگری باشد None برمی‌گردد.
+        """
+        try:
+            with open(self.journal_path, 'rb') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return []
+        if lines and lines[0] != self._header():
+            return None
+        records = {}
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # رکورد نیمه‌کاره انتهای فایل
+                continue
+            if record['v'] > after_version:
+                records[record['v']] = record['e']
+        return sorted(records.items())
+
+    def recover(self, version):
+        """
+        ساخت وضعیت نسخه version از آخرین snapshot و ادامه ژورنال
+
+        اگر ژورنال تا آن نسخه کامل نباشد، متعلق به این دیتابیس نباشد یا
+        رویدادی با وضعیت همخوان نباشد None برمی‌گردد.
+        """
+        state = self.read_snapshot()
+        if state is None or state.version > version:
+            return None
+        records = self.records(state.version)
+        if records is None:
+            return None
+        expected = state.version + 1
+        for record_version, events in records:
+            if record_version > version:
+                break
+            if record_version != expected:
+                return None
+            try:
+                state.apply(record_version, events)
+            except (KeyError, ValueError, TypeError):
+                return None
+            expected += 1
+        if state.version != version:
+            return None
+        return state
+
+    def write_snapshot(self, version, orders, decimal_places):
+        """
+        نوشتن snapshot دودویی و خالی کردن ژورنال
+
+        orders دنباله‌ای از (طرف، شناسه، نام کاربری، تعداد، قیمت) به ترتیب
+        دفتر است. فراخواننده باید در طول این کار قفل تطبیق را نگه دارد تا
+        رکورد جدیدی نوشته نشود.
+        """
+        scale = 10 ** decimal_places
+        body = bytearray()
+        order_count = 0
+        for side, order_id, username, quantity, price in orders:
+            name = username.encode()
+            body += SNAPSHOT_ORDER.pack(
+                SIDES.index(side), order_id, quantity, int(price * scale), len(name)
+            )
+            body += name
+            order_count += 1
+
+        header = SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, decimal_places, self.database, version, order_count
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        temp_path = self.snapshot_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(header)
+            f.write(body)
+            f.write(SNAPSHOT_CRC.pack(zlib.crc32(body)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        self._sync_directory()
+
+        # همه رکوردهای ژورنال حالا در snapshot هستند
+        with self._lock:
+            fd = self._file()
+            os.truncate(fd, 0)
+            os.write(fd, self._header())
+            self._sync(fd)
+
+    def read_snapshot(self):
+        """
+        خواندن آخرین snapshot با mmap
+
+        اگر snapshot نباشد یا خراب باشد وضعیت خالی نسخه صفر و اگر متعلق به
+        دیتابیس دیگری باشد None برمی‌گردد.
+        """
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return self._parse_snapshot(data)
+        except (FileNotFoundError, ValueError, struct.error):
+            return MarketState()
+
+    def _parse_snapshot(self, data):
+        magic, snapshot_format, decimal_places, database, version, order_count = (
+            SNAPSHOT_HEADER.unpack_from(data, 0)
+        )
+        if magic != SNAPSHOT_MAGIC or snapshot_format != SNAPSHOT_FORMAT:
+            raise ValueError('snapshot نامعتبر است')
+        if database != self.database:
+            return None
+        body_end = len(data) - SNAPSHOT_CRC.size
+        (crc,) = SNAPSHOT_CRC.unpack_from(data, body_end)
+        with memoryview(data) as view:
+            if zlib.crc32(view[SNAPSHOT_HEADER.size:body_end]) != crc:
+                raise ValueError('snapshot نامعتبر است')
+
+        state = MarketState(version)
+        offset = SNAPSHOT_HEADER.size
+        for _ in range(order_count):
+            side, order_id, quantity, price, name_length = SNAPSHOT_ORDER.unpack_from(data, offset)
+            offset += SNAPSHOT_ORDER.size
+            username = data[offset:offset + name_length].decode()
+            offset += name_length
+            state.orders[SIDES[side]][order_id] = [
+                username, quantity, Decimal(price).scaleb(-decimal_places)
+            ]
+        return state
+
+    def _sync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
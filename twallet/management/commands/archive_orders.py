@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from twallet.archive import ARCHIVE_MODELS, archive_orders
+
+
+class Command(BaseCommand):
+    """
+    بایگانی سفارشات تکمیل یا لغو شده قدیمی
+    """
+    help = 'انتقال سفارشات تکمیل یا لغو شده قدیمی به جداول بایگانی'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=int,
+            default=getattr(settings, 'TWALLET_ARCHIVE_AFTER_DAYS', 30),
+            help='سفارشاتی که زودتر از این تعداد روز پیش ایجاد شده‌اند بایگانی می‌شوند'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='تعداد سفارشاتی که در هر تراکنش منتقل می‌شوند'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than_days'])
+        for model in ARCHIVE_MODELS:
+            archived = archive_orders(model, cutoff, options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{archived} سفارش از {model._meta.verbose_name_plural} بایگانی شد'
+            ))
@@ -0,0 +1,89 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from twallet.candles import INTERVALS, CandleAccumulator, bucket_start
+from twallet.engine import matching_transaction
+from twallet.models import Candle, OrderBookState, Transaction
+
+
+class Command(BaseCommand):
+    """
+    بازسازی کندل‌ها از روی تراکنش‌های موجود به صورت جریانی
+
+    کندل‌های قبل از شروع بزرگ‌ترین بازه جاری (مثلاً روز جاری) با معاملات
+    جدید تغییر نمی‌کنند، پس تکه تکه و هر تکه در یک تراکنش کوتاه جداگانه
+    بازسازی می‌شوند و تطبیق سفارشات در این مدت متوقف نمی‌شود. فقط کندل‌های
+    بازه جاری در یک تراکنش با قفل تطبیق بازسازی می‌شوند تا با به‌روزرسانی
+    زنده کندل‌ها تداخل نداشته باشند. در طول اجرا کندل‌های قدیمی ممکن است
+    موقتاً ناقص دیده شوند.
+    """
+    help = 'بازسازی کندل‌های قیمت از روی تراکنش‌های ثبت شده'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', action='append', choices=sorted(INTERVALS),
+            help='بازه‌ای که بازسازی می‌شود (قابل تکرار؛ پیش‌فرض همه بازه‌ها)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='تعداد تراکنش‌هایی که در هر مرحله خوانده و ذخیره می‌شوند'
+        )
+
+    def handle(self, *args, **options):
+        intervals = options['interval'] or list(INTERVALS)
+        chunk_size = options['chunk_size']
+
+        # شروع بازه جاری بزرگ‌ترین بازه؛ مرز بازه‌های کوچک‌تر هم هست
+        boundary = bucket_start(timezone.now(), max(INTERVALS, key=INTERVALS.get))
+        candles = CandleAccumulator(intervals)
+
+        old_candles = Candle.objects.filter(interval__in=intervals, bucket_start__lt=boundary)
+        while True:
+            with matching_transaction():
+                ids = list(old_candles.values_list('id', flat=True)[:chunk_size])
+                Candle.objects.filter(id__in=ids).delete()
+            if not ids:
+                break
+
+        # تراکنش‌های قبل از مرز با صفحه‌بندی keyset به ترتیب زمانی خوانده
+        # می‌شوند و هر تکه با کندل‌های تکه قبلی ادغام و commit می‌شود
+        rows = Transaction.objects.filter(created_at__lt=boundary).order_by(
+            'created_at', 'id'
+        ).values_list('id', 'created_at', 'price_per_token', 'quantity')
+        processed = 0
+        last = None
+        while True:
+            with matching_transaction():
+                chunk = rows
+                if last is not None:
+                    chunk = chunk.filter(
+                        Q(created_at__gt=last[1]) | Q(created_at=last[1], id__gt=last[0])
+                    )
+                chunk = list(chunk[:chunk_size])
+                for _, created_at, price_per_token, quantity in chunk:
+                    candles.add(created_at, price_per_token, quantity)
+                candles.flush()
+            if not chunk:
+                break
+            processed += len(chunk)
+            last = chunk[-1]
+
+        with matching_transaction():
+            # قفل رکورد وضعیت مانع commit تطبیق دیگری (و به‌روزرسانی کندل‌ها) می‌شود
+            OrderBookState.objects.select_for_update().filter(id=1).values_list('version', flat=True).first()
+            Candle.objects.filter(interval__in=intervals, bucket_start__gte=boundary).delete()
+            for _, created_at, price_per_token, quantity in Transaction.objects.filter(
+                created_at__gte=boundary
+            ).order_by('created_at', 'id').values_list(
+                'id', 'created_at', 'price_per_token', 'quantity'
+            ).iterator(chunk_size=chunk_size):
+                candles.add(created_at, price_per_token, quantity)
+                processed += 1
+                if processed % chunk_size == 0:
+                    candles.flush()
+            candles.flush()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{processed} تراکنش پردازش شد و {Candle.objects.filter(interval__in=intervals).count()} کندل ساخته شد'
+        ))
@@ -0,0 +1,46 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from twallet.export import EXPORT_TYPES, export_lines, ledger_rows
+
+
+class Command(BaseCommand):
+    """
+    خروجی جریانی دفتر تراکنشات در فایل یا خروجی استاندارد
+    """
+    help = 'خروجی دفتر تراکنشات به صورت NDJSON یا CSV با حافظه ثابت'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=sorted(EXPORT_TYPES), default='ndjson', help='قالب خروجی')
+        parser.add_argument('--start', help='شروع بازه زمانی (ISO 8601)')
+        parser.add_argument('--end', help='پایان بازه زمانی (ISO 8601، بدون خود آن)')
+        parser.add_argument('--username', help='فقط تراکنشاتی که این کاربر خریدار یا فروشنده آن است')
+        parser.add_argument('--output', help='مسیر فایل خروجی (پیش‌فرض خروجی استاندارد)')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='تعداد ردیف‌های هر بار خواندن')
+
+    def handle(self, *args, **options):
+        start = self._parse(options['start'], '--start')
+        end = self._parse(options['end'], '--end')
+        rows = ledger_rows(start, end, options['username'], options['chunk_size'])
+
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                f.writelines(export_lines(options['type'], rows))
+        else:
+            sys.stdout.writelines(export_lines(options['type'], rows))
+
+    def _parse(self, value, name):
+        if value is None:
+            return None
+        try:
+            moment = parse_datetime(value)
+        except ValueError:
+            moment = None
+        if moment is None:
+            raise CommandError(f'{name} باید تاریخ و زمان ISO 8601 باشد')
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        return moment
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+
+from twallet.models import Transaction, WalletReconciliation
+from twallet.reconcile import check_token_total, full_usernames, reconcile, touched_usernames
+
+
+class Command(BaseCommand):
+    """
+    تطبیق موجودی کاربران و موجودی کل با دفتر تراکنشات
+    """
+    help = 'بررسی همخوانی UserBalance و TokenBalance با دفتر تراکنشات'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='فقط کاربرانی که پس از آخرین اجرای کامل شده تغییر کرده‌اند'
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000, help='تعداد کاربران هر تکه')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        started_at = timezone.now()
+        last_transaction_id = Transaction.objects.aggregate(last=Max('id'))['last'] or 0
+
+        checkpoint = None
+        if options['incremental']:
+            # فقط اجرایی که بدون مغایرت تمام شده نقطه شروع است تا مغایرت‌های
+            # گزارش شده در اجرای افزایشی بعدی دوباره بررسی شوند
+            checkpoint = WalletReconciliation.objects.filter(
+                finished_at__isnull=False, discrepancy_count=0
+            ).first()
+            if checkpoint is None:
+                self.stdout.write('اجرای بدون مغایرت قبلی وجود ندارد؛ بررسی کامل انجام می‌شود')
+
+        if checkpoint is not None:
+            mode = 'incremental'
+            usernames = touched_usernames(checkpoint.last_transaction_id, checkpoint.started_at)
+            checked, discrepancies = reconcile(usernames, checkpoint.last_transaction_id, chunk_size)
+        else:
+            mode = 'full'
+            checked, discrepancies = reconcile(full_usernames(chunk_size), 0, chunk_size)
+
+        token_total = check_token_total()
+        if token_total is not None:
+            discrepancies.append(token_total)
+
+        WalletReconciliation.objects.create(
+            mode=mode,
+            last_transaction_id=last_transaction_id,
+            checked_users=checked,
+            discrepancy_count=len(discrepancies),
+            discrepancies=discrepancies[:1000],
+            started_at=started_at,
+            finished_at=timezone.now()
+        )
+
+        for item in discrepancies:
+            self.stdout.write(
+                f"{item['kind']}: {item['username'] or '-'} انتظار {item['expected']}، مقدار {item['actual']}"
+            )
+        if discrepancies:
+            raise CommandError(f'{len(discrepancies)} مغایرت در بررسی {checked} کاربر پیدا شد')
+        self.stdout.write(self.style.SUCCESS(f'{checked} کاربر بررسی شد؛ مغایرتی پیدا نشد'))
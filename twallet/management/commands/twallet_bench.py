@@ -0,0 +1,240 @@
+import json
+import random
+import tempfile
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+from django.urls import reverse
+
+from twallet.engine import BUY, SELL, InsufficientBalance, MatchingEngine, get_engine
+from twallet.models import UserBalance
+
+
+# معیارهایی که بیشتر بودنشان بهتر است؛ بقیه هرچه کمتر بهتر
+HIGHER_IS_BETTER = ('orders_per_sec', 'fills_per_sec')
+COMPARED_METRICS = (
+    'orders_per_sec', 'fills_per_sec', 'queries_per_order',
+    'latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms',
+)
+
+
+def percentile(sorted_values, fraction):
+    """
+    صدک یک لیست مرتب (نزدیک‌ترین رتبه)
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class OrderFlow:
+    """
+    تولید سفارشات مصنوعی با عمق، توزیع اندازه و نسبت خرید/فروش مشخص
+    """
+    def __init__(self, rng, usernames, depth, buy_ratio, size_distribution, max_size, mid_price=100):
+        self.rng = rng
+        self.usernames = usernames
+        self.depth = depth
+        self.buy_ratio = buy_ratio
+        self.size_distribution = size_distribution
+        self.max_size = max_size
+        self.mid_price = mid_price
+
+    def size(self):
+        if self.size_distribution == 'fixed':
+            return self.max_size
+        if self.size_distribution == 'exponential':
+            return min(self.max_size, 1 + int(self.rng.expovariate(4 / self.max_size)))
+        return self.rng.randint(1, self.max_size)
+
+    def seed_orders(self, orders_per_level):
+        """
+        سفارشات غیرمتقاطع برای ساخت depth سطح در هر طرف دفتر
+        """
+        orders = []
+        for level in range(1, self.depth + 1):
+            for _ in range(orders_per_level):
+                orders.append((BUY, self.rng.choice(self.usernames), self.size(),
+                               Decimal(self.mid_price - level)))
+                orders.append((SELL, self.rng.choice(self.usernames), self.size(),
+                               Decimal(self.mid_price + level)))
+        return orders
+
+    def next_order(self):
+        """
+        یک سفارش با قیمتی در محدوده دفتر تا بخشی از سفارشات معامله شوند
+        """
+        side = BUY if self.rng.random() < self.buy_ratio else SELL
+        offset = self.rng.randint(-self.depth, self.depth)
+        return side, self.rng.choice(self.usernames), self.size(), Decimal(self.mid_price + offset)
+
+
+class Command(BaseCommand):
+    """
+    اندازه‌گیری توان عملیاتی و تاخیر موتور تطبیق روی یک دیتابیس آزمایشی
+    """
+    help = 'بنچمارک موتور تطبیق یا viewهای خرید و فروش و مقایسه نتایج دو اجرا'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=['engine', 'view'], default='engine',
+                            help='فراخوانی مستقیم موتور تطبیق یا BuyOrderView/SellOrderView')
+        parser.add_argument('--orders', type=int, default=2000, help='تعداد سفارشات اندازه‌گیری شده')
+        parser.add_argument('--depth', type=int, default=20, help='تعداد سطوح قیمت اولیه هر طرف')
+        parser.add_argument('--orders-per-level', type=int, default=5, help='تعداد سفارشات اولیه هر سطح')
+        parser.add_argument('--buy-ratio', type=float, default=0.5, help='نسبت سفارشات خرید')
+        parser.add_argument('--size-distribution', choices=['uniform', 'exponential', 'fixed'],
+                            default='uniform', help='توزیع تعداد توکن سفارشات')
+        parser.add_argument('--max-size', type=int, default=50, help='بیشترین تعداد توکن هر سفارش')
+        parser.add_argument('--users', type=int, default=50, help='تعداد کاربران')
+        parser.add_argument('--seed', type=int, default=0, help='seed تولید سفارشات')
+        parser.add_argument('--journal', action='store_true', help='اندازه‌گیری با ژورنال فعال')
+        parser.add_argument('--output', help='مسیر فایل JSON نتیجه (پیش‌فرض خروجی استاندارد)')
+        parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                            help='مقایسه دو فایل نتیجه به جای اجرای بنچمارک')
+        parser.add_argument('--threshold', type=float, default=0.1,
+                            help='حداکثر بدتر شدن مجاز هر معیار در مقایسه (نسبی)')
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            return self._compare(*options['compare'], options['threshold'])
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as journal_dir, override_settings(
+                TWALLET_JOURNAL_DIR=journal_dir if options['journal'] else None
+            ):
+                report = self._run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def _run(self, options):
+        rng = random.Random(options['seed'])
+        usernames = [f'bench{i}' for i in range(options['users'])]
+        UserBalance.objects.bulk_create(
+            [UserBalance(username=username, tokens=10 ** 9) for username in usernames]
+        )
+        if options['target'] == 'view':
+            get_user_model().objects.bulk_create(
+                [get_user_model()(username=username) for username in usernames]
+            )
+
+        flow = OrderFlow(
+            rng, usernames, options['depth'], options['buy_ratio'],
+            options['size_distribution'], options['max_size']
+        )
+        engine = get_engine() if options['target'] == 'view' else MatchingEngine()
+        engine.reset()
+        engine.submit_many(flow.seed_orders(options['orders_per_level']))
+        submit = self._view_submitter() if options['target'] == 'view' else self._engine_submitter(engine)
+
+        orders = [flow.next_order() for _ in range(options['orders'])]
+        latencies = []
+        fills = rejected = 0
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            started = time.perf_counter()
+            for order in orders:
+                order_started = time.perf_counter()
+                order_fills = submit(*order)
+                latencies.append(time.perf_counter() - order_started)
+                if order_fills is None:
+                    rejected += 1
+                else:
+                    fills += order_fills
+            elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'config': {
+                key: options[key] for key in (
+                    'target', 'orders', 'depth', 'orders_per_level', 'buy_ratio',
+                    'size_distribution', 'max_size', 'users', 'seed', 'journal'
+                )
+            },
+            'orders': len(orders),
+            'rejected': rejected,
+            'fills': fills,
+            'elapsed_sec': round(elapsed, 4),
+            'orders_per_sec': round(len(orders) / elapsed, 2),
+            'fills_per_sec': round(fills / elapsed, 2),
+            'queries_per_order': round(queries[0] / len(orders), 2),
+            'latency_p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+            'latency_p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+            'latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+            'latency_max_ms': round(latencies[-1] * 1000, 3),
+            'book_orders': len(engine.book),
+        }
+
+    def _engine_submitter(self, engine):
+        def submit(side, username, quantity, price_per_token):
+            try:
+                return len(engine.submit(side, username, quantity, price_per_token).fills)
+            except InsufficientBalance:
+                return None
+        return submit
+
+    def _view_submitter(self):
+        client = Client()
+        urls = {BUY: reverse('twallet:buy_order'), SELL: reverse('twallet:sell_order')}
+
+        def submit(side, username, quantity, price_per_token):
+            response = client.post(urls[side], {
+                'username': username,
+                'quantity': quantity,
+                'price_per_token': str(price_per_token),
+            }, content_type='application/json')
+            if response.status_code != 201:
+                return None
+            return len(response.json()['matched_orders'])
+        return submit
+
+    def _compare(self, baseline_path, current_path, threshold):
+        """
+        مقایسه دو فایل نتیجه و گزارش معیارهایی که بیش از threshold بدتر شده‌اند
+        """
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        with open(current_path) as f:
+            current = json.load(f)
+        if baseline.get('config') != current.get('config'):
+            self.stderr.write('تنظیمات دو اجرا یکسان نیست؛ مقایسه ممکن است معتبر نباشد')
+
+        metrics = {}
+        regressions = []
+        for metric in COMPARED_METRICS:
+            before, after = baseline[metric], current[metric]
+            change = (after - before) / before if before else 0.0
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            metrics[metric] = {
+                'baseline': before,
+                'current': after,
+                'change': round(change, 4),
+                'regression': worse > threshold,
+            }
+            if worse > threshold:
+                regressions.append(metric)
+
+        self.stdout.write(json.dumps(
+            {'threshold': threshold, 'metrics': metrics, 'regressions': regressions}, indent=2
+        ))
+        if regressions:
+            raise CommandError(f"افت کارایی در: {', '.join(regressions)}")
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from twallet.engine import get_engine
+
+
+class Command(BaseCommand):
+    """
+    نوشتن snapshot دفتر سفارشات در نسخه فعلی
+    """
+    help = 'نوشتن snapshot دفتر سفارشات و خالی کردن ژورنال'
+
+    def handle(self, *args, **options):
+        engine = get_engine()
+        version = engine.write_snapshot()
+        if version is None:
+            raise CommandError('ژورنال غیرفعال است (TWALLET_JOURNAL_DIR)')
+        self.stdout.write(self.style.SUCCESS(
+            f'snapshot نسخه {version} با {len(engine.book)} سفارش فعال نوشته شد'
+        ))
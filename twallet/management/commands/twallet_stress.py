@@ -0,0 +1,190 @@
+import multiprocessing
+import os
+import random
+import tempfile
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max, Min, Sum
+from django.test.utils import override_settings
+
+from twallet.engine import BUY, SELL, InsufficientBalance, MatchingEngine, database_id
+from twallet.journal import Journal
+from twallet.models import BuyOrder, SellOrder, OrderBookState, Transaction, UserBalance
+
+
+def run_worker(seed, usernames, orders, max_quantity, start, results):
+    """
+    ارسال سفارشات تصادفی از یک پروسس جداگانه با موتور تطبیق مستقل
+    """
+    rng = random.Random(seed)
+    engine = MatchingEngine()
+    engine.levels(BUY)
+    # همه پروسس‌ها پس از ساخت دفتر با هم شروع می‌کنند
+    start.wait()
+    accepted = rejected = failed = 0
+    for _ in range(orders):
+        try:
+            engine.submit(
+                rng.choice((BUY, SELL)),
+                rng.choice(usernames),
+                rng.randint(1, max_quantity),
+                Decimal(rng.randint(95, 105))
+            )
+            accepted += 1
+        except InsufficientBalance:
+            rejected += 1
+        except Exception:
+            failed += 1
+    connections.close_all()
+    results.put((accepted, rejected, failed))
+
+
+class Command(BaseCommand):
+    """
+    آزمون فشار تطبیق همزمان سفارشات در چند پروسس
+    """
+    help = 'اجرای همزمان چند پروسس تطبیق روی یک دیتابیس آزمایشی و بررسی پایستگی توکن‌ها'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='تعداد پروسس‌های همزمان')
+        parser.add_argument('--orders', type=int, default=200, help='تعداد سفارشات هر پروسس')
+        parser.add_argument('--users', type=int, default=10, help='تعداد کاربران')
+        parser.add_argument('--tokens', type=int, default=1000, help='موجودی اولیه هر کاربر')
+        parser.add_argument('--max-quantity', type=int, default=50, help='بیشترین تعداد توکن هر سفارش')
+        parser.add_argument('--seed', type=int, default=0, help='seed تولید سفارشات تصادفی')
+        parser.add_argument(
+            '--snapshot-every', type=int, default=50,
+            help='فاصله snapshot ژورنال آزمایشی (بر حسب نسخه دفتر)'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            # دیتابیس حافظه‌ای بین پروسس‌ها مشترک نیست
+            fd, path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(fd)
+            connection.settings_dict['TEST']['NAME'] = path
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # ژورنال آزمایشی جدا از ژورنال دیتابیس اصلی
+            with tempfile.TemporaryDirectory() as journal_dir, override_settings(
+                TWALLET_JOURNAL_DIR=journal_dir,
+                TWALLET_SNAPSHOT_EVERY=options['snapshot_every']
+            ):
+                self._run(options, journal_dir)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _run(self, options, journal_dir):
+        usernames = [f'stress{i}' for i in range(options['users'])]
+        initial_tokens = options['tokens']
+        UserBalance.objects.bulk_create(
+            [UserBalance(username=username, tokens=initial_tokens) for username in usernames]
+        )
+
+        # هر پروسس فرزند اتصال دیتابیس خودش را باز می‌کند
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        start = context.Barrier(options['workers'])
+        workers = [
+            context.Process(target=run_worker, args=(
+                options['seed'] + i, usernames, options['orders'], options['max_quantity'], start, results
+            ))
+            for i in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        totals = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+
+        accepted = sum(item[0] for item in totals)
+        rejected = sum(item[1] for item in totals)
+        failed = sum(item[2] for item in totals)
+        errors = self._check(usernames, initial_tokens)
+        errors.extend(self._check_journal(journal_dir))
+        if failed:
+            errors.append(f'{failed} سفارش با خطای غیرمنتظره متوقف شد')
+
+        self.stdout.write(
+            f'{accepted} سفارش پذیرفته، {rejected} رد شده، '
+            f'{Transaction.objects.count()} معامله ثبت شد'
+        )
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS('پایستگی توکن‌ها و سازگاری دفتر سفارشات تایید شد'))
+
+    def _check(self, usernames, initial_tokens):
+        """
+        بررسی پایستگی موجودی‌ها و سازگاری سفارشات باقی‌مانده
+        """
+        errors = []
+        balances = dict(UserBalance.objects.values_list('username', 'tokens'))
+
+        total = sum(balances.values())
+        expected_total = initial_tokens * len(usernames)
+        if total != expected_total:
+            errors.append(f'مجموع توکن‌ها {total} است؛ انتظار {expected_total}')
+
+        bought = dict(
+            Transaction.objects.values_list('buyer_username').annotate(Sum('quantity')).order_by()
+        )
+        sold = dict(
+            Transaction.objects.values_list('seller_username').annotate(Sum('quantity')).order_by()
+        )
+        for username in usernames:
+            expected = initial_tokens + bought.get(username, 0) - sold.get(username, 0)
+            if balances.get(username) != expected:
+                errors.append(f'موجودی {username} برابر {balances.get(username)} است؛ انتظار {expected}')
+
+        for model in (BuyOrder, SellOrder):
+            if model.objects.filter(status='pending', quantity__lte=0).exists():
+                errors.append(f'{model.__name__} در وضعیت pending با تعداد صفر وجود دارد')
+
+        # اگر دفتر یک پروسس کهنه بوده باشد سفارشات متقاطع باقی می‌مانند
+        best_bid = BuyOrder.objects.filter(status='pending').aggregate(price=Max('price_per_token'))['price']
+        best_ask = SellOrder.objects.filter(status='pending').aggregate(price=Min('price_per_token'))['price']
+        if best_bid is not None and best_ask is not None and best_bid >= best_ask:
+            errors.append(f'دفتر سفارشات متقاطع است: خرید {best_bid} و فروش {best_ask}')
+
+        return errors
+
+    def _check_journal(self, journal_dir):
+        """
+        بازیابی دفتر از snapshot و ژورنال و مقایسه با دیتابیس
+
+        موجودی‌ها در ژورنال نیستند (منبع آن‌ها همیشه UserBalance است)، پس
+        سفارشات pending و ترتیب زمانی آن‌ها در هر سطح قیمت مقایسه می‌شوند.
+        """
+        version = OrderBookState.objects.get(id=1).version
+        state = Journal(journal_dir, database_id(connection)).recover(version)
+        if state is None:
+            return [f'بازیابی نسخه {version} از ژورنال ممکن نیست']
+
+        errors = []
+        for side, model in (('buy', BuyOrder), ('sell', SellOrder)):
+            pending = {
+                order_id: [username, quantity, price_per_token]
+                for order_id, username, quantity, price_per_token in model.objects.filter(
+                    status='pending'
+                ).values_list('id', 'username', 'quantity', 'price_per_token')
+            }
+            if pending != dict(state.orders[side]):
+                errors.append(f'سفارشات {model.__name__} بازیابی شده از ژورنال با دیتابیس یکسان نیست')
+                continue
+
+            # اولویت زمانی هر سطح قیمت باید همان ترتیب ثبت در دیتابیس باشد
+            expected = list(model.objects.filter(status='pending').order_by(
+                'price_per_token', 'created_at', 'id'
+            ).values_list('id', flat=True))
+            recovered = [order_id for _, _, order_id in sorted(
+                (pending[order_id][2], position, order_id)
+                for position, order_id in enumerate(state.orders[side])
+            )]
+            if recovered != expected:
+                errors.append(f'ترتیب زمانی سفارشات {model.__name__} بازیابی شده از ژورنال درست نیست')
+        return errors
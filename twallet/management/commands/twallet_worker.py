@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from twallet.intake import TRANSIENT_ERRORS, process_queued
+
+
+# بیشترین فاصله تلاش دوباره پس از خطای گذرا (ثانیه)
+MAX_RETRY_DELAY = 5.0
+
+
+class Command(BaseCommand):
+    """
+    worker تطبیق سفارشات ثبت شده در صف ناهمگام
+    """
+    help = 'پردازش پیوسته درخواست‌های صف سفارشات به ترتیب ثبت'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='تعداد درخواست‌های هر تراکنش')
+        parser.add_argument('--poll-interval', type=float, default=0.2,
+                            help='فاصله بررسی صف وقتی خالی است (ثانیه)')
+        parser.add_argument('--once', action='store_true', help='پردازش تا خالی شدن صف و خروج')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        retries = 0
+        while True:
+            try:
+                processed = process_queued(batch_size)
+            except TRANSIENT_ERRORS as e:
+                # درخواست‌ها در صف مانده‌اند و پس از کمی صبر دوباره پردازش می‌شوند
+                retries += 1
+                delay = min(options['poll_interval'] * 2 ** retries, MAX_RETRY_DELAY)
+                self.stderr.write(f'خطای گذرا در پردازش صف، تلاش دوباره پس از {delay} ثانیه: {e}')
+                time.sleep(delay)
+                continue
+            retries = 0
+            total += processed
+            if processed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'{total} درخواست پردازش شد'))
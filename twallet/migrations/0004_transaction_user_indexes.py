@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twallet', '0003_userbalance_remove_transaction_balance_after_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['buyer_username', 'created_at'], name='twallet_tx_buyer_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['seller_username', 'created_at'], name='twallet_tx_seller_created_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twallet', '0004_transaction_user_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Candle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interval', models.CharField(choices=[('1m', 'یک دقیقه'), ('1h', 'یک ساعت'), ('1d', 'یک روز')], max_length=2, verbose_name='بازه')),
+                ('bucket_start', models.DateTimeField(verbose_name='شروع بازه')),
+                ('open', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='قیمت باز شدن')),
+                ('high', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='بالاترین قیمت')),
+                ('low', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='پایین\u200cترین قیمت')),
+                ('close', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='قیمت بسته شدن')),
+                ('volume', models.PositiveBigIntegerField(default=0, verbose_name='حجم (توکن)')),
+                ('trade_count', models.PositiveIntegerField(default=0, verbose_name='تعداد معاملات')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')),
+            ],
+            options={
+                'verbose_name': 'کندل',
+                'verbose_name_plural': 'کندل\u200cها',
+                'ordering': ['interval', 'bucket_start'],
+                'constraints': [models.UniqueConstraint(fields=('interval', 'bucket_start'), name='twallet_candle_interval_bucket_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:48
+
+from django.db import migrations, models
+
+
+def create_state(apps, schema_editor):
+    # رکورد یکتای وضعیت دفتر سفارشات
+    OrderBookState = apps.get_model('twallet', 'OrderBookState')
+    OrderBookState.objects.get_or_create(id=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twallet', '0005_candle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderBookState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='نسخه دفتر سفارشات')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاریخ بروزرسانی')),
+            ],
+            options={
+                'verbose_name': 'وضعیت دفتر سفارشات',
+                'verbose_name_plural': 'وضعیت دفتر سفارشات',
+            },
+        ),
+        migrations.RunPython(create_state, migrations.RunPython.noop),
+    ]
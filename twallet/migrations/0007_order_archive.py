@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twallet', '0006_orderbookstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBuyOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='شناسه')),
+                ('username', models.CharField(max_length=150, verbose_name='نام کاربری')),
+                ('quantity', models.PositiveIntegerField(verbose_name='تعداد توکن')),
+                ('price_per_token', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='قیمت هر توکن (تومان)')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='مبلغ کل (تومان)')),
+                ('status', models.CharField(choices=[('pending', 'در انتظار'), ('completed', 'تکمیل شده'), ('cancelled', 'لغو شده')], max_length=20, verbose_name='وضعیت')),
+                ('created_at', models.DateTimeField(verbose_name='تاریخ ایجاد')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='تاریخ تکمیل')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ بایگانی')),
+            ],
+            options={
+                'verbose_name': 'سفارش خرید بایگانی شده',
+                'verbose_name_plural': 'سفارشات خرید بایگانی شده',
+                'ordering': ['created_at'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedSellOrder',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='شناسه')),
+                ('username', models.CharField(max_length=150, verbose_name='نام کاربری')),
+                ('quantity', models.PositiveIntegerField(verbose_name='تعداد توکن')),
+                ('price_per_token', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='قیمت هر توکن (تومان)')),
+                ('total_amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='مبلغ کل (تومان)')),
+                ('status', models.CharField(choices=[('pending', 'در انتظار'), ('completed', 'تکمیل شده'), ('cancelled', 'لغو شده')], max_length=20, verbose_name='وضعیت')),
+                ('created_at', models.DateTimeField(verbose_name='تاریخ ایجاد')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='تاریخ تکمیل')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ بایگانی')),
+            ],
+            options={
+                'verbose_name': 'سفارش فروش بایگانی شده',
+                'verbose_name_plural': 'سفارشات فروش بایگانی شده',
+                'ordering': ['created_at'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='buyorder',
+            index=models.Index(fields=['status', 'created_at'], name='twallet_buy_status_crt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sellorder',
+            index=models.Index(fields=['status', 'created_at'], name='twallet_sell_status_crt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedbuyorder',
+            index=models.Index(fields=['created_at'], name='twallet_abuy_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedsellorder',
+            index=models.Index(fields=['created_at'], name='twallet_asell_created_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:00
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twallet', '0007_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('side', models.CharField(choices=[('buy', 'خرید'), ('sell', 'فروش')], max_length=4, verbose_name='نوع سفارش')),
+                ('username', models.CharField(max_length=150, verbose_name='نام کاربری')),
+                ('quantity', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='تعداد توکن')),
+                ('price_per_token', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='قیمت هر توکن (تومان)')),
+                ('status', models.CharField(choices=[('queued', 'در صف'), ('done', 'انجام شده'), ('rejected', 'رد شده'), ('failed', 'ناموفق')], default='queued', max_length=20, verbose_name='وضعیت')),
+                ('order_id', models.BigIntegerField(blank=True, null=True, verbose_name='شناسه سفارش ثبت شده')),
+                ('remaining_quantity', models.PositiveIntegerField(blank=True, null=True, verbose_name='تعداد باقی\u200cمانده')),
+                ('fills', models.JSONField(blank=True, default=list, verbose_name='معاملات هنگام ثبت')),
+                ('error', models.CharField(blank=True, max_length=255, verbose_name='خطا')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاریخ ایجاد')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='تاریخ پردازش')),
+            ],
+            options={
+                'verbose_name': 'درخواست سفارش',
+                'verbose_name_plural': 'درخواست\u200cهای سفارش',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='twallet_orderreq_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('twallet', '0008_orderrequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletReconciliation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('full', 'کامل'), ('incremental', 'افزایشی')], max_length=20, verbose_name='نوع اجرا')),
+                ('last_transaction_id', models.BigIntegerField(default=0, verbose_name='آخرین تراکنش بررسی شده')),
+                ('checked_users', models.PositiveIntegerField(default=0, verbose_name='تعداد کاربران بررسی شده')),
+                ('discrepancy_count', models.PositiveIntegerField(default=0, verbose_name='تعداد مغایرت\u200cها')),
+                ('discrepancies', models.JSONField(blank=True, default=list, verbose_name='مغایرت\u200cها')),
+                ('started_at', models.DateTimeField(verbose_name='زمان شروع')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='زمان پایان')),
+            ],
+            options={
+                'verbose_name': 'تطبیق موجودی\u200cها',
+                'verbose_name_plural': 'تطبیق موجودی\u200cها',
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
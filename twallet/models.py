@@ -133,6 +133,10 @@ class BuyOrder(models.Model):
         verbose_name = "سفارش خرید"
         verbose_name_plural = "سفارشات خرید"
         ordering = ['created_at']  # FIFO
+        indexes = [
+            # پیمایش سفارشات pending و پیدا کردن سفارشات قابل بایگانی
+            models.Index(fields=['status', 'created_at'], name='twallet_buy_status_crt_idx'),
+        ]
 
     def __str__(self):
         return f"{self.username} - خرید {self.quantity} توکن - {self.get_status_display()}"
@@ -194,6 +198,10 @@ class SellOrder(models.Model):
         verbose_name = "سفارش فروش"
         verbose_name_plural = "سفارشات فروش"
         ordering = ['created_at']  # FIFO
+        indexes = [
+            # پیمایش سفارشات pending و پیدا کردن سفارشات قابل بایگانی
+            models.Index(fields=['status', 'created_at'], name='twallet_sell_status_crt_idx'),
+        ]
 
     def __str__(self):
         return f"{self.username} - فروش {self.quantity} توکن - {self.get_status_display()}"
@@ -251,6 +259,211 @@ class Transaction(models.Model):
         verbose_name = "تراکنش"
         verbose_name_plural = "تراکنشات"
         ordering = ['-created_at']
+        indexes = [
+            # تاریخچه معاملات هر کاربر (id به عنوان rowid در انتهای ایندکس هست)
+            models.Index(fields=['buyer_username', 'created_at'], name='twallet_tx_buyer_created_idx'),
+            models.Index(fields=['seller_username', 'created_at'], name='twallet_tx_seller_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.buyer_username} -> {self.seller_username}: {self.quantity} توکن - {self.created_at}"
+
+
+class Candle(models.Model):
+    """
+    مدل کندل قیمت (OHLCV) معاملات توکن در بازه‌های زمانی ثابت
+    """
+    INTERVAL_CHOICES = [
+        ('1m', 'یک دقیقه'),
+        ('1h', 'یک ساعت'),
+        ('1d', 'یک روز'),
+    ]
+
+    interval = models.CharField(max_length=2, choices=INTERVAL_CHOICES, verbose_name="بازه")
+    bucket_start = models.DateTimeField(verbose_name="شروع بازه")
+    open = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="قیمت باز شدن")
+    high = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="بالاترین قیمت")
+    low = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="پایین‌ترین قیمت")
+    close = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="قیمت بسته شدن")
+    volume = models.PositiveBigIntegerField(default=0, verbose_name="حجم (توکن)")
+    trade_count = models.PositiveIntegerField(default=0, verbose_name="تعداد معاملات")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاریخ بروزرسانی")
+
+    class Meta:
+        verbose_name = "کندل"
+        verbose_name_plural = "کندل‌ها"
+        ordering = ['interval', 'bucket_start']
+        constraints = [
+            models.UniqueConstraint(fields=['interval', 'bucket_start'], name='twallet_candle_interval_bucket_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.interval} {self.bucket_start}: {self.open}/{self.high}/{self.low}/{self.close} ({self.volume})"
+
+
+class OrderBookState(models.Model):
+    """
+    وضعیت مشترک دفتر سفارشات (همیشه یک رکورد)
+
+    هر تراکنش تطبیق ابتدا نسخه را افزایش می‌دهد؛ این کار تطبیق را بین
+    پروسس‌ها سریال می‌کند و به هر پروسس نشان می‌دهد که آیا دفتر حافظه‌ای
+    آن هنوز با دیتابیس یکسان است.
+    """
+    version = models.PositiveBigIntegerField(default=0, verbose_name="نسخه دفتر سفارشات")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاریخ بروزرسانی")
+
+    class Meta:
+        verbose_name = "وضعیت دفتر سفارشات"
+        verbose_name_plural = "وضعیت دفتر سفارشات"
+
+    def __str__(self):
+        return f"نسخه دفتر سفارشات: {self.version}"
+
+
+class OrderRequest(models.Model):
+    """
+    صف سفارشات دریافت شده در حالت ناهمگام
+
+    view سفارش را فقط در این جدول ثبت می‌کند و worker تطبیق
+    (manage.py twallet_worker) درخواست‌ها را به ترتیب شناسه پردازش و
+    نتیجه را در همین رکورد ذخیره می‌کند.
+    """
+    SIDE_CHOICES = [
+        ('buy', 'خرید'),
+        ('sell', 'فروش'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'در صف'),
+        ('done', 'انجام شده'),
+        ('rejected', 'رد شده'),
+        ('failed', 'ناموفق'),
+    ]
+
+    side = models.CharField(max_length=4, choices=SIDE_CHOICES, verbose_name="نوع سفارش")
+    username = models.CharField(max_length=150, verbose_name="نام کاربری")
+    quantity = models.PositiveIntegerField(
+        verbose_name="تعداد توکن",
+        validators=[MinValueValidator(1)]
+    )
+    price_per_token = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name="قیمت هر توکن (تومان)"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name="وضعیت"
+    )
+    order_id = models.BigIntegerField(null=True, blank=True, verbose_name="شناسه سفارش ثبت شده")
+    remaining_quantity = models.PositiveIntegerField(null=True, blank=True, verbose_name="تعداد باقی‌مانده")
+    fills = models.JSONField(default=list, blank=True, verbose_name="معاملات هنگام ثبت")
+    error = models.CharField(max_length=255, blank=True, verbose_name="خطا")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ ایجاد")
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name="تاریخ پردازش")
+
+    class Meta:
+        verbose_name = "درخواست سفارش"
+        verbose_name_plural = "درخواست‌های سفارش"
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='twallet_orderreq_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.username} - {self.get_side_display()} {self.quantity} توکن - {self.get_status_display()}"
+
+
+class WalletReconciliation(models.Model):
+    """
+    نتیجه هر اجرای تطبیق موجودی‌ها با دفتر تراکنشات (manage.py reconcile_wallet)
+
+    آخرین اجرای کامل شده نقطه شروع اجرای افزایشی بعدی است.
+    """
+    MODE_CHOICES = [
+        ('full', 'کامل'),
+        ('incremental', 'افزایشی'),
+    ]
+
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES, verbose_name="نوع اجرا")
+    last_transaction_id = models.BigIntegerField(default=0, verbose_name="آخرین تراکنش بررسی شده")
+    checked_users = models.PositiveIntegerField(default=0, verbose_name="تعداد کاربران بررسی شده")
+    discrepancy_count = models.PositiveIntegerField(default=0, verbose_name="تعداد مغایرت‌ها")
+    discrepancies = models.JSONField(default=list, blank=True, verbose_name="مغایرت‌ها")
+    started_at = models.DateTimeField(verbose_name="زمان شروع")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="زمان پایان")
+
+    class Meta:
+        verbose_name = "تطبیق موجودی‌ها"
+        verbose_name_plural = "تطبیق موجودی‌ها"
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.get_mode_display()} {self.started_at}: {self.discrepancy_count} مغایرت"
+
+
+class ArchivedOrder(models.Model):
+    """
+    پایه مدل‌های بایگانی سفارشات تکمیل یا لغو شده
+
+    سفارشات قدیمی با همان شناسه از جدول اصلی به بایگانی منتقل می‌شوند تا
+    جدول اصلی فقط سفارشات فعال و اخیر را نگه دارد.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="شناسه")
+    username = models.CharField(max_length=150, verbose_name="نام کاربری")
+    quantity = models.PositiveIntegerField(verbose_name="تعداد توکن")
+    price_per_token = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="قیمت هر توکن (تومان)"
+    )
+    total_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        verbose_name="مبلغ کل (تومان)"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=BuyOrder.STATUS_CHOICES,
+        verbose_name="وضعیت"
+    )
+    created_at = models.DateTimeField(verbose_name="تاریخ ایجاد")
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name="تاریخ تکمیل")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="تاریخ بایگانی")
+
+    class Meta:
+        abstract = True
+        ordering = ['created_at']
+
+
+class ArchivedBuyOrder(ArchivedOrder):
+    """
+    مدل بایگانی سفارشات خرید
+    """
+    class Meta(ArchivedOrder.Meta):
+        verbose_name = "سفارش خرید بایگانی شده"
+        verbose_name_plural = "سفارشات خرید بایگانی شده"
+        indexes = [
+            models.Index(fields=['created_at'], name='twallet_abuy_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.username} - خرید {self.quantity} توکن - {self.get_status_display()} (بایگانی)"
+
+
+class ArchivedSellOrder(ArchivedOrder):
+    """
+    مدل بایگانی سفارشات فروش
+    """
+    class Meta(ArchivedOrder.Meta):
+        verbose_name = "سفارش فروش بایگانی شده"
+        verbose_name_plural = "سفارشات فروش بایگانی شده"
+        indexes = [
+            models.Index(fields=['created_at'], name='twallet_asell_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.username} - فروش {self.quantity} توکن - {self.get_status_display()} (بایگانی)"
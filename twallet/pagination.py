@@ -0,0 +1,29 @@
+"""
+صفحه‌بندی keyset برای تاریخچه تراکنشات
+
+به جای OFFSET، هر صفحه از جایی شروع می‌شود که صفحه قبل تمام شده است؛
+cursor شامل (created_at, id) آخرین ردیف صفحه قبل است و برای کلاینت
+یک رشته مبهم است.
+"""
+import base64
+from datetime import datetime
+
+
+def encode_cursor(created_at, pk):
+    """
+    ساخت cursor از (created_at, id) آخرین ردیف
+    """
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    بازگرداندن (created_at, id) از cursor؛ برای cursor نامعتبر ValueError
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (TypeError, ValueError) as e:
+        raise ValueError('cursor نامعتبر است') from e
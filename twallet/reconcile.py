@@ -0,0 +1,201 @@
+"""
+تطبیق موجودی کاربران با دفتر تراکنشات
+
+واریز اولیه توکن در دفتر تراکنشات ثبت نمی‌شود، پس بررسی بر اساس ستون‌های
+buyer_balance_after و seller_balance_after انجام می‌شود:
+
+- موجودی قبل از اولین تراکنش بازه به اضافه خالص جریان (خرید منهای فروش)
+  باید برابر موجودی پس از آخرین تراکنش باشد؛
+- موجودی فعلی UserBalance باید برابر موجودی پس از آخرین تراکنش باشد؛
+- در حالت افزایشی موجودی قبل از اولین تراکنش جدید باید برابر موجودی پس از
+  آخرین تراکنش بررسی شده باشد.
+
+کاربران به ترتیب نام کاربری در تکه‌های کوچک بررسی می‌شوند و برای هر تکه
+خالص جریان‌ها با کوئری‌های GROUP BY محاسبه می‌شود، پس حافظه به تعداد
+کاربران یا طول دفتر بستگی ندارد.
+"""
+from django.db import transaction
+from django.db.models import Exists, Max, Min, OuterRef, Sum
+
+from .models import TokenBalance, Transaction, UserBalance
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _flows(usernames, after_id, upto_id):
+    """
+    خالص جریان و شناسه اولین و آخرین تراکنش هر کاربر در بازه (after_id, upto_id]
+    """
+    flows = {}
+    for field, sign in (('buyer_username', 1), ('seller_username', -1)):
+        rows = Transaction.objects.filter(
+            **{f'{field}__in': usernames}, id__gt=after_id, id__lte=upto_id
+        ).order_by().values_list(field).annotate(Sum('quantity'), Min('id'), Max('id'))
+        for username, quantity, first_id, last_id in rows:
+            net, first, last = flows.get(username, (0, first_id, last_id))
+            flows[username] = (net + sign * quantity, min(first, first_id), max(last, last_id))
+    return flows
+
+
+def _last_ids(usernames, upto_id):
+    """
+    شناسه آخرین تراکنش هر کاربر تا upto_id
+    """
+    last_ids = {}
+    for field in ('buyer_username', 'seller_username'):
+        rows = Transaction.objects.filter(
+            **{f'{field}__in': usernames}, id__lte=upto_id
+        ).order_by().values_list(field).annotate(Max('id'))
+        for username, last_id in rows:
+            last_ids[username] = max(last_ids.get(username, 0), last_id)
+    return last_ids
+
+
+def _ledger_rows(ids):
+    """
+    موجودی پس از تراکنش و جریان هر طرف برای تراکنشات داده شده
+    """
+    rows = {}
+    for tx_id, buyer, seller, quantity, buyer_after, seller_after in Transaction.objects.filter(
+        id__in=ids
+    ).values_list(
+        'id', 'buyer_username', 'seller_username', 'quantity',
+        'buyer_balance_after', 'seller_balance_after'
+    ):
+        rows[tx_id] = {
+            buyer: [buyer_after, quantity],
+            seller: [seller_after, -quantity],
+        }
+        if buyer == seller:
+            rows[tx_id][buyer] = [buyer_after, 0]
+    return rows
+
+
+def check_users(usernames, after_id=0):
+    """
+    بررسی یک تکه از کاربران؛ خروجی (شناسه آخرین تراکنش دیده شده، لیست مغایرت‌ها)
+    """
+    with transaction.atomic():
+        upto_id = Transaction.objects.aggregate(last=Max('id'))['last'] or 0
+        balances = dict(
+            UserBalance.objects.filter(username__in=usernames).values_list('username', 'tokens')
+        )
+        flows = _flows(usernames, after_id, upto_id)
+        previous_ids = _last_ids(usernames, after_id) if after_id else {}
+        rows = _ledger_rows(
+            {first_id for _, first_id, _ in flows.values()}
+            | {last_id for _, _, last_id in flows.values()}
+            | set(previous_ids.values())
+        )
+
+    discrepancies = []
+
+    def report(username, kind, expected, actual):
+        discrepancies.append({
+            'username': username, 'kind': kind, 'expected': expected, 'actual': actual,
+        })
+
+    for username in usernames:
+        previous_after = rows[previous_ids[username]][username][0] if username in previous_ids else None
+        if username in flows:
+            net, first_id, last_id = flows[username]
+            first_after, first_flow = rows[first_id][username]
+            opening = first_after - first_flow
+            expected = rows[last_id][username][0]
+            if previous_after is not None and opening != previous_after:
+                report(username, 'ledger_gap', previous_after, opening)
+            if opening + net != expected:
+                report(username, 'ledger_flow', opening + net, expected)
+        else:
+            expected = previous_after
+
+        tokens = balances.get(username)
+        if expected is None:
+            # کاربر هنوز معامله‌ای نداشته و موجودی فقط واریز اولیه است
+            continue
+        if tokens is None:
+            report(username, 'missing_balance', expected, None)
+        elif tokens != expected:
+            report(username, 'balance', expected, tokens)
+    return upto_id, discrepancies
+
+
+def _ledger_usernames_without_balance():
+    """
+    کاربرانی که در دفتر تراکنشات هستند ولی ردیف موجودی ندارند
+    """
+    usernames = set()
+    for field in ('buyer_username', 'seller_username'):
+        usernames.update(
+            Transaction.objects.annotate(
+                has_balance=Exists(UserBalance.objects.filter(username=OuterRef(field)))
+            ).filter(has_balance=False).order_by().values_list(field, flat=True).distinct()
+        )
+    return sorted(usernames)
+
+
+def full_usernames(chunk_size):
+    """
+    همه کاربران به ترتیب نام کاربری (جریانی) و سپس کاربران بدون ردیف موجودی
+    """
+    yield from UserBalance.objects.order_by('username').values_list(
+        'username', flat=True
+    ).iterator(chunk_size=chunk_size)
+    yield from _ledger_usernames_without_balance()
+
+
+def touched_usernames(last_transaction_id, since):
+    """
+    کاربرانی که پس از آخرین اجرا معامله کرده‌اند یا موجودی‌شان تغییر کرده
+    """
+    usernames = set(
+        UserBalance.objects.filter(updated_at__gte=since).values_list('username', flat=True)
+    )
+    for field in ('buyer_username', 'seller_username'):
+        usernames.update(
+            Transaction.objects.filter(id__gt=last_transaction_id).order_by().values_list(
+                field, flat=True
+            ).distinct()
+        )
+    return sorted(usernames)
+
+
+def reconcile(usernames, after_id=0, chunk_size=1000):
+    """
+    بررسی کاربران به صورت تکه تکه؛ خروجی (تعداد کاربران، مغایرت‌ها)
+
+    مغایرت‌ها یک‌بار دیگر بررسی می‌شوند تا معاملاتی که همزمان با بررسی
+    ثبت شده‌اند به اشتباه گزارش نشوند.
+    """
+    checked = 0
+    suspects = []
+    for chunk in _chunks(usernames, chunk_size):
+        checked += len(chunk)
+        _, discrepancies = check_users(chunk, after_id)
+        suspects.extend(item['username'] for item in discrepancies)
+
+    confirmed = []
+    for chunk in _chunks(sorted(set(suspects)), chunk_size):
+        _, discrepancies = check_users(chunk, after_id)
+        confirmed.extend(discrepancies)
+    return checked, confirmed
+
+
+def check_token_total():
+    """
+    مقایسه TokenBalance.total_tokens با مجموع موجودی کاربران؛ None اگر برابر باشند
+    """
+    total = TokenBalance.objects.values_list('total_tokens', flat=True).first()
+    users_total = UserBalance.objects.aggregate(total=Sum('tokens'))['total'] or 0
+    if total is None or total == users_total:
+        return None
+    return {'username': None, 'kind': 'token_total', 'expected': users_total, 'actual': total}
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import TokenBalance, UserBalance, BuyOrder, SellOrder, Transaction
+from .models import TokenBalance, UserBalance, BuyOrder, SellOrder, Transaction, Candle, OrderRequest
+from .pagination import decode_cursor
 
 
 class TokenBalanceSerializer(serializers.ModelSerializer):
@@ -62,22 +63,55 @@ class TransactionSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'total_amount', 'buyer_balance_after', 'seller_balance_after', 'created_at']
 
 
-class BuyOrderCreateSerializer(serializers.ModelSerializer):
+class PositivePriceMixin:
+    """
+    اعتبارسنجی مشترک قیمت هر توکن در سریالایزرهای ثبت و شبیه‌سازی سفارش
+    """
+    def validate_price_per_token(self, value):
+        """
+        قیمت هر توکن باید مثبت باشد
+        """
+        if value <= 0:
+            raise serializers.ValidationError("قیمت هر توکن باید بیشتر از صفر باشد")
+        return value
+
+
+class BuyOrderCreateSerializer(PositivePriceMixin, serializers.ModelSerializer):
     """
     سریالایزر ایجاد سفارش خرید
     """
     class Meta:
         model = BuyOrder
-        fields = ['username', 'quantity']
+        fields = ['username', 'quantity', 'price_per_token']
 
 
-class SellOrderCreateSerializer(serializers.ModelSerializer):
+class SellOrderCreateSerializer(PositivePriceMixin, serializers.ModelSerializer):
     """
     سریالایزر ایجاد سفارش فروش
     """
     class Meta:
         model = SellOrder
-        fields = ['username', 'quantity']
+        fields = ['username', 'quantity', 'price_per_token']
+
+
+class PriceLevelSerializer(serializers.Serializer):
+    """
+    سریالایزر یک سطح قیمت از دفتر سفارشات
+    """
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    total_quantity = serializers.IntegerField()
+    order_count = serializers.IntegerField()
+
+    def to_representation(self, instance):
+        # سطوح موتور تطبیق به صورت tuple (قیمت، مجموع تعداد، تعداد سفارش) هستند
+        if isinstance(instance, tuple):
+            price, total_quantity, order_count = instance
+            instance = {
+                'price': price,
+                'total_quantity': total_quantity,
+                'order_count': order_count,
+            }
+        return super().to_representation(instance)
 
 
 class OrderBookSerializer(serializers.Serializer):
@@ -86,4 +120,181 @@ class OrderBookSerializer(serializers.Serializer):
     """
     buy_orders = BuyOrderSerializer(many=True)
     sell_orders = SellOrderSerializer(many=True)
-    current_balance = TokenBalanceSerializer() 
\ No newline at end of file
+    buy_levels = PriceLevelSerializer(many=True)
+    sell_levels = PriceLevelSerializer(many=True)
+    current_balance = TokenBalanceSerializer() 
+
+class BatchOrderItemSerializer(PositivePriceMixin, serializers.Serializer):
+    """
+    سریالایزر یک سفارش در درخواست دسته‌ای
+    """
+    SIDE_CHOICES = [
+        ('buy', 'خرید'),
+        ('sell', 'فروش'),
+    ]
+
+    side = serializers.ChoiceField(choices=SIDE_CHOICES)
+    username = serializers.CharField(max_length=150)
+    quantity = serializers.IntegerField(min_value=1)
+    price_per_token = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False
+    )
+
+
+class BatchOrderSerializer(serializers.Serializer):
+    """
+    سریالایزر ثبت دسته‌ای سفارشات
+    """
+    MAX_ORDERS = 5000
+
+    orders = BatchOrderItemSerializer(many=True, allow_empty=False, max_length=MAX_ORDERS)
+
+
+class CancelOrderSerializer(serializers.Serializer):
+    """
+    سریالایزر لغو یک سفارش
+    """
+    username = serializers.CharField(max_length=150)
+
+
+class CancelOrderItemSerializer(serializers.Serializer):
+    """
+    سریالایزر یک سفارش در درخواست لغو دسته‌ای
+    """
+    side = serializers.ChoiceField(choices=BatchOrderItemSerializer.SIDE_CHOICES)
+    order_id = serializers.IntegerField(min_value=1)
+
+
+class BulkCancelOrderSerializer(serializers.Serializer):
+    """
+    سریالایزر لغو دسته‌ای سفارشات یک کاربر
+    """
+    MAX_ORDERS = 5000
+
+    username = serializers.CharField(max_length=150)
+    orders = CancelOrderItemSerializer(many=True, allow_empty=False, max_length=MAX_ORDERS)
+
+
+class CancelAllOrdersSerializer(serializers.Serializer):
+    """
+    سریالایزر لغو همه سفارشات فعال یک کاربر
+    """
+    username = serializers.CharField(max_length=150)
+    side = serializers.ChoiceField(choices=BatchOrderItemSerializer.SIDE_CHOICES, required=False)
+
+
+class OrderBookSnapshotQuerySerializer(serializers.Serializer):
+    """
+    پارامترهای درخواست snapshot دفتر سفارشات
+    """
+    depth = serializers.IntegerField(min_value=1, required=False)
+
+
+class OrderBookDeltaQuerySerializer(serializers.Serializer):
+    """
+    پارامترهای درخواست تغییرات دفتر سفارشات
+    """
+    MAX_WAIT = 30
+
+    since = serializers.IntegerField(min_value=0)
+    wait = serializers.IntegerField(min_value=0, max_value=MAX_WAIT, required=False, default=0)
+
+
+class MarketDepthQuerySerializer(serializers.Serializer):
+    """
+    پارامترهای درخواست عمق بازار
+    """
+    MAX_LEVELS = 100
+
+    levels = serializers.IntegerField(min_value=1, max_value=MAX_LEVELS, required=False, default=10)
+
+
+class QuoteQuerySerializer(PositivePriceMixin, serializers.Serializer):
+    """
+    پارامترهای شبیه‌سازی سفارش
+    """
+    side = serializers.ChoiceField(choices=BatchOrderItemSerializer.SIDE_CHOICES)
+    quantity = serializers.IntegerField(min_value=1)
+    price_per_token = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False
+    )
+
+
+class TransactionHistoryQuerySerializer(serializers.Serializer):
+    """
+    پارامترهای صفحه‌بندی تاریخچه تراکنشات کاربر
+    """
+    MAX_PAGE_SIZE = 200
+
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(
+        min_value=1, max_value=MAX_PAGE_SIZE, required=False, default=50
+    )
+
+    def validate_cursor(self, value):
+        try:
+            return decode_cursor(value)
+        except ValueError:
+            raise serializers.ValidationError("cursor نامعتبر است")
+
+
+class CandleSerializer(serializers.ModelSerializer):
+    """
+    سریالایزر کندل قیمت
+    """
+    class Meta:
+        model = Candle
+        fields = ['interval', 'bucket_start', 'open', 'high', 'low', 'close', 'volume', 'trade_count']
+
+
+class CandleQuerySerializer(serializers.Serializer):
+    """
+    پارامترهای درخواست کندل‌ها
+    """
+    MAX_LIMIT = 1000
+
+    interval = serializers.ChoiceField(choices=Candle.INTERVAL_CHOICES)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=MAX_LIMIT, required=False, default=500)
+
+    def validate(self, data):
+        start = data.get('start')
+        end = data.get('end')
+        if start and end and start >= end:
+            raise serializers.ValidationError("زمان شروع باید قبل از زمان پایان باشد")
+        return data
+
+
+class LedgerExportQuerySerializer(serializers.Serializer):
+    """
+    پارامترهای خروجی دفتر تراکنشات
+    """
+    TYPE_CHOICES = [
+        ('ndjson', 'NDJSON'),
+        ('csv', 'CSV'),
+    ]
+
+    type = serializers.ChoiceField(choices=TYPE_CHOICES, required=False, default='ndjson')
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    username = serializers.CharField(max_length=150, required=False)
+
+    def validate(self, data):
+        start = data.get('start')
+        end = data.get('end')
+        if start and end and start >= end:
+            raise serializers.ValidationError("زمان شروع باید قبل از زمان پایان باشد")
+        return data
+
+
+class OrderRequestSerializer(serializers.ModelSerializer):
+    """
+    سریالایزر وضعیت درخواست سفارش ناهمگام
+    """
+    class Meta:
+        model = OrderRequest
+        fields = [
+            'id', 'side', 'username', 'quantity', 'price_per_token', 'status',
+            'order_id', 'remaining_quantity', 'fills', 'error', 'created_at', 'processed_at'
+        ]
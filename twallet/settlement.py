@@ -0,0 +1,233 @@
+"""
+ثبت دسته‌ای نتیجه تطبیق سفارشات
+
+همه معاملات یک سفارش ورودی ابتدا جمع‌آوری می‌شوند و سپس با تعداد ثابتی
+کوئری ذخیره می‌شوند: یک bulk_create برای تراکنش‌ها، یک UPDATE با عبارت F
+برای موجودی‌ها و یک UPDATE برای سفارشات تکمیل شده، مستقل از تعداد
+سفارشاتی که مصرف شده‌اند. کندل‌های قیمت هم برای هر دسته یک‌بار به‌روز
+می‌شوند. موجودی‌ها در یک BalanceWorkingSet برای کل تراکنش نگه داشته
+می‌شوند.
+
+همه UPDATEها شرطی هستند (مثلاً tokens >= n یا status='pending') و اگر
+تعداد ردیف‌های تغییر یافته با انتظار یکی نباشد SettlementConflict رخ
+می‌دهد و کل تراکنش برمی‌گردد. ترتیب قفل ردیف‌ها ثابت است: ابتدا رکورد
+OrderBookState، سپس سفارشات (BuyOrder سپس SellOrder، هر کدام به ترتیب id)
+و در پایان موجودی کاربران به ترتیب نام کاربری.
+"""
+from collections import defaultdict
+
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .balances import invalidate_user_balances
+from .candles import CandleAccumulator
+from .models import UserBalance, Transaction
+
+
+class SettlementConflict(Exception):
+    """
+    وضعیت دیتابیس با آنچه تطبیق بر اساس آن انجام شده یکسان نیست
+    """
+
+
+class BalanceWorkingSet:
+    """
+    مجموعه کاری موجودی کاربران در طول یک تراکنش تطبیق
+
+    ردیف‌های UserBalance همه کاربران درگیر با یک کوئری filter(username__in=...)
+    خوانده می‌شوند، تغییرات در حافظه اعمال می‌شوند و در پایان تغییر خالص هر
+    کاربر فقط یک‌بار (با یک UPDATE برای همه) ذخیره می‌شود.
+    """
+    def __init__(self):
+        self.tokens = {}
+        self.deltas = defaultdict(int)
+        self._missing = set()
+
+    def load(self, usernames):
+        """
+        خواندن موجودی کاربرانی که هنوز در مجموعه نیستند
+        """
+        usernames = set(usernames) - self.tokens.keys()
+        if not usernames:
+            return
+        self.tokens.update(
+            UserBalance.objects.filter(username__in=usernames).values_list('username', 'tokens')
+        )
+        # کاربرانی که ردیف موجودی ندارند با موجودی صفر در نظر گرفته می‌شوند
+        missing = usernames - self.tokens.keys()
+        self._missing |= missing
+        self.tokens.update(dict.fromkeys(missing, 0))
+
+    def get(self, username):
+        """
+        موجودی فعلی کاربر در این تراکنش
+        """
+        if username not in self.tokens:
+            self.load([username])
+        return self.tokens[username]
+
+    def add_tokens(self, username, amount):
+        """
+        اضافه کردن توکن به موجودی کاربر
+        """
+        self.tokens[username] = self.get(username) + amount
+        self.deltas[username] += amount
+
+    def remove_tokens(self, username, amount):
+        """
+        کم کردن توکن از موجودی کاربر
+        """
+        if self.get(username) >= amount:
+            self.tokens[username] -= amount
+            self.deltas[username] -= amount
+            return True
+        return False
+
+    def flush(self):
+        """
+        ذخیره تغییر خالص موجودی کاربران
+        """
+        now = timezone.now()
+        deltas = {username: delta for username, delta in self.deltas.items() if delta}
+        missing = self._missing & deltas.keys()
+        if missing:
+            UserBalance.objects.bulk_create(
+                [UserBalance(username=username) for username in missing],
+                ignore_conflicts=True
+            )
+            self._missing -= missing
+        if deltas:
+            # کسر موجودی فقط وقتی انجام می‌شود که tokens >= مقدار کسر باشد
+            debits = [
+                When(username=username, then=Value(-delta))
+                for username, delta in sorted(deltas.items()) if delta < 0
+            ]
+            updated = UserBalance.objects.filter(
+                username__in=sorted(deltas),
+                tokens__gte=Case(*debits, default=Value(0), output_field=IntegerField())
+            ).update(
+                tokens=F('tokens') + Case(
+                    *[When(username=username, then=Value(delta)) for username, delta in deltas.items()],
+                    default=Value(0),
+                    output_field=IntegerField()
+                ),
+                updated_at=now
+            )
+            if updated != len(deltas):
+                raise SettlementConflict('موجودی کاربران با مجموعه کاری یکسان نیست')
+            invalidate_user_balances(deltas)
+        self.deltas.clear()
+
+
+class Settlement:
+    """
+    جمع‌آوری معاملات و تغییر وضعیت سفارشات و ذخیره یکجای آن‌ها
+
+    تغییر موجودی‌ها همان لحظه روی BalanceWorkingSet اعمال می‌شود (تا سفارش
+    بعدی همان تراکنش آن را ببیند) و ذخیره آن بر عهده صاحب تراکنش است.
+    موجودی کاربران درگیر باید قبلاً در مجموعه کاری load شده باشد.
+    """
+    def __init__(self, balances):
+        self.balances = balances
+        self.transactions = []
+        self.completed_orders = defaultdict(list)
+        self.cancelled_orders = defaultdict(list)
+        self.reduced_orders = {}
+
+    def add_trade(self, buyer_username, seller_username, transaction_type, quantity, price_per_token):
+        """
+        ثبت یک معامله و اعمال آن به موجودی خریدار و فروشنده
+        """
+        balances = self.balances
+        balances.add_tokens(buyer_username, quantity)
+        # موتور تطبیق فقط سفارشاتی را معامله می‌کند که فروشنده توکن کافی دارد
+        if not balances.remove_tokens(seller_username, quantity):
+            raise SettlementConflict(f'موجودی {seller_username} برای این معامله کافی نیست')
+
+        self.transactions.append(Transaction(
+            buyer_username=buyer_username,
+            seller_username=seller_username,
+            transaction_type=transaction_type,
+            quantity=quantity,
+            price_per_token=price_per_token,
+            total_amount=quantity * price_per_token,
+            buyer_balance_after=balances.get(buyer_username),
+            seller_balance_after=balances.get(seller_username)
+        ))
+
+    def complete_order(self, model, order_id):
+        """
+        علامت‌گذاری سفارش برای تکمیل
+        """
+        self.completed_orders[model].append(order_id)
+        self.reduced_orders.pop((model, order_id), None)
+
+    def cancel_order(self, model, order_id):
+        """
+        علامت‌گذاری سفارش برای لغو
+        """
+        self.cancelled_orders[model].append(order_id)
+        self.reduced_orders.pop((model, order_id), None)
+
+    def reduce_order(self, model, order_id, quantity):
+        """
+        ثبت تعداد باقی‌مانده سفارشی که بخشی از آن معامله شده
+        """
+        self.reduced_orders[(model, order_id)] = quantity
+
+    def flush(self):
+        """
+        ذخیره همه معاملات و تغییرات وضعیت سفارشات جمع‌آوری شده
+        """
+        now = timezone.now()
+        transactions = self.transactions
+
+        models = set(self.completed_orders) | set(self.cancelled_orders)
+        models.update(model for model, _ in self.reduced_orders)
+        for model in sorted(models, key=lambda m: m._meta.label):
+            self._update_orders(model, now)
+
+        if transactions:
+            Transaction.objects.bulk_create(transactions)
+
+            # کندل‌ها برای کل این دسته معاملات یک‌بار به‌روز می‌شوند
+            candles = CandleAccumulator()
+            for item in transactions:
+                candles.add(item.created_at, item.price_per_token, item.quantity)
+            candles.flush()
+
+        return transactions
+
+    def _update_orders(self, model, now):
+        """
+        به‌روزرسانی شرطی سفارشات یک مدل به ترتیب id
+        """
+        expected = updated = 0
+
+        reduced = sorted(
+            (order_id, quantity)
+            for (reduced_model, order_id), quantity in self.reduced_orders.items()
+            if reduced_model is model
+        )
+        for order_id, quantity in reduced:
+            updated += model.objects.filter(
+                id=order_id, status='pending', quantity__gt=quantity
+            ).update(quantity=quantity)
+        expected += len(reduced)
+
+        for new_status, order_ids in (
+            ('completed', self.completed_orders.get(model)),
+            ('cancelled', self.cancelled_orders.get(model)),
+        ):
+            if not order_ids:
+                continue
+            fields = {'status': new_status}
+            if new_status == 'completed':
+                fields['completed_at'] = now
+            updated += model.objects.filter(
+                id__in=sorted(order_ids), status='pending'
+            ).update(**fields)
+            expected += len(order_ids)
+
+        if updated != expected:
+            raise SettlementConflict(f'سفارشات {model.__name__} با دفتر حافظه‌ای یکسان نیستند')
@@ -1,3 +1,855 @@
-from django.test import TestCase
+import csv
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .archive import archive_orders, order_history
+from .candles import bucket_start
+from .engine import BUY, SELL, MatchingEngine, InsufficientBalance, matching_transaction
+from .intake import enqueue_order, process_queued
+from .journal import FILL_EVENT, ORDER_EVENT, Journal
+from .models import (
+    ArchivedSellOrder, BuyOrder, Candle, OrderBookState, OrderRequest, SellOrder, Transaction, UserBalance,
+    WalletReconciliation
+)
+from .serializers import (
+    BatchOrderItemSerializer, BuyOrderCreateSerializer, QuoteQuerySerializer, SellOrderCreateSerializer
+)
+from .settlement import Settlement, SettlementConflict
+
+
+def tokens(username):
+    return UserBalance.objects.filter(username=username).values_list('tokens', flat=True).first() or 0
+
+
+def trade(buyer, seller, quantity, price, created_at):
+    item = Transaction.objects.create(
+        buyer_username=buyer, seller_username=seller, transaction_type=BUY,
+        quantity=quantity, price_per_token=Decimal(price), total_amount=quantity * Decimal(price),
+        buyer_balance_after=quantity, seller_balance_after=0
+    )
+    Transaction.objects.filter(id=item.id).update(created_at=created_at)
+    item.created_at = created_at
+    return item
+
+
+@override_settings(TWALLET_JOURNAL_DIR=None)
+class MatchingEngineTests(TestCase):
+    def setUp(self):
+        self.engine = MatchingEngine()
+
+    def fund(self, username, amount):
+        UserBalance.objects.create(username=username, tokens=amount)
+
+    def sell(self, username, quantity, price):
+        return self.engine.submit(SELL, username, quantity, Decimal(price))
+
+    def buy(self, username, quantity, price):
+        return self.engine.submit(BUY, username, quantity, Decimal(price))
+
+    def test_price_time_priority_and_partial_fill(self):
+        for username in ('s1', 's2', 's3'):
+            self.fund(username, 5)
+        expensive = self.sell('s1', 5, '1100').order
+        first = self.sell('s2', 5, '1000').order
+        second = self.sell('s3', 5, '1000').order
+
+        result = self.buy('b', 8, '1100')
+
+        # بهترین قیمت اول و در یک قیمت سفارش قدیمی‌تر اول
+        self.assertEqual(
+            [(fill.maker.order_id, fill.quantity) for fill in result.fills],
+            [(first.id, 5), (second.id, 3)]
+        )
+        self.assertEqual(result.remaining_quantity, 0)
+        self.assertEqual(result.order.status, 'completed')
+        self.assertEqual(
+            list(Transaction.objects.order_by('id').values_list('seller_username', 'quantity', 'price_per_token')),
+            [('s2', 5, Decimal('1000')), ('s3', 3, Decimal('1000'))]
+        )
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        expensive.refresh_from_db()
+        self.assertEqual(first.status, 'completed')
+        self.assertEqual((second.status, second.quantity), ('pending', 2))
+        self.assertEqual((expensive.status, expensive.quantity), ('pending', 5))
+        self.assertEqual([tokens(name) for name in ('b', 's1', 's2', 's3')], [8, 5, 0, 2])
+        self.assertEqual(
+            self.engine.levels(SELL),
+            [(Decimal('1000'), 2, 1), (Decimal('1100'), 5, 1)]
+        )
+
+    def test_remainder_rests_on_book(self):
+        self.fund('s1', 4)
+        self.sell('s1', 4, '1000')
+
+        result = self.buy('b', 10, '1000')
+
+        self.assertEqual(result.remaining_quantity, 6)
+        self.assertEqual((result.order.status, result.order.quantity), ('pending', 6))
+        self.assertEqual(self.engine.levels(BUY), [(Decimal('1000'), 6, 1)])
+        self.assertEqual(self.engine.levels(SELL), [])
+
+    def test_sell_without_balance_is_rejected(self):
+        self.fund('s1', 2)
+        with self.assertRaises(InsufficientBalance):
+            self.sell('s1', 5, '1000')
+        self.assertFalse(SellOrder.objects.exists())
+
+    def test_settlement_conflict_rolls_back_everything(self):
+        self.fund('s1', 5)
+        self.sell('s1', 5, '1000')
+        version = OrderBookState.objects.get(id=1).version
+
+        with mock.patch.object(Settlement, 'flush', side_effect=SettlementConflict()):
+            with self.assertRaises(SettlementConflict):
+                self.buy('b', 5, '1000')
+
+        self.assertFalse(BuyOrder.objects.exists())
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(SellOrder.objects.get().status, 'pending')
+        self.assertEqual([tokens('s1'), tokens('b')], [5, 0])
+        self.assertEqual(OrderBookState.objects.get(id=1).version, version)
+        self.assertEqual(self.engine.levels(SELL), [(Decimal('1000'), 5, 1)])
+        self.assertEqual(self.engine.levels(BUY), [])
+
+    def test_settlement_query_count_does_not_grow_with_fills(self):
+        for index in range(10):
+            self.fund(f's{index}', 1)
+            self.sell(f's{index}', 1, '1000')
+        self.engine.refresh()
+
+        with CaptureQueriesContext(connection) as small:
+            self.buy('b1', 2, '1000')
+        with CaptureQueriesContext(connection) as large:
+            self.buy('b2', 8, '1000')
+        self.assertEqual(len(large), len(small))
+
+    def test_unfunded_seller_is_cancelled(self):
+        self.fund('s1', 5)
+        self.fund('s2', 5)
+        unfunded = self.sell('s1', 5, '1000').order
+        funded = self.sell('s2', 5, '1000').order
+        # توکن‌های فروشنده پس از ثبت سفارش جای دیگری خرج شده است
+        UserBalance.objects.filter(username='s1').update(tokens=0)
+
+        result = self.buy('b', 5, '1000')
+
+        self.assertEqual([maker.order_id for maker in result.cancelled], [unfunded.id])
+        self.assertEqual([(fill.maker.order_id, fill.quantity) for fill in result.fills], [(funded.id, 5)])
+        unfunded.refresh_from_db()
+        self.assertEqual(unfunded.status, 'cancelled')
+        self.assertEqual(self.engine.levels(SELL), [])
+
+    def test_seller_funds_are_counted_once_across_own_orders(self):
+        # فروشنده دو سفارش دارد ولی فقط برای یکی از آن‌ها توکن دارد
+        self.fund('s1', 5)
+        first = self.sell('s1', 5, '1000').order
+        second = self.sell('s1', 5, '1000').order
+
+        result = self.buy('b', 10, '1000')
+
+        self.assertEqual([(fill.maker.order_id, fill.quantity) for fill in result.fills], [(first.id, 5)])
+        self.assertEqual([maker.order_id for maker in result.cancelled], [second.id])
+        self.assertEqual(result.remaining_quantity, 5)
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'cancelled')
+        self.assertEqual([tokens('s1'), tokens('b')], [0, 5])
+        self.assertEqual(self.engine.levels(BUY), [(Decimal('1000'), 5, 1)])
+
+    def test_conflict_retries_with_rebuilt_book(self):
+        self.fund('s1', 5)
+        order = self.sell('s1', 5, '1000').order
+        # سفارش بیرون از موتور تطبیق تکمیل شده و دفتر حافظه‌ای از آن خبر ندارد
+        SellOrder.objects.filter(id=order.id).update(status='completed')
+
+        result = self.buy('b', 5, '1000')
+
+        self.assertEqual(result.fills, [])
+        self.assertEqual(result.remaining_quantity, 5)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(BuyOrder.objects.get().status, 'pending')
+        self.assertEqual(tokens('s1'), 5)
+
+    def test_other_engine_sees_committed_orders(self):
+        # دو موتور نقش دو پروسس روی یک دیتابیس را دارند
+        other = MatchingEngine()
+        self.assertEqual(other.levels(SELL), [])
+        self.fund('s1', 10)
+        self.sell('s1', 5, '1000')
+
+        self.assertEqual(other.levels(SELL), [(Decimal('1000'), 5, 1)])
+        sequence, changes = other.changes_since(other.sequence - 1)
+        self.assertEqual(sequence, self.engine.sequence)
+        self.assertEqual(changes, [(SELL, Decimal('1000'), 5, 1)])
+
+        # تطبیق روی موتور دیگر دفتر این موتور را هم پیش از تطبیق بعدی به‌روز می‌کند
+        other.submit(BUY, 'b', 2, Decimal('1000'))
+        result = self.sell('s1', 5, '1000')
+        self.assertEqual(result.fills, [])
+        self.assertEqual(self.engine.levels(SELL), [(Decimal('1000'), 8, 2)])
+        self.assertEqual(other.levels(SELL), self.engine.levels(SELL))
+
+
+class PriceValidationTests(TestCase):
+    def test_non_positive_price_is_rejected_everywhere(self):
+        order = {'side': BUY, 'username': 'b', 'quantity': 1}
+        for serializer_class in (
+            BuyOrderCreateSerializer, SellOrderCreateSerializer,
+            BatchOrderItemSerializer, QuoteQuerySerializer,
+        ):
+            for price in ('0', '-1.00'):
+                serializer = serializer_class(data={**order, 'price_per_token': price})
+                self.assertFalse(serializer.is_valid(), (serializer_class, price))
+                self.assertIn('price_per_token', serializer.errors)
+            serializer = serializer_class(data={**order, 'price_per_token': '0.01'})
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+
+@override_settings(TWALLET_JOURNAL_DIR=None)
+class BatchOrderTests(TestCase):
+    def setUp(self):
+        self.engine = MatchingEngine()
+        patcher = mock.patch('twallet.views.get_engine', return_value=self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for username in ('s1', 'b'):
+            get_user_model().objects.create_user(username=username, password='x')
+        UserBalance.objects.create(username='s1', tokens=5)
+
+    def test_later_orders_see_earlier_orders_of_the_batch(self):
+        response = self.client.post('/twallet/orders/batch/', {'orders': [
+            {'side': SELL, 'username': 's1', 'quantity': 5, 'price_per_token': '1000'},
+            {'side': BUY, 'username': 'b', 'quantity': 3, 'price_per_token': '1000'},
+            {'side': BUY, 'username': 'ghost', 'quantity': 1, 'price_per_token': '1000'},
+            {'side': SELL, 'username': 'b', 'quantity': 10, 'price_per_token': '1000'},
+        ]}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['accepted'], response.data['rejected']), (2, 2))
+        sell, buy, ghost, oversold = response.data['results']
+        self.assertEqual(buy['matched_orders'], [sell['order_id']])
+        self.assertEqual((buy['status'], buy['remaining_quantity']), ('completed', 0))
+        self.assertIn('error', ghost)
+        self.assertEqual((oversold['current_balance'], oversold['requested_quantity']), (3, 10))
+        self.assertEqual(self.engine.levels(SELL), [(Decimal('1000'), 2, 1)])
+
+    def test_live_book_is_untouched_until_commit(self):
+        self.engine.submit(SELL, 's1', 5, Decimal('1000'))
+        live = self.engine.refresh()
+        seen = []
+
+        def on_results(results):
+            # خواندن‌ها در طول تراکنش فقط دفتر commit شده را می‌بینند
+            seen.append(self.engine._levels(self.engine._book, SELL, None))
+
+        self.engine.submit_many([(BUY, 'b', 2, Decimal('1000')), (BUY, 'b', 2, Decimal('1000'))], on_results)
+
+        self.assertEqual(seen, [[(Decimal('1000'), 5, 1)]])
+        self.assertEqual(self.engine.levels(SELL), [(Decimal('1000'), 1, 1)])
+        # سفارش سطح مشترک در دفتر قبلی کپی شده و در جا تغییر نکرده است
+        self.assertEqual(live.levels[SELL][Decimal('1000')].total_quantity, 5)
+        self.assertEqual(next(live.orders(SELL)).quantity, 5)
+
+    def test_failed_batch_leaves_book_and_sequence_untouched(self):
+        self.engine.submit(SELL, 's1', 5, Decimal('1000'))
+        book = self.engine.refresh()
+        sequence = self.engine.sequence
+
+        def on_results(results):
+            raise RuntimeError()
+
+        with self.assertRaises(RuntimeError):
+            self.engine.submit_many([(BUY, 'b', 5, Decimal('1000'))], on_results)
+
+        self.assertIs(self.engine.refresh(), book)
+        self.assertEqual(self.engine.sequence, sequence)
+        self.assertEqual(self.engine.levels(SELL), [(Decimal('1000'), 5, 1)])
+        self.assertEqual(self.engine.changes_since(sequence), (sequence, []))
+        self.assertFalse(BuyOrder.objects.exists())
+
+
+@override_settings(TWALLET_JOURNAL_DIR=None)
+class OrderBookDeltaTests(TestCase):
+    def setUp(self):
+        self.engine = MatchingEngine()
+        patcher = mock.patch('twallet.views.get_engine', return_value=self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        UserBalance.objects.create(username='s1', tokens=10)
+
+    def delta(self, since):
+        return self.client.get('/twallet/orderbook/delta/', {'since': since})
+
+    def test_delta_has_latest_state_of_each_level(self):
+        self.engine.submit(SELL, 's1', 5, Decimal('1000'))
+        snapshot = self.client.get('/twallet/orderbook/snapshot/').data
+        since = snapshot['sequence']
+        self.engine.submit(SELL, 's1', 3, Decimal('1100'))
+        self.engine.submit(BUY, 'b', 5, Decimal('1000'))
+        self.engine.submit(BUY, 'b', 1, Decimal('1100'))
+
+        response = self.delta(since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['sequence'], self.engine.sequence)
+        self.assertEqual(
+            [[side, Decimal(price), quantity, count] for side, price, quantity, count in response.data['changes']],
+            [[SELL, Decimal('1000'), 0, 0], [SELL, Decimal('1100'), 2, 1]]
+        )
+        self.assertEqual(self.delta(self.engine.sequence).data['changes'], [])
+        self.assertEqual(self.delta(self.engine.sequence + 1).status_code, 410)
+
+    def test_reset_forces_every_snapshot_to_resync(self):
+        self.engine.submit(SELL, 's1', 5, Decimal('1000'))
+        since = self.engine.snapshot()['sequence']
+
+        self.engine.reset()
+
+        self.assertEqual(self.delta(since).status_code, 410)
+        self.engine.submit(SELL, 's1', 1, Decimal('1000'))
+        self.assertEqual(self.delta(since).status_code, 410)
+        self.assertEqual(self.delta(self.engine.sequence).data['changes'], [])
+
+    @override_settings(TWALLET_BOOK_CHANGES_BUFFER=2)
+    def test_changes_older_than_buffer_are_gone(self):
+        engine = MatchingEngine()
+        engine.submit(SELL, 's1', 1, Decimal('1000'))
+        since = engine.sequence
+        for price in ('1100', '1200', '1300'):
+            engine.submit(SELL, 's1', 1, Decimal(price))
+
+        self.assertIsNone(engine.changes_since(since)[1])
+        self.assertEqual(engine.changes_since(engine.sequence - 1)[1], [(SELL, Decimal('1300'), 1, 1)])
+
+
+class TransactionHistoryTests(TestCase):
+    def setUp(self):
+        start = timezone.now() - timedelta(days=1)
+        counterparties = ['x', 'y', 'u']
+        for index in range(23):
+            # چند معامله زمان یکسان دارند تا ترتیب id هم بررسی شود
+            created_at = start + timedelta(seconds=index // 3)
+            other = counterparties[index % 3]
+            if index % 2:
+                trade('u', other, 1, '1000', created_at)
+            else:
+                trade(other, 'u', 1, '1000', created_at)
+        trade('x', 'y', 1, '1000', start)
+
+    def test_pages_have_no_duplicates_or_gaps(self):
+        expected = list(
+            Transaction.objects.filter(Q(buyer_username='u') | Q(seller_username='u'))
+            .order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        ids = []
+        params = {'page_size': 5}
+        while True:
+            response = self.client.get('/twallet/transactions/u/', params)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 5)
+            ids.extend(item['id'] for item in response.data['results'])
+            if response.data['next_cursor'] is None:
+                break
+            params['cursor'] = response.data['next_cursor']
+        self.assertEqual(len(expected), 23)
+        self.assertEqual(ids, expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ('not-a-cursor', 'YWJj', '!!!'):
+            response = self.client.get('/twallet/transactions/u/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+            self.assertIn('cursor', response.data)
+
+
+class BackfillCandlesTests(TestCase):
+    def candle(self, interval, moment):
+        return Candle.objects.values_list(
+            'open', 'high', 'low', 'close', 'volume', 'trade_count'
+        ).get(interval=interval, bucket_start=bucket_start(moment, interval))
+
+    def test_rebuild_in_chunks_matches_trades(self):
+        day = datetime.now(dt_timezone.utc).replace(hour=10, minute=0, second=0, microsecond=0) - timedelta(days=2)
+        trade('b', 's', 2, '1000', day + timedelta(seconds=5))
+        trade('b', 's', 1, '1200', day + timedelta(seconds=30))
+        trade('b', 's', 3, '900', day + timedelta(minutes=1))
+        now = timezone.now()
+        trade('b', 's', 4, '1100', now)
+        Candle.objects.create(
+            interval='1d', bucket_start=bucket_start(day - timedelta(days=5), '1d'),
+            open=1, high=1, low=1, close=1, volume=1, trade_count=1
+        )
+
+        with mock.patch(
+            'twallet.management.commands.backfill_candles.matching_transaction',
+            wraps=matching_transaction
+        ) as transactions:
+            call_command('backfill_candles', chunk_size=1, stdout=StringIO())
+
+        # هر تکه تراکنش خودش را دارد و قفل تطبیق فقط برای بازه جاری گرفته می‌شود
+        self.assertGreater(transactions.call_count, 4)
+        D = Decimal
+        self.assertEqual(self.candle('1m', day), (D('1000'), D('1200'), D('1000'), D('1200'), 3, 2))
+        self.assertEqual(self.candle('1h', day), (D('1000'), D('1200'), D('900'), D('900'), 6, 3))
+        self.assertEqual(self.candle('1d', day), (D('1000'), D('1200'), D('900'), D('900'), 6, 3))
+        self.assertEqual(self.candle('1d', now), (D('1100'), D('1100'), D('1100'), D('1100'), 4, 1))
+        self.assertEqual(Candle.objects.filter(interval='1d').count(), 2)
+        self.assertEqual(Candle.objects.count(), 3 + 2 + 2)
+
+
+class JournalRecoveryTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = override_settings(TWALLET_JOURNAL_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.engine = MatchingEngine()
+        for username in ('s1', 's2'):
+            UserBalance.objects.create(username=username, tokens=10)
+
+    def submit(self, side, username, quantity, price):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.engine.submit(side, username, quantity, Decimal(price))
+
+    def book_orders(self, engine):
+        return {
+            side: [
+                (order.order_id, order.username, order.quantity, order.price_per_token)
+                for order in engine.book.orders(side)
+            ]
+            for side in (BUY, SELL)
+        }
+
+    def test_snapshot_and_journal_round_trip(self):
+        self.submit(SELL, 's1', 5, '1000')
+        self.submit(SELL, 's2', 4, '1050')
+        snapshot_version = self.engine.write_snapshot()
+        self.submit(BUY, 'b', 7, '1050')
+        self.submit(BUY, 'b', 3, '900')
+        cancelled = self.submit(SELL, 's1', 5, '1200').order
+        with self.captureOnCommitCallbacks(execute=True):
+            self.engine.cancel([(SELL, cancelled.id)])
+        version = OrderBookState.objects.get(id=1).version
+        self.assertEqual(version, snapshot_version + 4)
+
+        recovered = MatchingEngine()
+        state = recovered._journal.recover(version)
+        self.assertIsNotNone(state)
+        self.assertEqual(state.version, version)
+        book = recovered._recover_book(version)
+        self.assertIsNotNone(book)
+        # دفتر موتور جدید از ژورنال ساخته می‌شود نه از جداول سفارشات
+        with mock.patch.object(MatchingEngine, '_recover_book', return_value=book) as recover_book:
+            orders = self.book_orders(recovered)
+        recover_book.assert_called_once_with(version)
+        self.assertEqual(orders, self.book_orders(self.engine))
+        self.assertEqual(orders, {
+            BUY: [(BuyOrder.objects.get(quantity=3).id, 'b', 3, Decimal('900'))],
+            SELL: [(SellOrder.objects.get(username='s2').id, 's2', 2, Decimal('1050'))],
+        })
+
+    def test_gap_in_journal_is_not_recovered(self):
+        self.submit(SELL, 's1', 5, '1000')
+        version = OrderBookState.objects.get(id=1).version
+        self.engine._journal.append(version + 2, [[ORDER_EVENT, SELL, 999, 's1', '1000', 1]])
+
+        self.assertIsNotNone(self.engine._journal.recover(version))
+        self.assertIsNone(self.engine._journal.recover(version + 2))
+
+    def test_inconsistent_event_is_not_recovered(self):
+        self.submit(SELL, 's1', 5, '1000')
+        version = OrderBookState.objects.get(id=1).version
+        self.engine._journal.append(version + 1, [[FILL_EVENT, SELL, 999, 1]])
+
+        self.assertIsNone(self.engine._journal.recover(version + 1))
+
+    def test_journal_of_other_database_is_ignored(self):
+        self.submit(SELL, 's1', 5, '1000')
+        self.engine.write_snapshot()
+        journal = self.engine._journal
+        other = Journal(self.directory, b'\0' * 16)
+        other.directory = journal.directory
+        other.snapshot_path = journal.snapshot_path
+        other.journal_path = journal.journal_path
+
+        self.assertIsNone(other.recover(OrderBookState.objects.get(id=1).version))
+
+    def test_journal_write_failure_does_not_fail_the_order(self):
+        with mock.patch.object(self.engine._journal, 'append', side_effect=OSError()):
+            result = self.submit(SELL, 's1', 5, '1000')
+        self.assertEqual(SellOrder.objects.get().id, result.order.id)
+        # رکورد گم شده پیوستگی را می‌شکند و دفتر از دیتابیس ساخته می‌شود
+        version = OrderBookState.objects.get(id=1).version
+        self.assertIsNone(MatchingEngine()._recover_book(version))
+        self.assertEqual(MatchingEngine().levels(SELL), [(Decimal('1000'), 5, 1)])
+
+
+@override_settings(TWALLET_JOURNAL_DIR=None)
+class CancelOrderTests(TestCase):
+    def setUp(self):
+        self.engine = MatchingEngine()
+        patcher = mock.patch('twallet.views.get_engine', return_value=self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for username in ('alice', 'bob'):
+            UserBalance.objects.create(username=username, tokens=10)
+        self.alice_sell = self.engine.submit(SELL, 'alice', 3, Decimal('1000')).order
+        self.alice_buy = self.engine.submit(BUY, 'alice', 2, Decimal('900')).order
+        self.bob_sell = self.engine.submit(SELL, 'bob', 4, Decimal('1000')).order
+
+    def post(self, path, data):
+        return self.client.post(path, data, content_type='application/json')
+
+    def test_other_users_order_is_not_found(self):
+        response = self.post(f'/twallet/orders/sell/{self.bob_sell.id}/cancel/', {'username': 'alice'})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(SellOrder.objects.get(id=self.bob_sell.id).status, 'pending')
+
+        response = self.post(f'/twallet/orders/sell/{self.alice_sell.id}/cancel/', {'username': 'alice'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['order']['order_id'], self.alice_sell.id)
+        self.assertEqual(SellOrder.objects.get(id=self.alice_sell.id).status, 'cancelled')
+        self.assertEqual(self.engine.levels(SELL), [(Decimal('1000'), 4, 1)])
+
+        # سفارش لغو شده دوباره لغو نمی‌شود
+        response = self.post(f'/twallet/orders/sell/{self.alice_sell.id}/cancel/', {'username': 'alice'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_bulk_cancel_reports_foreign_orders_as_not_found(self):
+        response = self.post('/twallet/orders/cancel/', {'username': 'alice', 'orders': [
+            {'side': SELL, 'order_id': self.alice_sell.id},
+            {'side': SELL, 'order_id': self.bob_sell.id},
+            {'side': BUY, 'order_id': self.alice_buy.id},
+        ]})
+        self.assertEqual(response.data['cancelled_count'], 2)
+        self.assertEqual(response.data['not_found'], [{'side': SELL, 'order_id': self.bob_sell.id}])
+        self.assertEqual(SellOrder.objects.get(id=self.bob_sell.id).status, 'pending')
+
+    def test_cancel_all_releases_only_callers_orders(self):
+        response = self.post('/twallet/orders/cancel-all/', {'username': 'alice'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted((item['side'], item['order_id']) for item in response.data['cancelled']),
+            [(BUY, self.alice_buy.id), (SELL, self.alice_sell.id)]
+        )
+        self.assertEqual(
+            set(SellOrder.objects.filter(status='pending').values_list('username', flat=True)), {'bob'}
+        )
+        self.assertFalse(BuyOrder.objects.filter(status='pending').exists())
+        self.assertEqual(self.engine.levels(SELL), [(Decimal('1000'), 4, 1)])
+        self.assertEqual(self.engine.levels(BUY), [])
+
+    def test_cancel_all_of_one_side(self):
+        self.post('/twallet/orders/cancel-all/', {'username': 'alice', 'side': BUY})
+        self.assertEqual(SellOrder.objects.get(id=self.alice_sell.id).status, 'pending')
+        self.assertEqual(BuyOrder.objects.get(id=self.alice_buy.id).status, 'cancelled')
+
+
+class ArchiveOrdersTests(TestCase):
+    def setUp(self):
+        self.old = timezone.now() - timedelta(days=30)
+
+    def order(self, status):
+        return SellOrder.objects.create(
+            username='s1', quantity=1, price_per_token=Decimal('1000'),
+            total_amount=Decimal('1000'), status=status
+        )
+
+    def test_only_old_terminal_orders_move(self):
+        completed, cancelled, pending = self.order('completed'), self.order('cancelled'), self.order('pending')
+        SellOrder.objects.update(created_at=self.old)
+        recent = self.order('completed')
+
+        self.assertEqual(archive_orders(SellOrder, timezone.now() - timedelta(days=7), chunk_size=1), 2)
+
+        self.assertEqual(
+            sorted(ArchivedSellOrder.objects.values_list('id', flat=True)), [completed.id, cancelled.id]
+        )
+        self.assertEqual(sorted(SellOrder.objects.values_list('id', flat=True)), [pending.id, recent.id])
+        self.assertEqual(
+            sorted(order['id'] for order in order_history(SellOrder)),
+            [completed.id, cancelled.id, pending.id, recent.id]
+        )
+
+    def test_conflicting_archive_id_keeps_live_row(self):
+        orders = [self.order('completed') for _ in range(3)]
+        SellOrder.objects.update(created_at=self.old)
+        ArchivedSellOrder.objects.create(
+            id=orders[1].id, username='other', quantity=9, price_per_token=Decimal('1'),
+            total_amount=Decimal('9'), status='cancelled', created_at=self.old
+        )
+
+        archived = archive_orders(SellOrder, timezone.now(), chunk_size=2)
+
+        self.assertEqual(archived, 2)
+        self.assertEqual(list(SellOrder.objects.values_list('id', flat=True)), [orders[1].id])
+        self.assertEqual(ArchivedSellOrder.objects.get(id=orders[1].id).username, 'other')
+        self.assertEqual(ArchivedSellOrder.objects.count(), 3)
+
+
+@override_settings(TWALLET_JOURNAL_DIR=None)
+class OrderIntakeTests(TestCase):
+    def setUp(self):
+        engine = MatchingEngine()
+        patcher = mock.patch('twallet.intake.get_engine', return_value=engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        UserBalance.objects.create(username='s1', tokens=5)
+
+    def test_queued_orders_are_matched_in_one_batch(self):
+        sell = enqueue_order(SELL, 's1', 5, Decimal('1000'))
+        rejected = enqueue_order(SELL, 's2', 5, Decimal('1000'))
+        invalid = enqueue_order(BUY, 'b', 5, Decimal('-1'))
+        buy = enqueue_order(BUY, 'b', 3, Decimal('1000'))
+
+        self.assertEqual(process_queued(), 4)
+
+        statuses = dict(OrderRequest.objects.values_list('id', 'status'))
+        self.assertEqual(
+            [statuses[request.id] for request in (sell, rejected, invalid, buy)],
+            ['done', 'rejected', 'failed', 'done']
+        )
+        buy.refresh_from_db()
+        sell.refresh_from_db()
+        self.assertEqual(buy.fills, [{'order_id': sell.order_id, 'quantity': 3, 'price_per_token': '1000.00'}])
+        self.assertEqual(process_queued(), 0)
+
+    def test_failed_batch_stays_queued(self):
+        enqueue_order(SELL, 's1', 5, Decimal('1000'))
+
+        with mock.patch.object(Settlement, 'flush', side_effect=SettlementConflict()):
+            with self.assertRaises(SettlementConflict):
+                process_queued()
+
+        self.assertEqual(OrderRequest.objects.get().status, 'queued')
+        self.assertFalse(SellOrder.objects.exists())
+
+    def test_worker_retries_transient_errors(self):
+        enqueue_order(SELL, 's1', 5, Decimal('1000'))
+        flush = Settlement.flush
+        calls = []
+
+        def flaky_flush(settlement):
+            calls.append(None)
+            # هر تلاش تطبیق سه بار تکرار می‌شود؛ دسته اول کامل شکست می‌خورد
+            if len(calls) <= 3:
+                raise SettlementConflict()
+            return flush(settlement)
+
+        with mock.patch.object(Settlement, 'flush', flaky_flush), \
+                mock.patch('twallet.management.commands.twallet_worker.time.sleep') as sleep:
+            call_command('twallet_worker', once=True, stdout=StringIO(), stderr=StringIO())
+
+        sleep.assert_called_once()
+        self.assertEqual(OrderRequest.objects.get().status, 'done')
+        self.assertEqual(SellOrder.objects.get().status, 'pending')
+
+    def test_async_request_is_processed_and_polled(self):
+        get_user_model().objects.create_user(username='s1', password='x')
+        response = self.client.post(
+            '/twallet/sell/', {'username': 's1', 'quantity': 5, 'price_per_token': '1000'},
+            content_type='application/json', HTTP_PREFER='respond-async'
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(SellOrder.objects.exists())
+
+        call_command('twallet_worker', once=True, stdout=StringIO())
+
+        status_response = self.client.get(response.data['status_url'])
+        self.assertEqual(status_response.data['status'], 'done')
+        self.assertEqual(status_response.data['order']['status'], 'pending')
+        self.assertEqual(status_response.data['order']['quantity'], 5)
+
+
+class LedgerExportTests(TestCase):
+    def setUp(self):
+        self.start = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        self.trades = [
+            trade('alice', 'bob', 3, '1234.56', self.start),
+            trade('bob', 'carol', 1, '0.10', self.start + timedelta(hours=1)),
+            trade('carol', 'alice', 7, '99999999.99', self.start + timedelta(hours=2)),
+        ]
+
+    def export(self, **params):
+        response = self.client.get('/twallet/ledger/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson_keeps_decimal_precision(self):
+        rows = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [item.id for item in self.trades])
+        self.assertEqual(
+            [(row['price_per_token'], row['total_amount']) for row in rows],
+            [('1234.56', '3703.68'), ('0.10', '0.10'), ('99999999.99', '699999999.93')]
+        )
+        self.assertEqual(datetime.fromisoformat(rows[1]['created_at']), self.start + timedelta(hours=1))
+
+    def test_csv_keeps_decimal_precision(self):
+        rows = list(csv.DictReader(StringIO(self.export(type='csv'))))
+        self.assertEqual(
+            [(row['price_per_token'], row['total_amount']) for row in rows],
+            [('1234.56', '3703.68'), ('0.10', '0.10'), ('99999999.99', '699999999.93')]
+        )
+
+    def test_time_range_and_username_filters(self):
+        def ids(**params):
+            return [json.loads(line)['id'] for line in self.export(**params).splitlines()]
+
+        first, second, third = (item.id for item in self.trades)
+        self.assertEqual(ids(start=(self.start + timedelta(hours=1)).isoformat()), [second, third])
+        # پایان بازه شامل نمی‌شود
+        self.assertEqual(ids(end=(self.start + timedelta(hours=2)).isoformat()), [first, second])
+        self.assertEqual(ids(username='alice'), [first, third])
+        self.assertEqual(ids(username='alice', start=(self.start + timedelta(minutes=1)).isoformat()), [third])
+        self.assertEqual(ids(username='nobody'), [])
+
+    def test_invalid_range_is_rejected(self):
+        response = self.client.get('/twallet/ledger/export/', {
+            'start': self.start.isoformat(), 'end': self.start.isoformat()
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(TWALLET_JOURNAL_DIR=None)
+class QuoteTests(TestCase):
+    def setUp(self):
+        self.engine = MatchingEngine()
+        patcher = mock.patch('twallet.views.get_engine', return_value=self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for username, quantity, price in (
+            ('s1', 3, '1000.00'), ('s2', 4, '1000.00'), ('s3', 5, '1010.50'), ('s4', 6, '1200.00'),
+        ):
+            UserBalance.objects.create(username=username, tokens=quantity)
+            self.engine.submit(SELL, username, quantity, Decimal(price))
+        UserBalance.objects.create(username='b', tokens=0)
+
+    def assertQuoteMatchesSubmit(self, side, username, quantity, price):
+        self.engine.refresh()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/twallet/quote/', {
+                'side': side, 'quantity': quantity, 'price_per_token': price
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([
+            query['sql'] for query in queries
+            if query['sql'].split()[0].upper() in ('INSERT', 'UPDATE', 'DELETE')
+        ])
+        quote = response.data
+        self.assertEqual(quote['sequence'], self.engine.sequence)
+
+        before = Transaction.objects.count()
+        result = self.engine.submit(side, username, quantity, Decimal(price))
+        trades = list(Transaction.objects.order_by('id').values_list('price_per_token', 'quantity')[before:])
+
+        fills = {}
+        for trade_price, trade_quantity in trades:
+            fills[trade_price] = fills.get(trade_price, 0) + trade_quantity
+        self.assertEqual(
+            [(Decimal(fill['price']), fill['quantity']) for fill in quote['fills']], list(fills.items())
+        )
+        self.assertEqual(quote['remaining_quantity'], result.remaining_quantity)
+        total = sum(trade_price * trade_quantity for trade_price, trade_quantity in trades)
+        self.assertEqual(Decimal(quote['total_amount']), total)
+        filled = quantity - result.remaining_quantity
+        self.assertEqual(Decimal(quote['vwap']), (total / filled).quantize(Decimal('0.01')))
+
+    def test_buy_quote_matches_real_fill(self):
+        self.assertQuoteMatchesSubmit(BUY, 'b', 10, '1100')
+
+    def test_sell_quote_matches_real_fill(self):
+        self.engine.submit(BUY, 'b', 2, Decimal('950'))
+        self.engine.submit(BUY, 'b', 3, Decimal('990'))
+        self.assertQuoteMatchesSubmit(SELL, 's4', 4, '900')
+
+    def test_quote_writes_nothing(self):
+        counts = (BuyOrder.objects.count(), SellOrder.objects.count(), Transaction.objects.count())
+        sequence = self.engine.sequence
+        response = self.client.get('/twallet/quote/', {'side': BUY, 'quantity': 100, 'price_per_token': '5000'})
+        self.assertEqual(response.data['remaining_quantity'], 82)
+        self.assertEqual(
+            (BuyOrder.objects.count(), SellOrder.objects.count(), Transaction.objects.count()), counts
+        )
+        self.assertEqual(self.engine.sequence, sequence)
+        self.assertEqual(self.engine.levels(SELL)[0], (Decimal('1000.00'), 7, 2))
+
+    def test_quote_without_crossing_levels(self):
+        response = self.client.get('/twallet/quote/', {'side': BUY, 'quantity': 5, 'price_per_token': '900'})
+        self.assertEqual(response.data['fills'], [])
+        self.assertIsNone(response.data['vwap'])
+
+    def test_invalid_price_rejected(self):
+        response = self.client.get('/twallet/quote/', {'side': BUY, 'quantity': 5, 'price_per_token': '0'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(TWALLET_JOURNAL_DIR=None)
+class ReconcileWalletTests(TestCase):
+    def setUp(self):
+        self.engine = MatchingEngine()
+        for username in ('s1', 's2', 's3'):
+            UserBalance.objects.create(username=username, tokens=10)
+        self.engine.submit(SELL, 's1', 4, Decimal('1000'))
+        self.engine.submit(BUY, 'b1', 4, Decimal('1000'))
+        self.engine.submit(SELL, 's2', 6, Decimal('1000'))
+        self.engine.submit(BUY, 'b2', 5, Decimal('1000'))
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_wallet', *args, stdout=out)
+        return out.getvalue()
+
+    def test_consistent_wallet_passes(self):
+        self.reconcile()
+        run = WalletReconciliation.objects.get()
+        self.assertEqual((run.mode, run.checked_users, run.discrepancy_count), ('full', 5, 0))
+        self.assertEqual(run.last_transaction_id, Transaction.objects.latest('id').id)
+
+    def test_tampered_balance_fails(self):
+        UserBalance.objects.filter(username='b1').update(tokens=40)
+
+        with self.assertRaises(CommandError):
+            self.reconcile()
+        run = WalletReconciliation.objects.get()
+        self.assertEqual(
+            run.discrepancies, [{'username': 'b1', 'kind': 'balance', 'expected': 4, 'actual': 40}]
+        )
+
+    def test_incremental_checks_only_touched_users(self):
+        self.reconcile()
+        # تغییر کاربری که پس از اجرای کامل معامله نکرده در اجرای افزایشی دیده نمی‌شود
+        UserBalance.objects.filter(username='s1').update(tokens=99)
+        self.engine.submit(BUY, 'b1', 1, Decimal('1000'))
+
+        self.reconcile('--incremental')
+        run = WalletReconciliation.objects.first()
+        self.assertEqual((run.mode, run.checked_users, run.discrepancy_count), ('incremental', 2, 0))
+
+        with self.assertRaises(CommandError):
+            self.reconcile()
+
+    def test_incremental_rechecks_after_failed_run(self):
+        UserBalance.objects.filter(username='b2').update(tokens=1)
+        with self.assertRaises(CommandError):
+            self.reconcile('--incremental')
+        # اجرای ناموفق نقطه شروع نیست؛ اجرای بعدی باز هم کامل است
+        with self.assertRaises(CommandError):
+            self.reconcile('--incremental')
+        self.assertEqual(
+            list(WalletReconciliation.objects.values_list('mode', flat=True)), ['full', 'full']
+        )
@@ -13,10 +13,24 @@ urlpatterns = [
     path('sell/', views.SellOrderView.as_view(), name='sell_order'),
     path('orders/buy/', views.BuyOrderListView.as_view(), name='buy_orders'),
     path('orders/sell/', views.SellOrderListView.as_view(), name='sell_orders'),
+    path('orders/batch/', views.BatchOrderView.as_view(), name='batch_orders'),
+    path('orders/requests/<int:request_id>/', views.OrderRequestStatusView.as_view(), name='order_request'),
+    path('orders/cancel/', views.BulkCancelOrderView.as_view(), name='cancel_orders'),
+    path('orders/cancel-all/', views.CancelAllOrdersView.as_view(), name='cancel_all_orders'),
+    path('orders/<str:side>/<int:order_id>/cancel/', views.CancelOrderView.as_view(), name='cancel_order'),
     
     # orderbook
     path('orderbook/', views.OrderBookView.as_view(), name='orderbook'),
+    path('orderbook/snapshot/', views.OrderBookSnapshotView.as_view(), name='orderbook_snapshot'),
+    path('orderbook/delta/', views.OrderBookDeltaView.as_view(), name='orderbook_delta'),
+    path('depth/', views.MarketDepthView.as_view(), name='market_depth'),
+    path('quote/', views.QuoteView.as_view(), name='quote'),
     
     # تاریخچه
     path('transactions/', views.TransactionHistoryView.as_view(), name='transactions'),
+    path('ledger/export/', views.LedgerExportView.as_view(), name='ledger_export'),
+    path('transactions/<str:username>/', views.UserTransactionHistoryView.as_view(), name='user_transactions'),
+    
+    # نمودار قیمت
+    path('candles/', views.CandleView.as_view(), name='candles'),
 ] 
\ No newline at end of file
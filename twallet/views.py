@@ -3,17 +3,32 @@ from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
-from django.db import transaction
-from django.utils import timezone
+from idempotency.decorators import idempotent
 from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.urls import reverse
+from django.http import StreamingHttpResponse
+import heapq
+from decimal import Decimal
 
 
-from .models import TokenBalance, UserBalance, BuyOrder, SellOrder, Transaction
+from .models import BuyOrder, SellOrder, Transaction, Candle, OrderRequest
 from .serializers import (
     TokenBalanceSerializer, UserBalanceSerializer, BuyOrderSerializer, SellOrderSerializer, 
     TransactionSerializer, BuyOrderCreateSerializer, SellOrderCreateSerializer,
-    OrderBookSerializer
+    OrderBookSerializer, PriceLevelSerializer, BatchOrderSerializer,
+    CancelOrderSerializer, BulkCancelOrderSerializer, CancelAllOrdersSerializer,
+    OrderBookSnapshotQuerySerializer, OrderBookDeltaQuerySerializer,
+    MarketDepthQuerySerializer, TransactionHistoryQuerySerializer,
+    CandleSerializer, CandleQuerySerializer, OrderRequestSerializer,
+    LedgerExportQuerySerializer, QuoteQuerySerializer
 )
+from .balances import get_token_balance, get_user_balance
+from .engine import BUY, SELL, InsufficientBalance, get_engine
+from .pagination import encode_cursor
+from .archive import ARCHIVE_MODELS, order_history
+from .intake import async_intake_requested, enqueue_order
+from .export import EXPORT_TYPES, export_lines, ledger_rows
 
 User = get_user_model()
 
@@ -24,7 +39,7 @@ class TokenBalanceView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request):
-        balance = TokenBalance.get_balance()
+        balance = get_token_balance()
         serializer = TokenBalanceSerializer(balance)
         return Response(serializer.data)
 
@@ -36,17 +51,31 @@ class UserBalanceView(APIView):
     permission_classes = [AllowAny]
     
     def get(self, request, username):
-        balance = UserBalance.get_or_create_balance(username)
+        # فقط خواندن: برای کاربر ناشناخته ردیفی ساخته نمی‌شود
+        balance = get_user_balance(username)
         serializer = UserBalanceSerializer(balance)
         return Response(serializer.data)
 
 
+def queued_order_response(order_request):
+    """
+    پاسخ 202 برای سفارشی که در صف ناهمگام ثبت شده
+    """
+    return Response({
+        'message': 'سفارش در صف پردازش ثبت شد',
+        'request_id': order_request.id,
+        'status': order_request.status,
+        'status_url': reverse('twallet:order_request', args=[order_request.id])
+    }, status=status.HTTP_202_ACCEPTED)
+
+
 class BuyOrderView(APIView):
     """
     ایجاد سفارش خرید
     """
     permission_classes = [AllowAny]
     
+    @idempotent
     def post(self, request):
         serializer = BuyOrderCreateSerializer(data=request.data)
         if not serializer.is_valid():
@@ -54,85 +83,34 @@ class BuyOrderView(APIView):
         
         username = serializer.validated_data['username']
         quantity = serializer.validated_data['quantity']
-        try:
-         user = User.objects.get(username=username)
-        except User.DoesNotExist:
-           return Response(
-            {"error": "کاربری با این نام کاربری وجود ندارد."},
-             status=status.HTTP_400_BAD_REQUEST
-    )
+        if not User.objects.filter(username=username).exists():
+            return Response(
+                {"error": "کاربری با این نام کاربری وجود ندارد."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if async_intake_requested(request):
+            return queued_order_response(enqueue_order(
+                BUY, username, quantity, serializer.validated_data.get('price_per_token')
+            ))
 
+        # ثبت و تطبیق سفارش در موتور تطبیق
+        result = get_engine().submit(
+            BUY, username, quantity,
+            serializer.validated_data.get('price_per_token')
+        )
+        buy_order = result.order
         
-        with transaction.atomic():
-            # ایجاد سفارش خرید با وضعیت pending
-            buy_order = BuyOrder.objects.create(
-                username=username,
-                quantity=quantity,
-                status='pending'
-            )
-            
-            # بررسی سفارشات فروش موجود (FIFO)
-            sell_orders = SellOrder.objects.filter(
-                status='pending'
-            ).order_by('created_at')
-            
-            remaining_quantity = quantity
-            matched_orders = []
-            
-            for sell_order in sell_orders:
-                if remaining_quantity <= 0:
-                    break
-                
-                # محاسبه تعداد قابل معامله
-                trade_quantity = min(remaining_quantity, sell_order.quantity)
-                
-                # بروزرسانی موجودی خریدار
-                buyer_balance = UserBalance.get_or_create_balance(username)
-                buyer_balance.add_tokens(trade_quantity)
-                
-                # بروزرسانی موجودی فروشنده
-                seller_balance = UserBalance.get_or_create_balance(sell_order.username)
-                seller_balance.remove_tokens(trade_quantity)
-                
-                # ثبت تراکنش
-                Transaction.objects.create(
-                    buyer_username=username,
-                    seller_username=sell_order.username,
-                    transaction_type='buy',
-                    quantity=trade_quantity,
-                    price_per_token=buy_order.price_per_token,
-                    total_amount=trade_quantity * buy_order.price_per_token,
-                    buyer_balance_after=buyer_balance.tokens,
-                    seller_balance_after=seller_balance.tokens
-                )
-                
-                # بروزرسانی سفارشات
-                if trade_quantity == sell_order.quantity:
-                    sell_order.complete_order()
-                else:
-                    sell_order.quantity -= trade_quantity
-                    sell_order.save()
-                
-                remaining_quantity -= trade_quantity
-                matched_orders.append(sell_order.id)
-            
-            # اگر هنوز توکن باقی مانده، سفارش خرید در pending می‌ماند
-            if remaining_quantity > 0:
-                buy_order.quantity = remaining_quantity
-                buy_order.save()
-            else:
-                buy_order.complete_order()
-            
-            return Response({
-                'message': 'سفارش خرید با موفقیت ثبت شد',
-                'order_id': buy_order.id,
-                'username': username,
-                'quantity': quantity,
-                'total_amount': buy_order.total_amount,
-                'status': buy_order.status,
-                'matched_orders': matched_orders,
-                'remaining_quantity': remaining_quantity
-            }, status=status.HTTP_201_CREATED)
+        return Response({
+            'message': 'سفارش خرید با موفقیت ثبت شد',
+            'order_id': buy_order.id,
+            'username': username,
+            'quantity': quantity,
+            'total_amount': buy_order.total_amount,
+            'status': buy_order.status,
+            'matched_orders': result.matched_orders,
+            'remaining_quantity': result.remaining_quantity
+        }, status=status.HTTP_201_CREATED)
 
 
 class SellOrderView(APIView):
@@ -141,6 +119,7 @@ class SellOrderView(APIView):
     """
     permission_classes = [AllowAny]
     
+    @idempotent
     def post(self, request):
         serializer = SellOrderCreateSerializer(data=request.data)
         if not serializer.is_valid():
@@ -148,94 +127,240 @@ class SellOrderView(APIView):
         
         username = serializer.validated_data['username']
         quantity = serializer.validated_data['quantity']
+        if not User.objects.filter(username=username).exists():
+            return Response(
+                {"error": "کاربری با این نام کاربری وجود ندارد."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if async_intake_requested(request):
+            # موجودی هنگام پردازش صف بررسی می‌شود
+            return queued_order_response(enqueue_order(
+                SELL, username, quantity, serializer.validated_data.get('price_per_token')
+            ))
+
+        # ثبت و تطبیق سفارش در موتور تطبیق
         try:
-         user = User.objects.get(username=username)
-        except User.DoesNotExist:
-           return Response(
-            {"error": "کاربری با این نام کاربری وجود ندارد."},
-             status=status.HTTP_400_BAD_REQUEST
-    )
+            result = get_engine().submit(
+                SELL, username, quantity,
+                serializer.validated_data.get('price_per_token')
+            )
+        except InsufficientBalance as e:
+            return Response({
+                'error': 'موجودی کافی نیست',
+                'current_balance': e.current_balance,
+                'requested_quantity': e.requested_quantity
+            }, status=status.HTTP_400_BAD_REQUEST)
+        sell_order = result.order
+        
+        return Response({
+            'message': 'سفارش فروش با موفقیت ثبت شد',
+            'order_id': sell_order.id,
+            'username': username,
+            'quantity': quantity,
+            'total_amount': sell_order.total_amount,
+            'status': sell_order.status,
+            'matched_orders': result.matched_orders,
+            'remaining_quantity': result.remaining_quantity
+        }, status=status.HTTP_201_CREATED)
 
+
+class BatchOrderView(APIView):
+    """
+    ثبت دسته‌ای سفارشات خرید و فروش
+
+    همه نام‌های کاربری با یک کوئری بررسی می‌شوند و سفارشات به ترتیب در یک
+    تراکنش تطبیق داده می‌شوند. نتیجه هر سفارش جداگانه برگردانده می‌شود.
+    """
+    permission_classes = [AllowAny]
+    
+    @idempotent
+    def post(self, request):
+        serializer = BatchOrderSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        orders = serializer.validated_data['orders']
+        usernames = {order['username'] for order in orders}
+        existing_usernames = set(
+            User.objects.filter(username__in=usernames).values_list('username', flat=True)
+        )
         
-        with transaction.atomic():
-            # بررسی موجودی کافی کاربر
-            user_balance = UserBalance.get_or_create_balance(username)
-            if user_balance.tokens < quantity:
-                return Response({
+        results = [None] * len(orders)
+        accepted = []
+        for index, order in enumerate(orders):
+            if order['username'] not in existing_usernames:
+                results[index] = {
+                    'index': index,
+                    'side': order['side'],
+                    'username': order['username'],
+                    'error': 'کاربری با این نام کاربری وجود ندارد.'
+                }
+            else:
+                accepted.append(index)
+        
+        # ثبت و تطبیق سفارشات معتبر در یک تراکنش
+        match_results = get_engine().submit_many([
+            (
+                orders[index]['side'], orders[index]['username'],
+                orders[index]['quantity'], orders[index].get('price_per_token')
+            )
+            for index in accepted
+        ]) if accepted else []
+        
+        for index, result in zip(accepted, match_results):
+            order = orders[index]
+            if isinstance(result, InsufficientBalance):
+                results[index] = {
+                    'index': index,
+                    'side': order['side'],
+                    'username': order['username'],
                     'error': 'موجودی کافی نیست',
-                    'current_balance': user_balance.tokens,
-                    'requested_quantity': quantity
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # ایجاد سفارش فروش با وضعیت pending
-            sell_order = SellOrder.objects.create(
-                username=username,
-                quantity=quantity,
-                status='pending'
+                    'current_balance': result.current_balance,
+                    'requested_quantity': result.requested_quantity
+                }
+                continue
+            results[index] = {
+                'index': index,
+                'side': order['side'],
+                'order_id': result.order.id,
+                'username': order['username'],
+                'quantity': order['quantity'],
+                'total_amount': result.order.total_amount,
+                'status': result.order.status,
+                'matched_orders': result.matched_orders,
+                'remaining_quantity': result.remaining_quantity
+            }
+        
+        return Response({
+            'message': 'سفارشات دسته‌ای پردازش شد',
+            'accepted': sum(1 for result in results if 'error' not in result),
+            'rejected': sum(1 for result in results if 'error' in result),
+            'results': results
+        }, status=status.HTTP_200_OK)
+
+
+def cancelled_order_data(order):
+    """
+    اطلاعات یک سفارش لغو شده برای پاسخ
+    """
+    return {
+        'side': order.side,
+        'order_id': order.order_id,
+        'username': order.username,
+        'quantity': order.quantity,
+        'price_per_token': order.price_per_token,
+    }
+
+
+class CancelOrderView(APIView):
+    """
+    لغو یک سفارش فعال توسط صاحب آن
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request, side, order_id):
+        if side not in (BUY, SELL):
+            return Response(
+                {"error": "نوع سفارش باید buy یا sell باشد."},
+                status=status.HTTP_404_NOT_FOUND
             )
-            
-            # بررسی سفارشات خرید موجود (FIFO)
-            buy_orders = BuyOrder.objects.filter(
-                status='pending'
-            ).order_by('created_at')
-            
-            remaining_quantity = quantity
-            matched_orders = []
-            
-            for buy_order in buy_orders:
-                if remaining_quantity <= 0:
-                    break
-                
-                # محاسبه تعداد قابل معامله
-                trade_quantity = min(remaining_quantity, buy_order.quantity)
-                
-                # کم کردن از موجودی فروشنده
-                seller_balance = UserBalance.get_or_create_balance(username)
-                seller_balance.remove_tokens(trade_quantity)
-                
-                # اضافه کردن به موجودی خریدار
-                buyer_balance = UserBalance.get_or_create_balance(buy_order.username)
-                buyer_balance.add_tokens(trade_quantity)
-                
-                # ثبت تراکنش
-                Transaction.objects.create(
-                    buyer_username=buy_order.username,
-                    seller_username=username,
-                    transaction_type='sell',
-                    quantity=trade_quantity,
-                    price_per_token=sell_order.price_per_token,
-                    total_amount=trade_quantity * sell_order.price_per_token,
-                    buyer_balance_after=buyer_balance.tokens,
-                    seller_balance_after=seller_balance.tokens
-                )
-                
-                # بروزرسانی سفارشات
-                if trade_quantity == buy_order.quantity:
-                    buy_order.complete_order()
-                else:
-                    buy_order.quantity -= trade_quantity
-                    buy_order.save()
-                
-                remaining_quantity -= trade_quantity
-                matched_orders.append(buy_order.id)
-            
-            # اگر هنوز توکن باقی مانده، سفارش فروش در pending می‌ماند
-            if remaining_quantity > 0:
-                sell_order.quantity = remaining_quantity
-                sell_order.save()
-            else:
-                sell_order.complete_order()
-            
-            return Response({
-                'message': 'سفارش فروش با موفقیت ثبت شد',
-                'order_id': sell_order.id,
-                'username': username,
-                'quantity': quantity,
-                'total_amount': sell_order.total_amount,
-                'status': sell_order.status,
-                'matched_orders': matched_orders,
-                'remaining_quantity': remaining_quantity
-            }, status=status.HTTP_201_CREATED)
+        serializer = CancelOrderSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        cancelled = get_engine().cancel(
+            [(side, order_id)], username=serializer.validated_data['username']
+        )
+        if not cancelled:
+            return Response(
+                {"error": "سفارش فعالی با این شناسه برای این کاربر وجود ندارد."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response({
+            'message': 'سفارش با موفقیت لغو شد',
+            'order': cancelled_order_data(cancelled[0])
+        })
+
+
+class BulkCancelOrderView(APIView):
+    """
+    لغو دسته‌ای سفارشات یک کاربر
+
+    همه سفارشات در یک تراکنش و با یک UPDATE برای هر طرف لغو می‌شوند.
+    سفارشاتی که فعال نیستند یا متعلق به کاربر نیستند در not_found می‌آیند.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = BulkCancelOrderSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        requested = [(item['side'], item['order_id']) for item in serializer.validated_data['orders']]
+        cancelled = get_engine().cancel(
+            requested, username=serializer.validated_data['username']
+        )
+        cancelled_keys = {(order.side, order.order_id) for order in cancelled}
+
+        return Response({
+            'cancelled_count': len(cancelled),
+            'cancelled': [cancelled_order_data(order) for order in cancelled],
+            'not_found': [
+                {'side': side, 'order_id': order_id}
+                for side, order_id in dict.fromkeys(requested)
+                if (side, order_id) not in cancelled_keys
+            ]
+        })
+
+
+class CancelAllOrdersView(APIView):
+    """
+    لغو همه سفارشات فعال یک کاربر
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = CancelAllOrdersSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        cancelled = get_engine().cancel_all(
+            serializer.validated_data['username'], serializer.validated_data.get('side')
+        )
+        return Response({
+            'cancelled_count': len(cancelled),
+            'cancelled': [cancelled_order_data(order) for order in cancelled]
+        })
+
+
+class OrderRequestStatusView(APIView):
+    """
+    وضعیت یک درخواست سفارش ناهمگام
+
+    پس از پردازش، معاملات هنگام ثبت و وضعیت فعلی سفارش (که ممکن است بعداً
+    توسط سفارشات دیگر معامله شده باشد) هم برگردانده می‌شود.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, request_id):
+        order_request = OrderRequest.objects.filter(id=request_id).first()
+        if order_request is None:
+            return Response(
+                {"error": "درخواستی با این شناسه وجود ندارد."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        data = OrderRequestSerializer(order_request).data
+        if order_request.order_id is not None:
+            model = BuyOrder if order_request.side == BUY else SellOrder
+            fields = ('id', 'quantity', 'status', 'completed_at')
+            data['order'] = (
+                model.objects.filter(id=order_request.order_id).values(*fields).first()
+                or ARCHIVE_MODELS[model].objects.filter(id=order_request.order_id).values(*fields).first()
+            )
+        return Response(data)
 
 
 class OrderBookView(APIView):
@@ -247,17 +372,134 @@ class OrderBookView(APIView):
     def get(self, request):
         buy_orders = BuyOrder.objects.filter(status='pending')
         sell_orders = SellOrder.objects.filter(status='pending')
-        balance = TokenBalance.get_balance()
+        balance = get_token_balance()
+        engine = get_engine()
         
         data = {
             'buy_orders': BuyOrderSerializer(buy_orders, many=True).data,
             'sell_orders': SellOrderSerializer(sell_orders, many=True).data,
+            # سطوح قیمت مستقیماً از شاخص دفتر سفارشات خوانده می‌شوند
+            'buy_levels': PriceLevelSerializer(engine.levels(BUY), many=True).data,
+            'sell_levels': PriceLevelSerializer(engine.levels(SELL), many=True).data,
             'current_balance': TokenBalanceSerializer(balance).data
         }
         
         return Response(data)
 
 
+class OrderBookSnapshotView(APIView):
+    """
+    snapshot فشرده سطوح دفتر سفارشات به همراه sequence
+
+    هر سطح به صورت [قیمت، مجموع تعداد، تعداد سفارش] است.
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        serializer = OrderBookSnapshotQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        snapshot = get_engine().snapshot(serializer.validated_data.get('depth'))
+        return Response({
+            'sequence': snapshot['sequence'],
+            'bids': [[str(price), quantity, count] for price, quantity, count in snapshot[BUY]],
+            'asks': [[str(price), quantity, count] for price, quantity, count in snapshot[SELL]],
+        })
+
+
+class OrderBookDeltaView(APIView):
+    """
+    تغییرات سطوح دفتر سفارشات پس از یک sequence
+
+    با پارامتر wait درخواست تا رسیدن تغییر جدید باز می‌ماند (long-poll).
+    هر تغییر به صورت [طرف، قیمت، مجموع تعداد، تعداد سفارش] است و مجموع
+    تعداد صفر یعنی حذف سطح.
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        serializer = OrderBookDeltaQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        sequence, changes = get_engine().changes_since(
+            serializer.validated_data['since'],
+            timeout=serializer.validated_data['wait']
+        )
+        if changes is None:
+            return Response({
+                'error': 'تغییرات این sequence در دسترس نیست، snapshot جدید دریافت کنید',
+                'sequence': sequence
+            }, status=status.HTTP_410_GONE)
+        
+        return Response({
+            'sequence': sequence,
+            'changes': [
+                [side, str(price), quantity, count]
+                for side, price, quantity, count in changes
+            ]
+        })
+
+
+class MarketDepthView(APIView):
+    """
+    عمق بازار (L2): مجموع تعداد و تعداد سفارشات بهترین N سطح هر طرف
+
+    سطوح مستقیماً از شاخص دفتر سفارشات خوانده می‌شوند، پس اندازه و هزینه
+    پاسخ فقط به N بستگی دارد و نه به عمق کل دفتر.
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        serializer = MarketDepthQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        snapshot = get_engine().snapshot(serializer.validated_data['levels'])
+        return Response({
+            'sequence': snapshot['sequence'],
+            'bids': PriceLevelSerializer(snapshot[BUY], many=True).data,
+            'asks': PriceLevelSerializer(snapshot[SELL], many=True).data,
+        })
+
+
+class QuoteView(APIView):
+    """
+    پیش‌نمایش نتیجه یک سفارش بدون ثبت آن
+
+    معاملات مورد انتظار، میانگین وزنی قیمت (VWAP) و تعداد باقی‌مانده از
+    روی دفتر حافظه‌ای محاسبه می‌شوند. نتیجه تخمین است: سفارشات فروشی که
+    فروشنده‌شان دیگر توکن کافی ندارد هنگام ثبت واقعی لغو می‌شوند.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        serializer = QuoteQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        sequence, fills, remaining_quantity = get_engine().quote(
+            data['side'], data['quantity'], data.get('price_per_token')
+        )
+        filled_quantity = data['quantity'] - remaining_quantity
+        total_amount = sum(price * quantity for price, quantity in fills)
+        return Response({
+            'sequence': sequence,
+            'side': data['side'],
+            'quantity': data['quantity'],
+            'fills': [
+                {'price': str(price), 'quantity': quantity}
+                for price, quantity in fills
+            ],
+            'filled_quantity': filled_quantity,
+            'remaining_quantity': remaining_quantity,
+            'total_amount': str(total_amount),
+            'vwap': str((total_amount / filled_quantity).quantize(Decimal('0.01'))) if filled_quantity else None,
+        })
+
+
 class TransactionHistoryView(generics.ListAPIView):
     """
     مشاهده تاریخچه تراکنشات
@@ -267,19 +509,131 @@ class TransactionHistoryView(generics.ListAPIView):
     serializer_class = TransactionSerializer
 
 
+class UserTransactionHistoryView(APIView):
+    """
+    تاریخچه تراکنشات یک کاربر (به عنوان خریدار یا فروشنده) با صفحه‌بندی keyset
+
+    هر طرف جداگانه با ایندکس (username, created_at) و شرط cursor خوانده
+    می‌شود و دو نتیجه ادغام می‌شوند؛ بنابراین هزینه هر صفحه به شماره صفحه
+    بستگی ندارد.
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request, username):
+        serializer = TransactionHistoryQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        page_size = serializer.validated_data['page_size']
+        cursor = serializer.validated_data.get('cursor')
+        
+        sides = []
+        for field in ('buyer_username', 'seller_username'):
+            queryset = Transaction.objects.filter(**{field: username})
+            if cursor:
+                created_at, pk = cursor
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+                )
+            sides.append(queryset.order_by('-created_at', '-id')[:page_size + 1])
+        
+        # ادغام دو لیست مرتب؛ معامله کاربر با خودش در هر دو لیست هست
+        transactions = []
+        seen = set()
+        for item in heapq.merge(*sides, key=lambda t: (t.created_at, t.id), reverse=True):
+            if item.id in seen:
+                continue
+            seen.add(item.id)
+            transactions.append(item)
+            if len(transactions) > page_size:
+                break
+        
+        next_cursor = None
+        if len(transactions) > page_size:
+            transactions = transactions[:page_size]
+            last = transactions[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        
+        return Response({
+            'username': username,
+            'results': TransactionSerializer(transactions, many=True).data,
+            'next_cursor': next_cursor
+        })
+
+
+class LedgerExportView(APIView):
+    """
+    خروجی جریانی دفتر تراکنشات (NDJSON یا CSV)
+
+    برخلاف TransactionHistoryView کل جدول در حافظه ساخته نمی‌شود؛ ردیف‌ها
+    تکه تکه از دیتابیس خوانده و همان لحظه ارسال می‌شوند.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        serializer = LedgerExportQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        rows = ledger_rows(data.get('start'), data.get('end'), data.get('username'))
+        response = StreamingHttpResponse(
+            export_lines(data['type'], rows), content_type=EXPORT_TYPES[data['type']]
+        )
+        response['Content-Disposition'] = f'attachment; filename="ledger.{data["type"]}"'
+        return response
+
+
+class CandleView(APIView):
+    """
+    کندل‌های قیمت یک بازه زمانی
+
+    بدون start آخرین کندل‌ها (تا سقف limit) برگردانده می‌شوند.
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        serializer = CandleQuerySerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        data = serializer.validated_data
+        candles = Candle.objects.filter(interval=data['interval'])
+        if data.get('end'):
+            candles = candles.filter(bucket_start__lt=data['end'])
+        if data.get('start'):
+            candles = list(candles.filter(
+                bucket_start__gte=data['start']
+            ).order_by('bucket_start')[:data['limit']])
+        else:
+            candles = list(candles.order_by('-bucket_start')[:data['limit']])
+            candles.reverse()
+        
+        return Response({
+            'interval': data['interval'],
+            'candles': CandleSerializer(candles, many=True).data
+        })
+
+
 class BuyOrderListView(generics.ListAPIView):
     """
     مشاهده لیست سفارشات خرید
     """
     permission_classes = [AllowAny]
-    queryset = BuyOrder.objects.all()
     serializer_class = BuyOrderSerializer
 
+    def get_queryset(self):
+        # سفارشات بایگانی شده هم در تاریخچه می‌آیند
+        return order_history(BuyOrder)
+
 
 class SellOrderListView(generics.ListAPIView):
     """
     مشاهده لیست سفارشات فروش
     """
     permission_classes = [AllowAny]
-    queryset = SellOrder.objects.all()
     serializer_class = SellOrderSerializer
+
+    def get_queryset(self):
+        # سفارشات بایگانی شده هم در تاریخچه می‌آیند
+        return order_history(SellOrder)